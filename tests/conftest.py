@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+#
+# Runs the tests against a private Xvfb server, so that the tests which
+# change the configuration don't disturb the session. Set
+# XRANDR_TEST_DISPLAY=host to use the DISPLAY of the environment instead,
+# tests which change the configuration are skipped then.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import xvfb
+
+_server = None
+
+def pytest_configure(config):
+    global _server
+    if os.getenv("XRANDR_TEST_DISPLAY") == "host" or \
+       os.getenv("XRANDR_TEST_XVFB") or not xvfb.find_xvfb():
+        return
+    _server = xvfb.Xvfb()
+    os.environ["DISPLAY"] = _server.start()
+    os.environ["XRANDR_TEST_XVFB"] = "1"
+
+def pytest_unconfigure(config):
+    if _server:
+        _server.stop()
+
+# vim:ts=4:sw=4:et
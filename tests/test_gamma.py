@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Checks the gamma ramps and the schedule of the gamma transitions. Neither
+# requires a running X server.
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import xrandr
+from xrandr import gamma, serialize
+
+from test_serialize import STATE
+
+class GammaTest(unittest.TestCase):
+
+    def test_whitepoint(self):
+        for factor in gamma.get_whitepoint(gamma.NEUTRAL):
+            self.assertTrue(0.95 < factor <= 1.0)
+        (red, green, blue) = gamma.get_whitepoint(3400)
+        self.assertEqual(red, 1.0)
+        self.assertTrue(0 < blue < green < 1.0)
+
+    def test_ramps(self):
+        tables = gamma.GammaTables(256)
+        ramp = tables.get_ramp(1.0)
+        self.assertEqual((ramp[0], ramp[128], ramp[255]), (0, 32896, 65535))
+        self.assertEqual(tables.get_ramp(0.5)[255], 65535 * 128 // 255)
+        # Nearby factors share the ramp of their level
+        self.assertTrue(tables.get_ramp(0.5) is tables.get_ramp(0.501))
+        self.assertEqual(len([r for r in tables._ramps if r is not None]), 2)
+        dimmed = gamma.GammaTables(256, brightness=0.5)
+        self.assertEqual(dimmed.get_ramp(1.0)[255], 32768)
+
+    def test_long_transition(self):
+        """Transitions with more steps than MAX_STEPS keep their duration"""
+        screen = serialize.from_dict(STATE)
+        transition = gamma.GammaTransition(screen, gamma.NEUTRAL, 3400,
+                                           1800, rate=10, crtcs=[])
+        self.assertEqual(transition.steps, gamma.MAX_STEPS)
+        self.assertEqual(transition.interval, 0.5)
+        short = gamma.GammaTransition(screen, gamma.NEUTRAL, 3400, 2,
+                                      rate=10, crtcs=[])
+        self.assertEqual((short.steps, short.interval), (20, 0.1))
+        # The detached screen cannot be changed
+        self.assertRaises(xrandr.RRError, short.step)
+        self.assertEqual(short.position, 0)
+        transition.close()
+        short.close()
+        screen.close()
+
+if __name__ == "__main__":
+    unittest.main()
+
+# vim:ts=4:sw=4:et
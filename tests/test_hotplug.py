@@ -0,0 +1,195 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Checks the debouncing of the hotplug watcher. The events come from a fake
+# source and the screen is a fake one, so no X server is required.
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import xrandr
+from xrandr import hotplug
+
+EVENT_BASE = 89
+
+class FakeEvent:
+    type = EVENT_BASE + xrandr.RR_SCREEN_CHANGE_NOTIFY
+
+class FakeOutput:
+    def __init__(self, name, connected, mode=0):
+        self.name = name
+        self.connected = connected
+        self._mode = mode
+        self._crtc = None
+        self._x = 0
+        self._y = 0
+        self._rotation = xrandr.RR_ROTATE_0
+
+    def is_connected(self):
+        return self.connected
+
+class FakeScreen:
+    """Reports the outputs of the server only after a reload"""
+    _event_base = EVENT_BASE
+
+    def __init__(self):
+        self.server = [FakeOutput("LVDS", True, 1), FakeOutput("VGA", False)]
+        self.outputs = list(self.server)
+        self.mask = 0
+        self.events = 0
+        self.reloads = 0
+
+    def select_input(self, mask):
+        self.mask = mask
+
+    def handle_event(self, event):
+        self.events += 1
+
+    def reload(self):
+        self.reloads += 1
+        self.outputs = list(self.server)
+
+    def get_outputs(self):
+        return self.outputs
+
+class FakeWatcher(hotplug.HotplugWatcher):
+    """Reads the events from a list, the pipe wakes up select()"""
+    def __init__(self, *args, **kwargs):
+        self.events = []
+        (self._read, self._write) = os.pipe()
+        hotplug.HotplugWatcher.__init__(self, *args, **kwargs)
+
+    def close(self):
+        os.close(self._read)
+        os.close(self._write)
+
+    def send(self, count=1):
+        self.events.extend([FakeEvent()] * count)
+        os.write(self._write, "x")
+
+    def fileno(self):
+        return self._read
+
+    def _read_events(self):
+        if self.events:
+            os.read(self._read, 4096)
+        while self.events:
+            yield self.events.pop(0)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+class HotplugTest(unittest.TestCase):
+
+    def setUp(self):
+        self.screen = FakeScreen()
+        self.changes = []
+        self.watcher = FakeWatcher(self.screen, self.on_change,
+                                   debounce=0.3, max_delay=2.0)
+        self.clock = FakeClock()
+        self.time = hotplug.time
+        hotplug.time = self.clock
+
+    def tearDown(self):
+        hotplug.time = self.time
+        self.watcher.close()
+
+    def on_change(self, screen, changes):
+        self.changes.append(changes)
+
+    def test_select(self):
+        self.assertEqual(self.screen.mask, hotplug.HOTPLUG_MASK)
+        self.assertEqual(self.watcher.get_timeout(), None)
+        self.assertEqual(self.watcher.check(), None)
+
+    def test_coalescing(self):
+        """A burst of events results in a single reload and callback"""
+        self.screen.server[1] = FakeOutput("VGA", True, 2)
+        for i in range(5):
+            self.watcher.send(2)
+            self.assertEqual(self.watcher.process_events(), 2)
+            self.clock.now += 0.1
+            self.assertEqual(self.watcher.check(), None)
+        self.assertEqual(self.screen.events, 10)
+        self.assertEqual(self.screen.reloads, 0)
+        self.clock.now += 0.2
+        changes = self.watcher.check()
+        self.assertEqual(self.changes, [changes])
+        self.assertEqual(changes.added, ["VGA"])
+        self.assertEqual((changes.removed, changes.changed), ([], []))
+        self.assertEqual(changes.events, 10)
+        self.assertEqual(self.screen.reloads, 1)
+        self.assertEqual(self.watcher.get_timeout(), None)
+
+    def test_unchanged(self):
+        """The callback isn't called if the burst didn't change anything"""
+        self.watcher.send()
+        self.watcher.process_events()
+        self.clock.now += 0.3
+        changes = self.watcher.check()
+        self.assertFalse(changes)
+        self.assertEqual(changes.events, 1)
+        self.assertEqual(self.changes, [])
+
+    def test_debounce(self):
+        """Each event extends the burst by the debounce time"""
+        self.watcher.send()
+        self.watcher.process_events()
+        self.assertAlmostEqual(self.watcher.get_timeout(), 0.3)
+        self.clock.now += 0.2
+        self.assertAlmostEqual(self.watcher.get_timeout(), 0.1)
+        self.watcher.send()
+        self.watcher.process_events()
+        self.assertAlmostEqual(self.watcher.get_timeout(), 0.3)
+        self.clock.now += 0.29
+        self.assertEqual(self.watcher.check(), None)
+        self.clock.now += 0.01
+        self.assertEqual(self.watcher.check().events, 2)
+
+    def test_max_delay(self):
+        """A continuous stream of events settles after max_delay"""
+        for i in range(8):
+            self.watcher.send()
+            self.watcher.process_events()
+            self.assertEqual(self.watcher.check(), None)
+            self.clock.now += 0.25
+        self.assertAlmostEqual(self.watcher.get_timeout(), 0)
+        self.assertEqual(self.watcher.check().events, 8)
+        self.assertEqual(self.screen.reloads, 1)
+
+    def test_stop(self):
+        """The callback can stop run() after the current burst"""
+        hotplug.time = self.time
+        self.watcher.debounce = 0.01
+        self.watcher.callback = lambda screen, changes: self.watcher.stop()
+        self.screen.server[0] = FakeOutput("LVDS", False)
+        self.watcher.send(3)
+        self.watcher.run()
+        self.assertEqual(self.screen.reloads, 1)
+
+    def test_stop_thread(self):
+        """Another thread can stop run() without any event"""
+        hotplug.time = self.time
+        self.watcher.max_delay = 0.05
+        thread = threading.Thread(target=self.watcher.run)
+        thread.start()
+        while not self.watcher._running:
+            time.sleep(0.001)
+        self.watcher.stop()
+        thread.join(1.0)
+        self.assertFalse(thread.isAlive())
+        self.assertEqual(self.screen.reloads, 0)
+
+if __name__ == "__main__":
+    unittest.main()
+
+# vim:ts=4:sw=4:et
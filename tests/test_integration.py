@@ -0,0 +1,308 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Runs the bindings and the command line tool end to end. The tests which
+# change the configuration only run against a private Xvfb server, see
+# conftest.py and xvfb.py.
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, TOP)
+
+import xrandr
+from xrandr import gamma, proto, serialize, shm, timings
+
+PRIVATE = bool(os.getenv("XRANDR_TEST_XVFB"))
+
+@unittest.skipUnless(os.getenv("DISPLAY"), "requires a X server")
+class ScreenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.screen = xrandr.get_current_screen()
+
+    def tearDown(self):
+        self.screen.close()
+
+    def test_version(self):
+        self.assertTrue(xrandr.has_extension())
+        self.assertTrue(xrandr.XRANDR_VERSION >= (1,2))
+
+    def test_randr_1_0(self):
+        sizes = self.screen.get_available_sizes()
+        self.assertTrue(sizes)
+        index = self.screen.get_current_size_index()
+        self.assertTrue(0 <= index < len(sizes))
+        rates = self.screen.get_available_rates_for_size_index(index)
+        self.assertTrue(self.screen.get_current_rate() in rates)
+        self.assertTrue(self.screen.get_current_rotation() & \
+                        self.screen.get_available_rotations())
+
+    def test_outputs_and_crtcs(self):
+        outputs = self.screen.get_outputs()
+        self.assertTrue(outputs)
+        for output in outputs:
+            self.assertTrue(output is \
+                            self.screen.get_output_by_name(output.name))
+            self.assertTrue(output is self.screen.get_output_by_id(output.id))
+            for crtc in output.get_crtcs():
+                self.assertTrue(crtc in self.screen.crtcs)
+            if output.is_active():
+                self.assertTrue(output.get_current_resolution() in \
+                                output.get_available_resolutions())
+
+    def test_current_config_is_valid(self):
+        self.assertEqual(self.screen.validate(), [])
+        snapshot = self.screen.get_snapshot()
+        self.assertEqual((snapshot.width, snapshot.height),
+                         self.screen.get_size()[:2])
+
+    def test_reload_keeps_instances(self):
+        outputs = dict(self.screen.outputs)
+        self.screen.reload()
+        for (name, output) in outputs.items():
+            self.assertTrue(self.screen.outputs[name] is output)
+
+    def test_lazy_outputs(self):
+        screen = xrandr.get_current_screen()
+        try:
+            outputs = screen._outputs_by_id.values()
+            self.assertFalse([o for o in outputs \
+                              if o._is_loaded() and not o._mode])
+            self.assertEqual(sorted(screen.get_output_names()),
+                             sorted(self.screen.get_output_names()))
+        finally:
+            screen.close()
+
+    def test_connected_only(self):
+        screen = xrandr.get_current_screen(connected_only=True)
+        try:
+            names = [o.name for o in self.screen.get_outputs() \
+                     if o.is_connected() or o.is_active()]
+            self.assertEqual(sorted(screen.get_output_names()),
+                             sorted(names))
+        finally:
+            screen.close()
+
+    def test_serialize(self):
+        data = serialize.dumps(self.screen)
+        detached = serialize.loads(data)
+        self.assertEqual(serialize.to_dict(detached),
+                         serialize.to_dict(self.screen))
+
+    def test_wire_backend(self):
+        """The pure Python client reads the same state as libXrandr"""
+        detached = xrandr.get_current_screen(wire=True)
+        self.assertEqual(serialize.to_dict(detached),
+                         serialize.to_dict(self.screen))
+        detached.close()
+
+    def test_wire_replies(self):
+        connection = proto.Connection()
+        try:
+            randr = proto.RandR(connection)
+            state = randr.get_screen_state(connection.get_root())
+        finally:
+            connection.close()
+        resources = self.screen._resources.contents
+        self.assertEqual(state.crtcs, resources.crtcs[:resources.ncrtc])
+        self.assertEqual(state.outputs,
+                         resources.outputs[:resources.noutput])
+        self.assertEqual([(m.id, m.name, m.dotClock) for m in state.modes],
+                         [(m.id, m.name, m.dotClock) for m in \
+                          resources.modes[:resources.nmode]])
+        for crtc in self.screen.crtcs:
+            info = crtc._info.contents
+            reply = state.crtc_infos[crtc.xid]
+            self.assertEqual((reply.x, reply.y, reply.width, reply.height,
+                              reply.mode, reply.rotation, reply.outputs),
+                             (info.x, info.y, info.width, info.height,
+                              info.mode, info.rotation,
+                              info.outputs[:info.noutput]))
+        for output in self.screen.get_outputs():
+            info = output._info.contents
+            reply = state.output_infos[output.id]
+            self.assertEqual((reply.name, reply.connection, reply.crtc,
+                              reply.crtcs, reply.modes, reply.npreferred),
+                             (info.name, info.connection, info.crtc,
+                              info.crtcs[:info.ncrtc],
+                              info.modes[:info.nmode], info.npreferred))
+
+    def test_providers(self):
+        if xrandr.XRANDR_VERSION < (1,4):
+            self.skipTest("providers require RandR 1.4")
+        for provider in self.screen.get_providers():
+            self.assertTrue(provider is \
+                            self.screen.get_provider_by_xid(provider.xid))
+            for crtc in provider.get_crtcs():
+                self.assertTrue(crtc in self.screen.crtcs)
+            for (other, capability) in provider.get_associated_providers():
+                self.assertTrue(other in self.screen.providers)
+
+    def test_shared_state(self):
+        path = tempfile.mktemp()
+        publisher = shm.SharedStatePublisher(self.screen, path)
+        try:
+            reader = shm.SharedStateReader(path)
+            sequence = reader.get_sequence()
+            state = reader.read()
+            self.assertEqual((state.width, state.height),
+                             self.screen.get_size()[:2])
+            for output in state.outputs:
+                self.assertTrue(self.screen.outputs[output.name].id == \
+                                output.id)
+            publisher.publish()
+            self.assertTrue(reader.has_changed(sequence))
+            reader.close()
+        finally:
+            publisher.close()
+            os.unlink(path)
+
+    def test_monitors(self):
+        for monitor in self.screen.get_monitors():
+            (x, y, width, height) = monitor.get_geometry()
+            self.assertTrue(width > 0 and height > 0)
+
+    def test_cli_info(self):
+        output = subprocess.Popen([sys.executable,
+                                   os.path.join(TOP, "pyxrandr"),
+                                   "--verbose"],
+                                  stdout=subprocess.PIPE).communicate()[0]
+        self.assertTrue("XRandR" in output)
+
+@unittest.skipUnless(PRIVATE, "requires a private Xvfb server")
+class ConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.screen = xrandr.get_current_screen()
+        self.saved = self.screen.save_state()
+        self.output = [o for o in self.screen.get_outputs() \
+                       if o.is_connected()][0]
+
+    def tearDown(self):
+        self.screen.reload()
+        self.screen.restore_state(self.saved)
+        self.screen.close()
+
+    def _add_mode(self, width, height):
+        """Adds a CVT mode to the output and returns its position"""
+        mode = timings.cvt(width, height, 60, timings.CVT_REDUCED)
+        xid = self.output.add_mode(mode)
+        self.screen.reload()
+        for (pos, info) in enumerate(self.output.get_available_modes()):
+            if info.id == xid:
+                return pos
+        self.fail("The created mode is not available")
+
+    def test_second_screen(self):
+        screen = xrandr.get_screen_of_display(os.getenv("DISPLAY"), 1)
+        self.assertEqual(screen.get_size()[:2], (1024, 768))
+        screen.close()
+
+    def test_apply_and_restore(self):
+        pos = self._add_mode(800, 600)
+        self.output.set_to_mode(pos)
+        report = self.screen.apply_output_config()
+        self.assertTrue(report.total > 0)
+        self.assertTrue(report.get_duration("set-crtc-config") > 0)
+        # The confirm phase ends with the events of the server
+        self.assertTrue(report.confirmation.wait(5) is not None)
+        self.assertTrue(report.get_duration("confirm") > 0)
+        self.screen.reload()
+        self.assertEqual(self.output.get_current_resolution(), (800, 600))
+        self.screen.restore_state(self.saved)
+        self.assertEqual(self.screen.save_state()["crtcs"],
+                         self.saved["crtcs"])
+
+    def test_confirmation(self):
+        pos = self._add_mode(800, 600)
+        self.output.set_to_mode(pos)
+        confirmation = self.screen.apply_output_config().confirmation
+        state = confirmation.wait(5)
+        self.assertTrue(state is not None)
+        self.assertEqual(state.get_output(self.output.name).size, (800, 600))
+        self.assertTrue(self.output.get_crtc() in confirmation.crtcs)
+        # Nothing has to be confirmed without changes
+        confirmation = self.screen.apply_output_config().confirmation
+        self.assertTrue(confirmation.is_done())
+
+    def test_resize_virtual(self):
+        for (width, height) in ((1000, 700), (1100, 650), (900, 600)):
+            self.screen.resize_virtual(width, height, self.output)
+            snapshot = self.screen.get_snapshot()
+            self.assertEqual((snapshot.width, snapshot.height),
+                             (width, height))
+            screen = xrandr.get_current_screen()
+            output = screen.get_output_by_name(self.output.name)
+            self.assertEqual(output.get_current_resolution(), (width, height))
+            self.assertEqual(screen.get_size()[:2], (width, height))
+            # The cached RandR 1.0 configuration follows the resize
+            self.assertEqual(self.screen.get_current_size_index(),
+                             screen.get_current_size_index())
+            screen.close()
+        # The created mode gets reused
+        modes = dict(self.screen._virtual_modes)
+        self.screen.resize_virtual(1000, 700, self.output)
+        self.assertEqual(dict(self.screen._virtual_modes), modes)
+
+    def test_timed_revert(self):
+        pos = self._add_mode(640, 480)
+        self.output.set_to_mode(pos)
+        pending = self.screen.apply_output_config(revert_after=0.2).pending
+        time.sleep(1)
+        self.assertTrue(pending.is_reverted())
+        self.assertEqual(pending.error, None)
+        self.screen.reload()
+        self.assertEqual(self.screen.save_state()["crtcs"],
+                         self.saved["crtcs"])
+
+    def test_confirm(self):
+        pos = self._add_mode(640, 480)
+        self.output.set_to_mode(pos)
+        pending = self.screen.apply_output_config(revert_after=0.5).pending
+        self.assertTrue(pending.confirm())
+        time.sleep(1)
+        self.screen.reload()
+        self.assertEqual(self.output.get_current_resolution(), (640, 480))
+
+    def test_invalid_config(self):
+        self.output._mode = 0xdead
+        self.assertRaises(xrandr.InvalidConfigError,
+                          self.screen.apply_output_config)
+
+    def test_gamma_transition(self):
+        crtc = self.screen.get_crtc_by_xid(self.output.get_crtc())
+        size = crtc.get_gamma_size()
+        if not size:
+            self.skipTest("the crtc has got no gamma ramps")
+        original = crtc.get_gamma()
+        transition = gamma.GammaTransition(self.screen, gamma.NEUTRAL, 3400,
+                                           0.5, rate=20, crtcs=[crtc])
+        try:
+            transition.start()
+            transition.wait(5)
+            self.assertTrue(transition.is_done())
+            (red, green, blue) = crtc.get_gamma()
+            self.assertEqual(len(red), size)
+            self.assertTrue(blue[-1] < green[-1] < red[-1])
+        finally:
+            transition.close()
+            crtc.set_gamma(original)
+
+    def test_cli_preferred(self):
+        status = subprocess.call([sys.executable,
+                                  os.path.join(TOP, "pyxrandr"),
+                                  "--output", self.output.name,
+                                  "--preferred"],
+                                 stdout=open(os.devnull, "w"))
+        self.assertEqual(status, 0)
+
+if __name__ == "__main__":
+    unittest.main()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Checks that creating and discarding screens doesn't leak memory. Requires
+# a running X server with the RandR extension.
+
+import gc
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import xrandr
+
+ROUNDS = 2000
+# Allowed growth of the resident set size in kB
+THRESHOLD = 2048
+
+def get_rss():
+    """Returns the resident set size of the process in kB"""
+    pages = int(open("/proc/self/statm").read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024
+
+@unittest.skipUnless(os.getenv("DISPLAY") and os.path.exists("/proc/self"),
+                     "requires a X server and procfs")
+class LeakTest(unittest.TestCase):
+
+    def _run(self, create):
+        # Warm up caches and allocator pools first
+        for i in range(100):
+            create()
+        gc.collect()
+        start = get_rss()
+        for i in range(ROUNDS):
+            create()
+        gc.collect()
+        growth = get_rss() - start
+        self.assertTrue(growth < THRESHOLD,
+                        "RSS grew by %s kB after %s screens" % (growth,
+                                                                ROUNDS))
+        self.assertEqual(gc.garbage, [])
+
+    def test_close(self):
+        """Screens that are closed explicitly"""
+        def create():
+            screen = xrandr.get_current_screen()
+            screen.get_outputs()
+            screen.close()
+        self._run(create)
+
+    def test_context_manager(self):
+        """Screens that are used as context manager"""
+        def create():
+            with xrandr.get_current_screen() as screen:
+                for output in screen.get_outputs():
+                    output.get_available_modes()
+        self._run(create)
+
+    def test_garbage_collection(self):
+        """Screens that are only dropped"""
+        def create():
+            screen = xrandr.get_current_screen()
+            for crtc in screen.crtcs:
+                crtc.get_outputs()
+        self._run(create)
+
+if __name__ == "__main__":
+    unittest.main()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,154 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Checks the mode table and the mode queries of an output with mode lines
+# of common monitors. Doesn't require a running X server.
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import xrandr
+from xrandr import modes
+
+class Mode:
+    """A mode line with the attributes of XRRModeInfo"""
+    def __init__(self, xid, width, height, dot_clock, h_total, v_total,
+                 flags=0):
+        self.id = xid
+        self.name = "%sx%s" % (width, height)
+        self.width = width
+        self.height = height
+        self.dotClock = dot_clock
+        self.hSyncStart = self.hSyncEnd = width
+        self.hTotal = h_total
+        self.hSkew = 0
+        self.vSyncStart = self.vSyncEnd = height
+        self.vTotal = v_total
+        self.modeFlags = flags
+
+MODES = (Mode(1, 1920, 1080, 148500000, 2200, 1125),
+         Mode(2, 1920, 1080, 148351648, 2200, 1125),
+         Mode(3, 1920, 1080, 74250000, 2640, 1125, xrandr.RR_INTERLACE),
+         Mode(4, 1280, 1024, 108000000, 1688, 1066),
+         Mode(5, 1280, 720, 74250000, 1650, 750),
+         Mode(6, 640, 480, 25175000, 800, 525, xrandr.RR_DOUBLE_SCAN),
+         Mode(7, 1600, 1200, 162000000, 2160, 1250))
+
+# The modes of the output, 99 isn't part of the table
+OUTPUT_MODES = (5, 1, 2, 4, 3, 99)
+
+class ModeTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = modes.ModeTable(MODES)
+
+    def test_rows(self):
+        table = self.table
+        self.assertEqual(len(table), 7)
+        self.assertTrue(4 in table)
+        self.assertFalse(99 in table)
+        self.assertEqual(table.index(4), 3)
+        self.assertEqual(table.index(99), None)
+        self.assertEqual(list(table.width), [1920, 1920, 1920, 1280, 1280,
+                                             640, 1600])
+        row = table.get_row(3)
+        self.assertEqual((row["id"], row["name"], row["height"]),
+                         (4, "1280x1024", 1024))
+
+    def test_rates(self):
+        """The rates are precise and take the flags into account"""
+        self.assertEqual(self.table.get_rate(1), 60.0)
+        self.assertAlmostEqual(self.table.get_rate(2), 59.94006, 5)
+        self.assertAlmostEqual(self.table.get_rate(4), 60.01974, 5)
+        # Interlaced modes show two fields per frame, double scan modes
+        # each line twice
+        self.assertEqual(self.table.get_rate(3), 50.0)
+        self.assertAlmostEqual(self.table.get_rate(6), 29.97024, 5)
+        self.assertEqual(self.table.get_rate(99), None)
+
+    def test_select(self):
+        table = self.table
+        self.assertEqual(table.select(min_width=1280, max_height=1080),
+                         [0, 1, 2, 3, 4])
+        self.assertEqual(table.select(min_rate=59.9, max_rate=60.0),
+                         [0, 1, 4, 6])
+        self.assertEqual(table.select(max_dot_clock=74250000), [2, 4, 5])
+        self.assertEqual(table.select(ids=[7, 99, 2, 3]), [1, 2, 6])
+        self.assertEqual(table.select(ids=[1, 2, 3],
+                                      exclude_flags=xrandr.RR_INTERLACE),
+                         [0, 1])
+        self.assertEqual(table.select(min_width=4096), [])
+
+    def test_filter(self):
+        table = self.table.filter(min_width=1920, order_by="dotClock",
+                                  reverse=True)
+        self.assertEqual(list(table.id), [1, 2, 3])
+        self.assertEqual(table.name, ["1920x1080"] * 3)
+        self.assertEqual(table.index(3), 2)
+        self.assertEqual(table.get_rate(3), 50.0)
+        self.assertEqual(self.table.sort([3, 5, 6], "width"), [5, 3, 6])
+
+class ModeQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.query = modes.ModeQuery(modes.ModeTable(MODES), OUTPUT_MODES)
+
+    def test_indexes(self):
+        query = self.query
+        self.assertEqual(len(query), 5)
+        self.assertEqual([query.get_xid(p) for p in range(5)],
+                         [5, 1, 2, 4, 3])
+        self.assertTrue(3 in query)
+        self.assertFalse(7 in query)
+        self.assertEqual(query.resolutions(),
+                         [(1280, 720), (1280, 1024), (1920, 1080)])
+        self.assertEqual(query.resolutions(reverse=True)[0], (1920, 1080))
+        rates = query.rates(1920, 1080)
+        self.assertEqual(rates[0], 50.0)
+        self.assertAlmostEqual(rates[1], 59.94006, 5)
+        self.assertEqual(rates[2], 60.0)
+        self.assertEqual(query.rates(1920, 1080, reverse=True)[0], 60.0)
+        self.assertEqual(query.rates(640, 480), [])
+        self.assertEqual(query.aspects(), [(5, 4), (16, 9)])
+
+    def test_find(self):
+        query = self.query
+        self.assertEqual(query.find(1920, 1080), [1, 2, 4])
+        self.assertEqual(query.find(1920, 1080, 59.94), [2])
+        self.assertEqual(query.find(1920, 1080, 59.95, tolerance=0.1),
+                         [1, 2])
+        self.assertEqual(query.find(1600, 1200), [])
+        # Rates are indexed with two decimals
+        self.assertEqual(query.with_rate(60), [0, 1])
+        self.assertEqual(query.with_rate(60.02), [3])
+        self.assertEqual(query.with_rate(59.94), [2])
+
+    def test_best_mode(self):
+        """The largest mode wins, then the highest rate and the lowest
+           pixel clock"""
+        query = self.query
+        self.assertEqual(query.get_xid(query.best_mode()), 1)
+        self.assertEqual(query.get_xid(query.best_mode(min_rate=60.01)), 4)
+        self.assertEqual(query.get_xid(
+            query.best_mode(max_pixel_clock=148400000)), 2)
+        self.assertEqual(query.get_xid(query.best_mode(max_width=1280)), 4)
+        self.assertEqual(query.get_xid(query.best_mode(max_height=800)), 5)
+        self.assertEqual(query.best_mode(min_rate=75), None)
+
+    def test_best_mode_aspect(self):
+        query = self.query
+        self.assertEqual(query.get_xid(
+            query.best_mode(aspect=(16, 9), max_width=1280)), 5)
+        self.assertEqual(query.get_xid(query.best_mode(aspect=1.25)), 4)
+        # 1366 x 768 is close enough to 16:9
+        self.assertEqual(query.get_xid(query.best_mode(aspect=1366/768.0)),
+                         1)
+        self.assertEqual(query.best_mode(aspect=(4, 3)), None)
+
+if __name__ == "__main__":
+    unittest.main()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Compares the number of X requests and the wall time of common
+# operations with the baselines in baselines.json. A missing baseline
+# fails the test, XRANDR_UPDATE_BASELINES=1 records all of them again.
+# The wall time may exceed its baseline by TIME_FACTOR and TIME_SLACK,
+# since it depends on the machine. Only runs against a private Xvfb
+# server, since the numbers depend on it.
+
+import json
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import xrandr
+from xrandr import serialize
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "baselines.json")
+ROUNDS = 20
+# Allowed slow down against the baseline and an absolute slack in seconds
+# for the noise of shared build machines
+TIME_FACTOR = 2.0
+TIME_SLACK = 0.005
+
+@unittest.skipUnless(os.getenv("XRANDR_TEST_XVFB"),
+                     "requires a private Xvfb server")
+class PerformanceTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.baselines = {}
+        if os.path.exists(BASELINES):
+            cls.baselines = json.load(open(BASELINES))
+        cls.changed = False
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.changed:
+            out = open(BASELINES, "w")
+            json.dump(cls.baselines, out, indent=4, sort_keys=True,
+                      separators=(",", ": "))
+            out.write("\n")
+            out.close()
+
+    def setUp(self):
+        self.dpy = xrandr.get_current_display()
+
+    def tearDown(self):
+        xrandr.xlib.XCloseDisplay(self.dpy)
+
+    def measure(self, name, func):
+        """Runs the function several times and compares the number of
+           requests and the median wall time with the baseline"""
+        func()
+        times = []
+        for i in range(ROUNDS):
+            xrandr.xlib.XSync(self.dpy, False)
+            request = xrandr.xlib.XNextRequest(self.dpy)
+            start = time.time()
+            func()
+            xrandr.xlib.XSync(self.dpy, False)
+            times.append(time.time() - start)
+            # XSync itself sends one request
+            requests = xrandr.xlib.XNextRequest(self.dpy) - request - 1
+        times.sort()
+        result = {"seconds": times[len(times) // 2], "requests": requests}
+        if os.getenv("XRANDR_UPDATE_BASELINES"):
+            self.baselines[name] = result
+            self.__class__.changed = True
+            return
+        baseline = self.baselines.get(name, {})
+        if "requests" not in baseline or "seconds" not in baseline:
+            self.fail("There isn't any baseline of %s, run the test with "
+                      "XRANDR_UPDATE_BASELINES=1 to record it" % name)
+        self.assertTrue(result["requests"] <= baseline["requests"],
+                        "%s sends %s requests instead of %s" % \
+                        (name, result["requests"], baseline["requests"]))
+        limit = baseline["seconds"] * TIME_FACTOR + TIME_SLACK
+        self.assertTrue(result["seconds"] <= limit,
+                        "%s takes %.4fs instead of %.4fs" % \
+                        (name, result["seconds"], baseline["seconds"]))
+
+    def test_screen_load(self):
+        def load():
+            xrandr.Screen(self.dpy).close()
+        self.measure("screen_load", load)
+
+    def test_reload(self):
+        screen = xrandr.Screen(self.dpy)
+        self.measure("reload", screen.reload)
+        screen.close()
+
+    def test_queries(self):
+        screen = xrandr.Screen(self.dpy)
+        def query():
+            for output in screen.get_outputs():
+                output.get_available_resolutions()
+                output.get_available_rotations()
+                output.get_best_mode()
+            screen.get_available_sizes()
+            screen.get_current_rate()
+        self.measure("queries", query)
+        screen.close()
+
+    def test_validate(self):
+        screen = xrandr.Screen(self.dpy)
+        self.measure("validate", screen.validate)
+        screen.close()
+
+    def test_serialize(self):
+        screen = xrandr.Screen(self.dpy)
+        def round_trip():
+            serialize.loads(serialize.dumps(screen)).close()
+        self.measure("serialize", round_trip)
+        screen.close()
+
+    def test_apply_unchanged(self):
+        screen = xrandr.Screen(self.dpy)
+        self.measure("apply_unchanged", screen.apply_output_config)
+        screen.close()
+
+    def test_resize_virtual(self):
+        screen = xrandr.Screen(self.dpy)
+        saved = screen.save_state()
+        sizes = [(1000, 700), (1100, 800)]
+        def resize():
+            sizes.reverse()
+            screen.resize_virtual(*sizes[0])
+        try:
+            self.measure("resize_virtual", resize)
+        finally:
+            screen.reload()
+            screen.restore_state(saved)
+            screen.close()
+
+if __name__ == "__main__":
+    unittest.main()
+
+# vim:ts=4:sw=4:et
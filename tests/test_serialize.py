@@ -0,0 +1,177 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Checks the serialization of screens and the detached screens. Neither
+# requires a running X server.
+
+import ctypes
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import xrandr
+from xrandr import core, gamma, serialize
+
+def get_mode(xid, width, height):
+    return {"id": xid, "name": "%sx%s" % (width, height), "width": width,
+            "height": height, "dotClock": 148500000,
+            "hSyncStart": width + 88, "hSyncEnd": width + 132,
+            "hTotal": width + 280, "hSkew": 0, "vSyncStart": height + 4,
+            "vSyncEnd": height + 9, "vTotal": height + 45, "modeFlags": 5}
+
+def get_pending(mode=0, crtc=0, x=0, y=0, scale=None, relation=None,
+                relative_to=None, changes=0):
+    return {"mode": mode, "crtc": crtc, "x": x, "y": y, "rotation": 1,
+            "scale": scale, "relation": relation, "relative_to": relative_to,
+            "relation_offset": 0, "changes": changes}
+
+STATE = {"version": 1,
+         "screen": 0,
+         "size": [1920, 1080, 508, 285],
+         "size_range": [320, 200, 8192, 8192],
+         "timestamp": 1000,
+         "config_timestamp": 900,
+         "primary": 0x42,
+         "config": {"sizes": [[1920, 1080, 508, 285], [1280, 720, 508, 285]],
+                    "rates": [[60, 50], [60]],
+                    "rotations": 15,
+                    "rotation": 1,
+                    "size_index": 0,
+                    "rate": 60},
+         "modes": [get_mode(0x50, 1920, 1080), get_mode(0x51, 1280, 720),
+                   get_mode(0x52, 1280, 720)],
+         "crtcs": [{"xid": 0x3f, "timestamp": 1000, "x": 0, "y": 0,
+                    "width": 1920, "height": 1080, "mode": 0x50,
+                    "rotation": 1, "rotations": 15, "outputs": [0x42],
+                    "possible": [0x42, 0x43]},
+                   {"xid": 0x40, "timestamp": 1000, "x": 0, "y": 0,
+                    "width": 0, "height": 0, "mode": 0, "rotation": 1,
+                    "rotations": 1, "outputs": [], "possible": [0x43]}],
+         "outputs": [{"id": 0x42, "timestamp": 1000, "crtc": 0x3f,
+                      "name": "HDMI-1", "mm_width": 508, "mm_height": 285,
+                      "connection": 0, "subpixel_order": 0,
+                      "crtcs": [0x3f], "clones": [], "npreferred": 0,
+                      "modes": [0x50, 0x51],
+                      "pending": get_pending(0x50, 0x3f)},
+                     {"id": 0x43, "timestamp": 1000, "crtc": 0,
+                      "name": "DP-1", "mm_width": 300, "mm_height": 200,
+                      "connection": 0, "subpixel_order": 0,
+                      "crtcs": [0x3f, 0x40], "clones": [0x42],
+                      "npreferred": 0, "modes": [0x52],
+                      "pending": get_pending(0x52, relation=2,
+                                             relative_to="HDMI-1",
+                                             changes=6)}]}
+
+class SerializeTest(unittest.TestCase):
+
+    def test_binary_round_trip(self):
+        """The binary format keeps all values of the dictionary"""
+        data = serialize.dict_to_bytes(STATE)
+        self.assertEqual(serialize.bytes_to_dict(data), STATE)
+
+    def test_truncated(self):
+        data = serialize.dict_to_bytes(STATE)
+        self.assertRaises(xrandr.RRError, serialize.bytes_to_dict,
+                          data[:-3])
+
+    def test_detached_screen(self):
+        """The detached screen answers queries and validates offline"""
+        screen = serialize.from_dict(STATE)
+        self.assertEqual(sorted(screen.get_output_names()),
+                         ["DP-1", "HDMI-1"])
+        self.assertEqual(screen.get_primary_output().name, "HDMI-1")
+        dp = screen.get_output_by_name("DP-1")
+        self.assertEqual(dp.get_available_resolutions(), [(1280, 720)])
+        self.assertEqual(dp._relative_to.name, "HDMI-1")
+        self.assertEqual([c.xid for c in dp.get_crtcs()], [0x3f, 0x40])
+        self.assertEqual(screen.validate(), [])
+        state = screen.get_requested_state()
+        self.assertEqual((state["DP-1"]["x"], state["DP-1"]["y"]),
+                         (1920, 0))
+        self.assertEqual(serialize.to_dict(screen), STATE)
+        self.assertRaises(xrandr.RRError, screen.apply_output_config)
+        screen.close()
+
+    def test_snapshot(self):
+        """The snapshot holds the reported configuration of the active
+           outputs and leaves out staged changes"""
+        screen = serialize.from_dict(STATE)
+        snapshot = screen.get_snapshot()
+        self.assertEqual([o.name for o in snapshot.outputs], ["HDMI-1"])
+        hdmi = snapshot.get_output("HDMI-1")
+        self.assertEqual((hdmi.mode, hdmi.crtc, hdmi.size, hdmi.scale),
+                         (0x50, 0x3f, (1920, 1080), None))
+        screen.get_output_by_name("HDMI-1").set_to_mode(1)
+        self.assertTrue(screen.get_snapshot() is snapshot)
+        # A confirmed change of the unused crtc, which has got an output
+        # now
+        dp = screen.get_output_by_name("DP-1")
+        crtc = screen.get_crtc_by_xid(0x40)
+        crtc.add_output(dp)
+        crtc._update_info(0x52, 1920, 0, 1280, 720, 1)
+        screen._publish()
+        dp = screen.get_snapshot().get_output("DP-1")
+        self.assertEqual((dp.mode, dp.crtc, dp.x, dp.size),
+                         (0x52, 0x40, 1920, (1280, 720)))
+        self.assertEqual(serialize.to_dict(screen)["crtcs"][1]["outputs"],
+                         [0x43])
+        screen.close()
+
+    def test_crtc_differs_from_server(self):
+        """Only crtcs whose configuration changes have to be confirmed"""
+        screen = serialize.from_dict(STATE)
+        hdmi = screen.get_output_by_name("HDMI-1")
+        (crtc, unused) = screen.crtcs
+        # Arranging the outputs marks them as changed
+        hdmi._changes = xrandr.CHANGES_POSITION
+        self.assertTrue(crtc.has_changed())
+        self.assertFalse(crtc._differs_from_server())
+        self.assertFalse(unused._differs_from_server())
+        hdmi._x = 100
+        self.assertTrue(crtc._differs_from_server())
+        screen.close()
+
+    def test_detached_server_methods(self):
+        """Methods which talk to the server raise instead of passing a
+           NULL display to Xlib"""
+        screen = serialize.from_dict(STATE)
+        hdmi = screen.get_output_by_name("HDMI-1")
+        crtc = screen.get_crtc_by_xid(0x3f)
+        info = core._XRRProviderInfo(name="GPU-0")
+        provider = core.Provider(ctypes.pointer(info), 0x60, screen)
+        calls = [(hdmi.add_mode, 0x51), (hdmi.delete_mode, 0x51),
+                 (hdmi.get_property_names,), (hdmi.get_property, "EDID"),
+                 (hdmi.get_property_range, "Backlight"),
+                 (hdmi.set_property, "Backlight", 10),
+                 (crtc.set_config, 0, 0, 0x50, [hdmi]),
+                 (crtc.get_gamma_size,), (crtc.get_gamma,),
+                 (crtc.set_gamma, ([0], [0], [0])),
+                 (crtc.get_transform,),
+                 (crtc.set_transform, [[1, 0, 0], [0, 1, 0], [0, 0, 1]]),
+                 (crtc.get_panning,), (crtc.set_panning, 0, 0, 0, 0),
+                 (provider.set_output_source, None),
+                 (provider.set_offload_sink, None),
+                 (screen.batch,), (screen._flush,),
+                 (screen.fade_backlights, {hdmi: 10}, 0.1),
+                 (screen.resize_virtual, 1280, 720)]
+        for call in calls:
+            self.assertRaises(xrandr.RRError, *call)
+        screen.close()
+
+    def test_detached_gamma_transition(self):
+        """A failed setup of a transition leaves it closeable"""
+        screen = serialize.from_dict(STATE)
+        self.assertRaises(xrandr.RRError, gamma.GammaTransition, screen,
+                          gamma.NEUTRAL, 3400, 1.0)
+        transition = gamma.GammaTransition(screen, gamma.NEUTRAL, 3400,
+                                           1.0, crtcs=[])
+        transition.close()
+        transition.close()
+        screen.close()
+
+if __name__ == "__main__":
+    unittest.main()
+
+# vim:ts=4:sw=4:et
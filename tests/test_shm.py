@@ -0,0 +1,74 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Checks the shared state file. The state of a detached screen is
+# published, so that neither the publisher nor the reader need a X server.
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, TOP)
+
+from xrandr import serialize, shm
+
+from test_serialize import STATE
+
+# Reads the state in a process without a display and prints the outputs
+READER = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from xrandr import core, shm
+state = shm.read_state(sys.argv[2])
+assert core.xlib._cdll is None and core.rr._cdll is None
+print " ".join([output.name for output in state.outputs])
+"""
+
+class SharedStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mktemp()
+        self.screen = serialize.from_dict(STATE)
+        self.publisher = shm.SharedStatePublisher(self.screen, self.path)
+
+    def tearDown(self):
+        self.publisher.close()
+        self.screen.close()
+        os.unlink(self.path)
+
+    def test_read(self):
+        reader = shm.SharedStateReader(self.path)
+        try:
+            sequence = reader.get_sequence()
+            state = reader.read()
+            self.assertEqual((state.width, state.height), (1920, 1080))
+            self.assertEqual(state.primary, 0x42)
+            hdmi = state.outputs[1]
+            self.assertEqual((hdmi.name, hdmi.crtc, hdmi.mode, hdmi.size),
+                             ("HDMI-1", 0x3f, 0x50, (1920, 1080)))
+            self.assertEqual(hdmi.modes, (0x50, 0x51))
+            self.assertEqual(reader.get_monitor_geometry()[1],
+                             ("HDMI-1", 0, 0, 1920, 1080))
+            self.publisher.publish()
+            self.assertTrue(reader.has_changed(sequence))
+        finally:
+            reader.close()
+
+    def test_read_without_display(self):
+        """The reader neither needs the X libraries nor a display"""
+        env = dict(os.environ)
+        env.pop("DISPLAY", None)
+        process = subprocess.Popen([sys.executable, "-c", READER, TOP,
+                                    self.path],
+                                   stdout=subprocess.PIPE, env=env)
+        output = process.communicate()[0]
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(output.split(), ["DP-1", "HDMI-1"])
+
+if __name__ == "__main__":
+    unittest.main()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Compares the calculated mode lines with the output of the cvt and gtf
+# tools of X.org.
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from xrandr import timings
+
+class TimingsTest(unittest.TestCase):
+
+    def test_cvt(self):
+        mode = timings.cvt(1920, 1080, 60)
+        self.assertEqual(mode.to_modeline(),
+                         '"1920x1080_60.00" 173.00 1920 2048 2248 2576 '
+                         '1080 1083 1088 1120 -hsync +vsync')
+        mode = timings.cvt(800, 600, 60)
+        self.assertEqual(mode.to_modeline(),
+                         '"800x600_60.00" 38.25 800 832 912 1024 '
+                         '600 603 607 624 -hsync +vsync')
+        mode = timings.cvt(640, 480, 60)
+        self.assertEqual(mode.to_modeline(),
+                         '"640x480_60.00" 23.75 640 664 720 800 '
+                         '480 483 487 500 -hsync +vsync')
+
+    def test_cvt_granularity(self):
+        """The width is rounded down to the character cell, the name
+           follows the rounded width"""
+        mode = timings.cvt(1366, 768, 60)
+        self.assertEqual(mode.to_modeline(),
+                         '"1360x768_60.00" 84.75 1360 1432 1568 1776 '
+                         '768 771 781 798 -hsync +vsync')
+
+    def test_cvt_reduced(self):
+        mode = timings.cvt(1920, 1080, 60, timings.CVT_REDUCED)
+        self.assertEqual(mode.to_modeline(),
+                         '"1920x1080_60.00R" 138.50 1920 1968 2000 2080 '
+                         '1080 1083 1088 1111 +hsync -vsync')
+
+    def test_cvt_reduced_v2(self):
+        mode = timings.cvt(3840, 2160, 60, timings.CVT_REDUCED_V2)
+        self.assertEqual(mode.dotClock, 522614000)
+        self.assertEqual((mode.hTotal, mode.vTotal), (3920, 2222))
+        standard = timings.cvt(3840, 2160, 60)
+        # Reduced blanking saves more than a fifth of the pixel clock
+        self.assertTrue(mode.dotClock < standard.dotClock * 0.8)
+
+    def test_gtf(self):
+        mode = timings.gtf(1920, 1080, 60)
+        self.assertEqual(mode.to_modeline(),
+                         '"1920x1080_60.00" 172.80 1920 2040 2248 2576 '
+                         '1080 1081 1084 1118 -hsync +vsync')
+        self.assertAlmostEqual(mode.get_rate(), 60.0, 1)
+
+if __name__ == "__main__":
+    unittest.main()
+
+# vim:ts=4:sw=4:et
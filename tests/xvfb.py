@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Starts a private Xvfb server for the tests. Can also be used to run a
+# command against a private server:
+#
+#   python tests/xvfb.py python -m unittest discover tests
+
+import os
+import subprocess
+import sys
+
+# Size and depth of each screen of the server
+SCREENS = ((1280, 1024, 24), (1024, 768, 24))
+
+def find_xvfb():
+    """Returns the path of the Xvfb binary or None"""
+    for path in os.getenv("PATH", "").split(os.pathsep):
+        binary = os.path.join(path, "Xvfb")
+        if os.access(binary, os.X_OK):
+            return binary
+    return None
+
+class Xvfb:
+    """A private Xvfb server with several RandR capable screens"""
+    def __init__(self, screens=SCREENS):
+        self.screens = screens
+        self.process = None
+        self.display = None
+
+    def start(self):
+        """Starts the server and returns the name of its display"""
+        args = [find_xvfb() or "Xvfb", "-nolisten", "tcp", "-noreset",
+                "+extension", "RANDR"]
+        for (i, (width, height, depth)) in enumerate(self.screens):
+            args.extend(["-screen", str(i),
+                         "%sx%sx%s" % (width, height, depth)])
+        # The server picks a free display and writes its number to the pipe
+        (read, write) = os.pipe()
+        args.extend(["-displayfd", str(write)])
+        devnull = open(os.devnull, "w")
+        self.process = subprocess.Popen(args, stdout=devnull,
+                                        stderr=devnull)
+        os.close(write)
+        number = ""
+        while not number.endswith("\n"):
+            data = os.read(read, 16)
+            if not data:
+                break
+            number += data
+        os.close(read)
+        if not number.strip():
+            self.stop()
+            raise OSError("Xvfb failed to start")
+        self.display = ":%s" % number.strip()
+        return self.display
+
+    def stop(self):
+        """Terminates the server"""
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+        self.process = None
+
+if __name__ == "__main__":
+    server = Xvfb()
+    os.environ["DISPLAY"] = server.start()
+    os.environ["XRANDR_TEST_XVFB"] = "1"
+    try:
+        status = subprocess.call(sys.argv[1:])
+    finally:
+        server.stop()
+    sys.exit(status)
+
+# vim:ts=4:sw=4:et
@@ -40,6 +40,8 @@ __status__ = "development"
 
 from ctypes import *
 import os
+import sys
+import types
 
 
 RR_ROTATE_0 = 1
@@ -62,6 +64,37 @@ RR_SET_CONFIG_INVALID_CONFIG_TIME = 1
 RR_SET_CONFIG_INVALID_TIME = 2
 RR_SET_CONFIG_FAILED = 3
 
+# Events, relative to the event base of the extension
+RR_SCREEN_CHANGE_NOTIFY = 0
+RR_NOTIFY = 1
+
+# Sub types of RR_NOTIFY events
+RR_NOTIFY_CRTC_CHANGE = 0
+RR_NOTIFY_OUTPUT_CHANGE = 1
+RR_NOTIFY_OUTPUT_PROPERTY = 2
+
+# Event masks
+RR_SCREEN_CHANGE_NOTIFY_MASK = 1
+RR_CRTC_CHANGE_NOTIFY_MASK = 2
+RR_OUTPUT_CHANGE_NOTIFY_MASK = 4
+RR_OUTPUT_PROPERTY_NOTIFY_MASK = 8
+
+# Mode flags
+RR_HSYNC_POSITIVE = 1
+RR_HSYNC_NEGATIVE = 2
+RR_VSYNC_POSITIVE = 4
+RR_VSYNC_NEGATIVE = 8
+RR_INTERLACE = 16
+RR_DOUBLE_SCAN = 32
+RR_CSYNC = 64
+RR_CSYNC_POSITIVE = 128
+RR_CSYNC_NEGATIVE = 256
+RR_HSKEW_PRESENT = 512
+RR_BCAST = 1024
+RR_PIXEL_MULTIPLEX = 2048
+RR_DOUBLE_CLOCK = 4096
+RR_CLOCK_DIVIDE_BY_2 = 8192
+
 # Flags to keep track of changes
 CHANGES_NONE = 0
 CHANGES_CRTC = 1
@@ -73,6 +106,23 @@ CHANGES_REFLECTION = 32
 CHANGES_AUTOMATIC = 64
 CHANGES_REFRESH = 128
 CHANGES_PROPERTY = 256
+CHANGES_TRANSFORM = 512
+
+# Capabilities of providers (RandR 1.4)
+RR_CAPABILITY_SOURCE_OUTPUT = 1
+RR_CAPABILITY_SINK_OUTPUT = 2
+RR_CAPABILITY_SOURCE_OFFLOAD = 4
+RR_CAPABILITY_SINK_OFFLOAD = 8
+
+# Modes of changing output properties
+PROP_MODE_REPLACE = 0
+PROP_MODE_PREPEND = 1
+PROP_MODE_APPEND = 2
+
+# Predefined atoms of property types
+XA_ATOM = 4
+XA_CARDINAL = 6
+XA_INTEGER = 19
 
 # Relation information
 RELATION_ABOVE = 0
@@ -81,7 +131,8 @@ RELATION_RIGHT_OF = 2
 RELATION_LEFT_OF = 3
 RELATION_SAME_AS = 4
 
-from core import Screen, xlib, rr
+from core import Screen, Monitor, RRError, UnsupportedRRError, \
+                 InvalidConfigError, xlib, rr
 
 def get_current_display():
     """Returns the currently used display"""
@@ -89,39 +140,106 @@ def get_current_display():
     dpy = xlib.XOpenDisplay(display_url)
     return dpy
 
-def get_current_screen():
-    """Returns the currently used screen"""
-    screen = Screen(get_current_display())
+def get_current_screen(connected_only=False, wire=False):
+    """Returns the currently used screen. The display connection is closed
+       together with the screen. See Screen for connected_only. If wire is
+       True the state is read by the pure Python client of proto.py into a
+       read-only screen, which doesn't need libXrandr, see
+       serialize.from_wire"""
+    if wire:
+        import serialize
+        return serialize.from_wire()
+    screen = Screen(get_current_display(), close_display=True,
+                    connected_only=connected_only)
     return screen
 
-def get_screen_of_display(display, count):
-    """Returns the screen of the given display"""
+def get_screen_of_display(display, count, connected_only=False):
+    """Returns the screen of the given display. The display connection is
+       closed together with the screen"""
     dpy = xlib.XOpenDisplay(display)
-    return Screen(dpy, count)
+    return Screen(dpy, count, close_display=True,
+                  connected_only=connected_only)
+
+def get_monitor_geometry(display=None):
+    """Returns the monitors of the default screen of the given or current
+       display. On RandR 1.5 servers this only costs a single request
+       instead of loading the complete screen configuration"""
+    if display is None:
+        display = os.getenv("DISPLAY")
+    dpy = xlib.XOpenDisplay(display)
+    if not dpy:
+        raise RRError("Cannot open the display", display)
+    try:
+        major = c_int()
+        minor = c_int()
+        if not rr.XRRQueryVersion(dpy, byref(major), byref(minor)):
+            raise UnsupportedRRError((1,2), None)
+        if (major.value, minor.value) >= (1,5):
+            root = xlib.XDefaultRootWindow(dpy)
+            return core.query_monitors(dpy, root)
+        screen = Screen(dpy)
+        try:
+            return screen.get_monitors()
+        finally:
+            screen.close()
+    finally:
+        xlib.XCloseDisplay(dpy)
 
 def get_version():
     """Returns a tuple containing the major and minor version of the xrandr
        extension or None if the extension is not available"""
     major = c_int()
     minor = c_int()
-    res = core.rr.XRRQueryVersion(get_current_display(),
-                             byref(major), byref(minor))
+    dpy = get_current_display()
+    if not dpy:
+        return None
+    res = rr.XRRQueryVersion(dpy, byref(major), byref(minor))
+    xlib.XCloseDisplay(dpy)
     if res:
         return (major.value, minor.value)
     return None
 
+def get_cached_version():
+    """Returns the version of the xrandr extension like get_version, but
+       only queries the current display on the first call. Importing the
+       package doesn't load the X libraries or open a display"""
+    if not _cached_version:
+        _cached_version.append(get_version())
+    return _cached_version[0]
+
 def has_extension():
     """Returns True if the xrandr extension is available"""
-    if XRANDR_VERSION:
+    if get_cached_version():
         return True
     return False
 
 def _check_required_version(version):
     """Raises an exception if the given or a later version of xrandr is not
        available"""
-    if XRANDR_VERSION == None or XRANDR_VERSION < version:
-        raise UnsupportedRRError(version, XRANDR_VERSION)
-
-XRANDR_VERSION = get_version()
+    current = get_cached_version()
+    if current == None or current < version:
+        raise UnsupportedRRError(version, current)
+
+# The version of the extension on the current display, see
+# get_cached_version
+_cached_version = []
+
+class _Package(types.ModuleType):
+    """The module of the package, which provides XRANDR_VERSION, the
+       version of the extension on the current display, on first access.
+       Importing the package doesn't open the display then"""
+    def __init__(self, module):
+        types.ModuleType.__init__(self, module.__name__)
+        self.__dict__.update(module.__dict__)
+        # Python 2 clears the globals of a deleted module, which are still
+        # used by the functions of the package
+        self._module = module
+
+    def __getattr__(self, name):
+        if name == "XRANDR_VERSION":
+            return get_cached_version()
+        raise AttributeError(name)
+
+sys.modules[__name__] = _Package(sys.modules[__name__])
 
 # vim:ts=4:sw=4:et
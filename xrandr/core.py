@@ -34,28 +34,89 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
 
+import math
 import os
+import select
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from ctypes import *
 
 import xrandr
+import timings
+from modes import ModeTable, ModeQuery
 
 # some fundamental datatypes·
-RRCrtc = c_long
-RROutput = c_long
-RRMode = c_long
+XID = c_ulong
+RRCrtc = XID
+RROutput = XID
+RRMode = XID
+RRProvider = XID
+Window = XID
+Display = c_void_p
+Bool = c_int
+SizeID = c_ushort
 Connection = c_ushort
 SubpixelOrder = c_ushort
 Time = c_ulong
 Rotation = c_ushort
 Status = c_int
-
-xlib = cdll.LoadLibrary("libX11.so.6")
-rr = cdll.LoadLibrary("libXrandr.so.2")
+XFixed = c_int
+Atom = c_ulong
+
+# Attempts to apply a configuration with refreshed timestamps
+CONFIG_RETRIES = 3
+# Created modes which Screen.resize_virtual keeps for reuse
+VIRTUAL_MODES = 16
+# Events which confirm an applied configuration
+CONFIRM_MASK = xrandr.RR_SCREEN_CHANGE_NOTIFY_MASK | \
+               xrandr.RR_CRTC_CHANGE_NOTIFY_MASK
+# Modes of XEventsQueued
+QUEUED_ALREADY = 0
+QUEUED_AFTER_READING = 1
+
+class _Library:
+    """A shared library, which is only loaded when one of its functions is
+       used for the first time, so that importing the package neither
+       requires the X libraries nor a display. The prototypes of the
+       functions are set when loading"""
+    def __init__(self, name):
+        self._name = name
+        self._cdll = None
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if self._cdll is None:
+            self._load()
+        function = getattr(self._cdll, name)
+        setattr(self, name, function)
+        return function
+
+    def _load(self):
+        library = cdll.LoadLibrary(self._name)
+        for (lib, name, restype, argtypes) in _PROTOTYPES:
+            if lib is not self:
+                continue
+            # The library caches the function, so the types stay in effect
+            try:
+                function = getattr(library, name)
+            except AttributeError:
+                # Older libraries don't provide the functions of later
+                # versions
+                continue
+            function.restype = restype
+            function.argtypes = argtypes
+        self._cdll = library
+
+xlib = _Library("libX11.so.6")
+rr = _Library("libXrandr.so.2")
 
 # query resources
 class _XRRModeInfo(Structure):
     _fields_ = [
-        ("id", RRMode), # XID is c_long
+        ("id", RRMode),
         ("width", c_int),
         ("height", c_int),
         ("dotClock", c_long),
@@ -117,11 +178,19 @@ class UnsupportedRRError(RRError):
         self.required = required
         self.current = current
 
+class InvalidConfigError(RRError):
+    """Raised if a requested configuration cannot be applied. The
+       violations attribute holds the list of all found problems"""
+    def __init__(self, violations):
+        RRError.__init__(self, "The configuration is not supported: %s" % \
+                         "; ".join(violations))
+        self.violations = violations
+
 # XRRGetOutputInfo
 class _XRROutputInfo(Structure):
     _fields_ = [
         ("timestamp", Time),
-        ("crtc", c_int),
+        ("crtc", RRCrtc),
         ("name", c_char_p),
         ("nameLen", c_int),
         ("mm_width", c_ulong),
@@ -137,6 +206,142 @@ class _XRROutputInfo(Structure):
         ("modes", POINTER(RRMode))
         ]
 
+# Monitors (RandR 1.5)
+class _XRRMonitorInfo(Structure):
+    _fields_ = [
+        ("name", Atom),
+        ("primary", c_int),
+        ("automatic", c_int),
+        ("noutput", c_int),
+        ("x", c_int),
+        ("y", c_int),
+        ("width", c_int),
+        ("height", c_int),
+        ("mwidth", c_int),
+        ("mheight", c_int),
+        ("outputs", POINTER(RROutput)),
+        ]
+
+# Events
+class XEvent(Union):
+    _fields_ = [
+        ("type", c_int),
+        ("pad", c_long * 24),
+        ]
+
+class _XRRScreenChangeNotifyEvent(Structure):
+    _fields_ = [
+        ("type", c_int),
+        ("serial", c_ulong),
+        ("send_event", c_int),
+        ("display", c_void_p),
+        ("window", c_ulong),
+        ("root", c_ulong),
+        ("timestamp", Time),
+        ("config_timestamp", Time),
+        ("size_index", c_ushort),
+        ("subpixel_order", SubpixelOrder),
+        ("rotation", Rotation),
+        ("width", c_int),
+        ("height", c_int),
+        ("mwidth", c_int),
+        ("mheight", c_int),
+        ]
+
+class _XRRNotifyEvent(Structure):
+    _fields_ = [
+        ("type", c_int),
+        ("serial", c_ulong),
+        ("send_event", c_int),
+        ("display", c_void_p),
+        ("window", c_ulong),
+        ("subtype", c_int),
+        ]
+
+class _XRRCrtcChangeNotifyEvent(Structure):
+    _fields_ = [
+        ("type", c_int),
+        ("serial", c_ulong),
+        ("send_event", c_int),
+        ("display", c_void_p),
+        ("window", c_ulong),
+        ("subtype", c_int),
+        ("crtc", RRCrtc),
+        ("mode", RRMode),
+        ("rotation", Rotation),
+        ("x", c_int),
+        ("y", c_int),
+        ("width", c_uint),
+        ("height", c_uint),
+        ]
+
+# Transformations and panning (RandR 1.3)
+class _XTransform(Structure):
+    _fields_ = [
+        ("matrix", (XFixed * 3) * 3),
+        ]
+
+class _XRRCrtcTransformAttributes(Structure):
+    _fields_ = [
+        ("pendingTransform", _XTransform),
+        ("pendingFilter", c_char_p),
+        ("pendingNparams", c_int),
+        ("pendingParams", POINTER(XFixed)),
+        ("currentTransform", _XTransform),
+        ("currentFilter", c_char_p),
+        ("currentNparams", c_int),
+        ("currentParams", POINTER(XFixed)),
+        ]
+
+# Output properties
+class _XRRPropertyInfo(Structure):
+    _fields_ = [
+        ("pending", c_int),
+        ("range", c_int),
+        ("immutable", c_int),
+        ("num_values", c_int),
+        ("values", POINTER(c_long)),
+        ]
+
+class _XRRPanning(Structure):
+    _fields_ = [
+        ("timestamp", Time),
+        ("left", c_uint),
+        ("top", c_uint),
+        ("width", c_uint),
+        ("height", c_uint),
+        ("track_left", c_uint),
+        ("track_top", c_uint),
+        ("track_width", c_uint),
+        ("track_height", c_uint),
+        ("border_left", c_int),
+        ("border_top", c_int),
+        ("border_right", c_int),
+        ("border_bottom", c_int),
+        ]
+
+# Providers (RandR 1.4)
+class _XRRProviderResources(Structure):
+    _fields_ = [
+        ("timestamp", Time),
+        ("nproviders", c_int),
+        ("providers", POINTER(RRProvider)),
+        ]
+
+class _XRRProviderInfo(Structure):
+    _fields_ = [
+        ("capabilities", c_uint),
+        ("ncrtcs", c_int),
+        ("crtcs", POINTER(RRCrtc)),
+        ("noutputs", c_int),
+        ("outputs", POINTER(RROutput)),
+        ("name", c_char_p),
+        ("nassociatedproviders", c_int),
+        ("associated_providers", POINTER(RRProvider)),
+        ("associated_capability", POINTER(c_uint)),
+        ("nameLen", c_int),
+        ]
+
 class _XRRCrtcGamma(Structure):
     _fields_ = [
         ('size', c_int),
@@ -145,22 +350,283 @@ class _XRRCrtcGamma(Structure):
         ('blue', POINTER(c_ushort)),
         ]
 
-def _array_conv(array, type, conv = lambda x:x):
-    length = len(array)
-    res = (type*length)()
-    for i in range(length):
-        res[i] = conv(array[i])
-    return res
+# Result and argument types of all used functions. They are declared once
+# here, so that pointers and xids are converted correctly on 64 bit systems
+_PROTOTYPES = (
+    (xlib, "XOpenDisplay", Display, [c_char_p]),
+    (xlib, "XCloseDisplay", c_int, [Display]),
+    (xlib, "XDisplayString", c_char_p, [Display]),
+    (xlib, "XScreenCount", c_int, [Display]),
+    (xlib, "XDefaultScreen", c_int, [Display]),
+    (xlib, "XDefaultRootWindow", Window, [Display]),
+    (xlib, "XRootWindow", Window, [Display, c_int]),
+    (xlib, "XDisplayWidth", c_int, [Display, c_int]),
+    (xlib, "XDisplayHeight", c_int, [Display, c_int]),
+    (xlib, "XDisplayWidthMM", c_int, [Display, c_int]),
+    (xlib, "XDisplayHeightMM", c_int, [Display, c_int]),
+    (xlib, "XConnectionNumber", c_int, [Display]),
+    (xlib, "XPending", c_int, [Display]),
+    (xlib, "XEventsQueued", c_int, [Display, c_int]),
+    (xlib, "XNextEvent", c_int, [Display, POINTER(XEvent)]),
+    (xlib, "XCheckTypedEvent", Bool, [Display, c_int, POINTER(XEvent)]),
+    (xlib, "XSync", c_int, [Display, Bool]),
+    (xlib, "XFlush", c_int, [Display]),
+    (xlib, "XNextRequest", c_ulong, [Display]),
+    (xlib, "XFree", c_int, [c_void_p]),
+    (xlib, "XInternAtom", Atom, [Display, c_char_p, Bool]),
+    (xlib, "XGetAtomName", c_void_p, [Display, Atom]),
+    # RandR 1.0
+    (rr, "XRRQueryExtension", Bool, [Display, POINTER(c_int),
+                                     POINTER(c_int)]),
+    (rr, "XRRQueryVersion", Status, [Display, POINTER(c_int),
+                                     POINTER(c_int)]),
+    (rr, "XRRRootToScreen", c_int, [Display, Window]),
+    (rr, "XRRSelectInput", None, [Display, Window, c_int]),
+    (rr, "XRRUpdateConfiguration", c_int, [POINTER(XEvent)]),
+    (rr, "XRRTimes", Time, [Display, c_int, POINTER(Time)]),
+    (rr, "XRRGetScreenInfo", c_void_p, [Display, Window]),
+    (rr, "XRRFreeScreenConfigInfo", None, [c_void_p]),
+    (rr, "XRRConfigSizes", POINTER(_XRRScreenSize), [c_void_p,
+                                                     POINTER(c_int)]),
+    (rr, "XRRConfigRates", POINTER(c_short), [c_void_p, c_int,
+                                              POINTER(c_int)]),
+    (rr, "XRRConfigRotations", Rotation, [c_void_p, POINTER(Rotation)]),
+    (rr, "XRRConfigCurrentConfiguration", SizeID, [c_void_p,
+                                                   POINTER(Rotation)]),
+    (rr, "XRRConfigCurrentRate", c_short, [c_void_p]),
+    (rr, "XRRSetScreenConfigAndRate", Status, [Display, c_void_p, Window,
+                                               c_int, Rotation, c_short,
+                                               Time]),
+    # RandR 1.2
+    (rr, "XRRGetScreenSizeRange", Status, [Display, Window, POINTER(c_int),
+                                           POINTER(c_int), POINTER(c_int),
+                                           POINTER(c_int)]),
+    (rr, "XRRSetScreenSize", None, [Display, Window, c_int, c_int, c_int,
+                                    c_int]),
+    (rr, "XRRGetScreenResources", POINTER(_XRRScreenResources),
+     [Display, Window]),
+    (rr, "XRRFreeScreenResources", None, [POINTER(_XRRScreenResources)]),
+    (rr, "XRRGetOutputInfo", POINTER(_XRROutputInfo),
+     [Display, POINTER(_XRRScreenResources), RROutput]),
+    (rr, "XRRFreeOutputInfo", None, [POINTER(_XRROutputInfo)]),
+    (rr, "XRRGetCrtcInfo", POINTER(_XRRCrtcInfo),
+     [Display, POINTER(_XRRScreenResources), RRCrtc]),
+    (rr, "XRRFreeCrtcInfo", None, [POINTER(_XRRCrtcInfo)]),
+    (rr, "XRRSetCrtcConfig", Status, [Display, POINTER(_XRRScreenResources),
+                                      RRCrtc, Time, c_int, c_int, RRMode,
+                                      Rotation, POINTER(RROutput), c_int]),
+    (rr, "XRRCreateMode", RRMode, [Display, Window, POINTER(_XRRModeInfo)]),
+    (rr, "XRRDestroyMode", None, [Display, RRMode]),
+    (rr, "XRRAddOutputMode", None, [Display, RROutput, RRMode]),
+    (rr, "XRRDeleteOutputMode", None, [Display, RROutput, RRMode]),
+    (rr, "XRRListOutputProperties", POINTER(Atom), [Display, RROutput,
+                                                    POINTER(c_int)]),
+    (rr, "XRRQueryOutputProperty", POINTER(_XRRPropertyInfo),
+     [Display, RROutput, Atom]),
+    (rr, "XRRGetOutputProperty", c_int,
+     [Display, RROutput, Atom, c_long, c_long, Bool, Bool, Atom,
+      POINTER(Atom), POINTER(c_int), POINTER(c_ulong), POINTER(c_ulong),
+      POINTER(c_void_p)]),
+    (rr, "XRRChangeOutputProperty", None, [Display, RROutput, Atom, Atom,
+                                           c_int, c_int, c_void_p, c_int]),
+    (rr, "XRRGetCrtcGammaSize", c_int, [Display, RRCrtc]),
+    (rr, "XRRGetCrtcGamma", POINTER(_XRRCrtcGamma), [Display, RRCrtc]),
+    (rr, "XRRAllocGamma", POINTER(_XRRCrtcGamma), [c_int]),
+    (rr, "XRRSetCrtcGamma", None, [Display, RRCrtc, POINTER(_XRRCrtcGamma)]),
+    (rr, "XRRFreeGamma", None, [POINTER(_XRRCrtcGamma)]),
+    # RandR 1.3
+    (rr, "XRRGetScreenResourcesCurrent", POINTER(_XRRScreenResources),
+     [Display, Window]),
+    (rr, "XRRGetOutputPrimary", RROutput, [Display, Window]),
+    (rr, "XRRGetCrtcTransform", Status,
+     [Display, RRCrtc, POINTER(POINTER(_XRRCrtcTransformAttributes))]),
+    (rr, "XRRSetCrtcTransform", None, [Display, RRCrtc, POINTER(_XTransform),
+                                       c_char_p, POINTER(XFixed), c_int]),
+    (rr, "XRRGetPanning", POINTER(_XRRPanning),
+     [Display, POINTER(_XRRScreenResources), RRCrtc]),
+    (rr, "XRRFreePanning", None, [POINTER(_XRRPanning)]),
+    (rr, "XRRSetPanning", Status, [Display, POINTER(_XRRScreenResources),
+                                   RRCrtc, POINTER(_XRRPanning)]),
+    # RandR 1.4
+    (rr, "XRRGetProviderResources", POINTER(_XRRProviderResources),
+     [Display, Window]),
+    (rr, "XRRFreeProviderResources", None, [POINTER(_XRRProviderResources)]),
+    (rr, "XRRGetProviderInfo", POINTER(_XRRProviderInfo),
+     [Display, POINTER(_XRRScreenResources), RRProvider]),
+    (rr, "XRRFreeProviderInfo", None, [POINTER(_XRRProviderInfo)]),
+    (rr, "XRRSetProviderOutputSource", c_int, [Display, RRProvider,
+                                               RRProvider]),
+    (rr, "XRRSetProviderOffloadSink", c_int, [Display, RRProvider,
+                                              RRProvider]),
+    # RandR 1.5
+    (rr, "XRRGetMonitors", POINTER(_XRRMonitorInfo), [Display, Window, Bool,
+                                                      POINTER(c_int)]),
+    (rr, "XRRFreeMonitors", None, [POINTER(_XRRMonitorInfo)]),
+    (rr, "XRRAllocateMonitor", POINTER(_XRRMonitorInfo), [Display, c_int]),
+    (rr, "XRRSetMonitor", None, [Display, Window, POINTER(_XRRMonitorInfo)]),
+    (rr, "XRRDeleteMonitor", None, [Display, Window, Atom]),
+    )
+
+class Monitor:
+    """A monitor is a rectangular area of the screen, which window managers
+       and panels should treat as a single physical display. It is usually
+       shown by the outputs of a crtc, but can also be a part of it"""
+    def __init__(self, name, x, y, width, height, mwidth=0, mheight=0,
+                 primary=False, automatic=True, outputs=()):
+        """Initializes the monitor"""
+        self.name = name
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.mwidth = mwidth
+        self.mheight = mheight
+        self.primary = primary
+        self.automatic = automatic
+        self.outputs = list(outputs)
+
+    def __repr__(self):
+        return "<Monitor %s %sx%s+%s+%s%s>" % (self.name, self.width,
+                                              self.height, self.x, self.y,
+                                              self.primary and " primary" \
+                                              or "")
+
+    def get_geometry(self):
+        """Returns the position and size of the monitor"""
+        return (self.x, self.y, self.width, self.height)
+
+def _get_atom_name(dpy, atom):
+    name = xlib.XGetAtomName(dpy, atom)
+    if not name:
+        return None
+    result = string_at(name)
+    xlib.XFree(name)
+    return result
+
+def query_monitors(dpy, root, active=True):
+    """Returns the monitors of the given root window. Only needs a single
+       request, but requires RandR 1.5"""
+    nmonitors = c_int()
+    infos = rr.XRRGetMonitors(dpy, root, active, byref(nmonitors))
+    monitors = []
+    for i in range(nmonitors.value):
+        info = infos[i]
+        monitors.append(Monitor(_get_atom_name(dpy, info.name),
+                                info.x, info.y, info.width, info.height,
+                                info.mwidth, info.mheight,
+                                bool(info.primary), bool(info.automatic),
+                                info.outputs[:info.noutput]))
+    if infos:
+        rr.XRRFreeMonitors(infos)
+    return monitors
+
+class _OutputMap(dict):
+    """A dictionary by output xid, whose entries are filled in by the given
+       function on first access"""
+    def __init__(self, load):
+        dict.__init__(self)
+        self._load = load
+
+    def __missing__(self, id):
+        self._load(id)
+        return dict.__getitem__(self, id)
+
+class Capabilities:
+    """Bitmasks of the possible crtcs, clones and rotations of all outputs
+       of a screen, which are built once per resource load. Bit i of a crtc
+       mask refers to Screen.crtcs[i], bit i of an output mask to the i-th
+       output of the screen resources. The masks of an output are only built
+       on first access, so that the infos of unused outputs don't have to
+       be loaded"""
+    def __init__(self, screen):
+        """Builds the crtc masks from the crtc infos of the screen"""
+        self._screen = weakref.proxy(screen)
+        self.crtcs = list(screen.crtcs)
+        self.crtc_bits = dict([(crtc.xid, 1 << i) \
+                               for (i, crtc) in enumerate(self.crtcs)])
+        resources = screen._resources.contents
+        self.output_bits = dict([(resources.outputs[i], 1 << i) \
+                                 for i in range(resources.noutput)])
+        self.crtc_rotations = [crtc._info.contents.rotations \
+                               for crtc in self.crtcs]
+        # Masks and the lists in the order of the server by output xid
+        self.crtc_masks = _OutputMap(self._add_output)
+        self.clone_masks = _OutputMap(self._add_output)
+        self.rotations = _OutputMap(self._add_output)
+        self.possible_crtcs = _OutputMap(self._add_output)
+        self.clones = _OutputMap(self._add_output)
+
+    def _add_output(self, id):
+        """Builds the masks and lists of the output with the given xid"""
+        screen = self._screen
+        output = screen.get_output_by_id(id)
+        if output is None:
+            raise KeyError(id)
+        info = output._info.contents
+        crtcs = [screen.get_crtc_by_xid(info.crtcs[i]) \
+                 for i in range(info.ncrtc)]
+        crtcs = [crtc for crtc in crtcs if crtc is not None]
+        mask = 0
+        rotations = None
+        for crtc in crtcs:
+            mask |= self.crtc_bits[crtc.xid]
+            # Only the rotations which are supported by all crtcs
+            if rotations is None:
+                rotations = crtc._info.contents.rotations
+            else:
+                rotations &= crtc._info.contents.rotations
+        clones = [screen.get_output_by_id(info.clones[i]) \
+                  for i in range(info.nclone)]
+        clones = [clone for clone in clones if clone is not None]
+        clone_mask = self.output_bits[id]
+        for clone in clones:
+            clone_mask |= self.output_bits[clone.id]
+        dict.__setitem__(self.crtc_masks, id, mask)
+        dict.__setitem__(self.clone_masks, id, clone_mask)
+        dict.__setitem__(self.rotations, id,
+                         rotations or xrandr.RR_ROTATE_0)
+        dict.__setitem__(self.possible_crtcs, id, crtcs)
+        dict.__setitem__(self.clones, id, clones)
+
+    def can_drive(self, crtc, output):
+        """Returns True if the crtc can be attached to the output"""
+        return bool(self.crtc_masks[output.id] & self.crtc_bits[crtc.xid])
+
+    def can_clone(self, output, other):
+        """Returns True if both outputs can share a crtc"""
+        return bool(self.clone_masks[output.id] & self.output_bits[other.id])
+
+    def get_crtcs(self, mask):
+        """Returns the crtcs of the given mask"""
+        return [crtc for (i, crtc) in enumerate(self.crtcs) if mask >> i & 1]
+
+def _synchronized(func):
+    """Decorates a method of the screen or of an output, which has to hold
+       the lock of the screen while it changes the screen or talks to the
+       server"""
+    def wrapper(self, *args, **kwargs):
+        self.lock.acquire()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            self.lock.release()
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
 
 class Output:
     """The output is a reference to a supported output jacket of the graphics
        card. Outputs are attached to a hardware pipe to be used. Furthermore
        they can be a clone of another output or show a subset of the screen"""
+    # Changes are staged under the lock of the screen, see _synchronized
+    lock = property(lambda self: self._screen.lock)
+
     def __init__(self, info, id, screen):
-        """Initializes an output instance"""
-        self._info = info
+        """Initializes an output instance. If info is None the output info
+           is requested from the server on first use"""
         self.id = id
-        self._screen = screen
+        # The screen owns the output, so only keep a weak reference to it
+        self._screen = weakref.proxy(screen)
         # Store changes later here
         self._mode = None
         self._crtc = None
@@ -172,16 +638,52 @@ class Output:
         self._reflection = None
         self._automatic = None
         self._rate = None
+        self._scale = None
         self._changes = xrandr.CHANGES_NONE
         self._x = 0
         self._y = 0
-
-        self.name = self._info.contents.name
-
-    def __del__(self):
-        """Frees the internal reference to the output info if the output gets
-           removed"""
-        rr.XRRFreeOutputInfo(self._info)
+        # Forget the info of a previous load, see __getattr__
+        for name in ("_info", "name", "query"):
+            self.__dict__.pop(name, None)
+        if info:
+            self._info = info
+            self.name = info.contents.name
+
+    def __getattr__(self, name):
+        """Requests the output info from the server on first access of the
+           attributes which depend on it"""
+        if name in ("_info", "name"):
+            self._info = self._screen._get_output_info(self.id)
+            self.name = self._info.contents.name
+        elif name == "query":
+            # Indexes of the available modes, which are valid as long as the
+            # screen resources are not reloaded
+            modes = self._info.contents.modes
+            self.query = ModeQuery(self._screen.modes,
+                                   [modes[i] for i in \
+                                    range(self._info.contents.nmode)])
+        else:
+            raise AttributeError(name)
+        return self.__dict__[name]
+
+    def _is_loaded(self):
+        """Returns True if the output info has been requested"""
+        return "_info" in self.__dict__
+
+    def _unload(self):
+        """Frees the output info, it will be requested again on next use"""
+        if self.__dict__.get("_info"):
+            rr.XRRFreeOutputInfo(self._info)
+        for name in ("_info", "name", "query"):
+            self.__dict__.pop(name, None)
+
+    def _free(self):
+        """Frees the internal reference to the output info. Called by the
+           screen when it gets closed"""
+        if self.__dict__.get("_info"):
+            rr.XRRFreeOutputInfo(self._info)
+        self._info = None
+        self._crtc = None
     def get_physical_width(self):
         """Returns the display width reported by the connected output device"""
         return self._info.contents.mm_width
@@ -193,74 +695,79 @@ class Output:
            attached. If the output is disabled it will return 0"""
         return self._info.contents.crtc
     def get_crtcs(self):
-        """Returns the xids of the hardware pipes to which the output could
-           be attached"""
-        crtcs = []
-        for i in range(self._info.contents.ncrtc):
-            for crtc in self._screen.crtcs:
-                if crtc.xid == self._info.contents.crtcs[i]:
-                    crtcs.append(crtc)
-        return crtcs
+        """Returns the hardware pipes to which the output could be
+           attached"""
+        return list(self._screen.capabilities.possible_crtcs[self.id])
 
     def get_available_rotations(self):
         """Returns a binary flag of the supported rotations of the output or
            0 if the output is disabled"""
-        rotations = xrandr.RR_ROTATE_0
-        found = False
         if self.is_active():
             # Get the rotations supported by all crtcs to make assigning
             # crtcs easier. Furthermore there don't seem to be so many
             # cards which show another behavior
-            for crtc in self.get_crtcs():
-                # Set rotations to the value of the first found crtc and
-                # then create a subset only for all other crtcs
-                if not found:
-                    rotations = crtc.get_available_rotations()
-                    found = True
-                else:
-                    rotations = rotations & crtc.get_available_rotations()
-        return rotations
+            return self._screen.capabilities.rotations[self.id]
+        return xrandr.RR_ROTATE_0
 
     def get_available_modes(self):
         """Returns the list of supported mode lines (resolution, refresh rate)
            that are supported by the connected device"""
-        modes = []
-        for m in range(self._info.contents.nmode):
-            output_modes = self._info.contents.modes
-            for s in range(self._screen._resources.contents.nmode):
-                screen_modes = self._screen._resources.contents.modes
-                if screen_modes[s].id == output_modes[m]:
-                    modes.append(screen_modes[s])
-        return modes
+        screen_modes = self._screen._resources.contents.modes
+        return [screen_modes[row] for row in self.query.rows]
 
     def get_available_resolutions(self, reverse=False):
         """Return a list of available resolution pairs"""
-        res = set()
-        for mode in self.get_available_modes():
-            res.add((mode.width, mode.height))
-        ls = list(res)
-        ls.sort(reverse=reverse)
-        return  ls
+        return self.query.resolutions(reverse)
 
     def get_available_rates_for_resolution(self, width, height, reverse=False):
         """Return a list of rates that are available for the given
            resolution"""
-        rates = set()
-        for mode in self.get_available_modes():
-            if mode.width == width and mode.height == height:
-                rates.add(mode.dotClock / (mode.hTotal * mode.vTotal))
-        ls = list(rates)
-        ls.sort(reverse=reverse)
-        return ls
+        return self.query.rates(width, height, reverse)
+
+    def get_best_mode(self, min_rate=None, max_pixel_clock=None, aspect=None):
+        """Returns the index of the largest available mode that matches the
+           given constraints or None. See ModeQuery.best_mode"""
+        return self.query.best_mode(min_rate=min_rate,
+                                    max_pixel_clock=max_pixel_clock,
+                                    aspect=aspect)
 
     def get_current_rate(self):
         """Return a tuple with the current height and width"""
         if self.is_active():
-            mode = self._screen.get_mode_by_xid(self._mode)
-            return mode.dotClock / (mode.hTotal * mode.vTotal)
+            return self._screen.modes.get_rate(self._mode)
         else:
             return None
 
+    def get_size(self):
+        """Returns the width and height that the output covers on the
+           screen, taking rotation and scaling into account"""
+        if not self._mode:
+            return (0, 0)
+        return get_output_size(self._screen.get_mode_by_xid(self._mode),
+                               self._rotation, self._scale)
+
+    def get_scale(self):
+        """Returns the horizontal and vertical scaling factors of the
+           output"""
+        return self._scale or (1.0, 1.0)
+
+    @_synchronized
+    def set_scale(self, sx, sy=None):
+        """Scales the output by the given factors in the crtc instead of
+           changing the mode, e.g. 2.0 shows twice as many pixels in each
+           direction. The mode of the output is kept, so that the change
+           doesn't require a mode switch. To get in effect call
+           Screen.apply_output_config()"""
+        self._screen._check_version((1,3))
+        if sy is None:
+            sy = sx
+        if sx <= 0 or sy <= 0:
+            raise RRError("The scaling factors have to be positive")
+        if not self._mode:
+            raise RRError("The output has to be active to be scaled")
+        self._scale = (float(sx), float(sy))
+        self._changes = self._changes | xrandr.CHANGES_TRANSFORM
+
     def get_current_resolution(self):
         """Return a tuple with the height and width of the current resolution"""
         if self.is_active():
@@ -286,6 +793,7 @@ class Output:
             return True
         return False
 
+    @_synchronized
     def disable(self):
         """Disable the output"""
         if not self.is_active(): return
@@ -294,14 +802,15 @@ class Output:
         self._crtc = None
         self._changes = self._changes | xrandr.CHANGES_CRTC | xrandr.CHANGES_MODE
 
+    @_synchronized
     def set_to_mode(self, mode):
         """Change the output to the given mode"""
-        modes = self.get_available_modes()
-        if mode in range(len(modes)):
-            self._mode = modes[mode].id
+        if mode in range(len(self.query)):
+            self._mode = self.query.get_xid(mode)
             return
         raise RRError("Mode is not available")
 
+    @_synchronized
     def set_to_preferred_mode(self):
         """Set the output to its preferred mode"""
         modes = self.get_available_modes()
@@ -311,15 +820,115 @@ class Output:
             return
         raise RRError("Preferred mode is not available")
 
+    def add_mode(self, mode):
+        """Adds the given mode to the available modes of the output. The mode
+           can be a xid or a mode line, which gets created on the server if
+           needed. Returns the xid of the mode. The mode can be used after
+           reloading the screen"""
+        self._screen._require_display()
+        if not isinstance(mode, (int, long)):
+            if not mode.id:
+                self._screen.create_mode(mode)
+            mode = mode.id
+        rr.XRRAddOutputMode(self._screen._display, self.id, mode)
+        return mode
+
+    def delete_mode(self, mode):
+        """Removes the given mode xid from the available modes of the
+           output"""
+        self._screen._require_display()
+        rr.XRRDeleteOutputMode(self._screen._display, self.id, mode)
+
+    def get_property_names(self):
+        """Returns the names of the properties of the output"""
+        self._screen._require_display()
+        nprop = c_int()
+        atoms = rr.XRRListOutputProperties(self._screen._display, self.id,
+                                           byref(nprop))
+        names = [_get_atom_name(self._screen._display, atom) \
+                 for atom in atoms[:nprop.value]]
+        if atoms:
+            xlib.XFree(atoms)
+        return names
+
+    def get_property(self, name):
+        """Returns the values of the given property as list of integers or
+           None if the output doesn't have the property"""
+        self._screen._require_display()
+        atom = self._screen._get_atom(name, True)
+        if not atom:
+            return None
+        actual_type = Atom()
+        actual_format = c_int()
+        nitems = c_ulong()
+        bytes_after = c_ulong()
+        data = c_void_p()
+        rr.XRRGetOutputProperty(self._screen._display, self.id, atom, 0,
+                                1024, False, False, 0, byref(actual_type),
+                                byref(actual_format), byref(nitems),
+                                byref(bytes_after), byref(data))
+        if not actual_type.value:
+            return None
+        # Xlib returns 32 bit values as longs
+        type = {8: c_ubyte, 16: c_short, 32: c_long}[actual_format.value]
+        values = cast(data, POINTER(type))[:nitems.value]
+        xlib.XFree(data)
+        return values
+
+    def get_property_range(self, name):
+        """Returns the minimum and maximum value of the given range
+           property, e.g. of the backlight, or None"""
+        self._screen._require_display()
+        atom = self._screen._get_atom(name, True)
+        if not atom:
+            return None
+        info = rr.XRRQueryOutputProperty(self._screen._display, self.id,
+                                         atom)
+        if not info:
+            return None
+        result = None
+        if info.contents.range and info.contents.num_values == 2:
+            result = tuple(info.contents.values[:2])
+        xlib.XFree(info)
+        return result
+
+    def set_property(self, name, values, type=xrandr.XA_INTEGER, format=32,
+                     mode=xrandr.PROP_MODE_REPLACE):
+        """Changes the given property to the value or list of values. The
+           change is sent without waiting for a reply. Inside of
+           Screen.batch() it is only queued until the batch ends"""
+        self._screen._require_display()
+        if isinstance(values, (int, long)):
+            values = [values]
+        ctype = {8: c_ubyte, 16: c_short, 32: c_long}[format]
+        data = (ctype * len(values))(*values)
+        screen = self._screen
+        rr.XRRChangeOutputProperty(screen._display, self.id,
+                                   screen._get_atom(name), type, format,
+                                   mode, data, len(values))
+        self._changes = self._changes | xrandr.CHANGES_PROPERTY
+        if not screen._batch_depth:
+            screen._flush()
+
+    def get_backlight_property(self):
+        """Returns the name of the backlight property of the output or
+           None. Older drivers use BACKLIGHT instead of Backlight"""
+        names = self.get_property_names()
+        for name in ("Backlight", "BACKLIGHT"):
+            if name in names:
+                return name
+        return None
+
+    def fade_backlight(self, target, duration, rate=None):
+        """Changes the backlight to the given value within duration
+           seconds. See Screen.fade_backlights"""
+        self._screen.fade_backlights({self: target}, duration, rate)
+
     def get_clones(self):
-        """Return the xids of the outputs which can be clones of the output"""
-        clones = []
-        for i in range(self._info.contents.nclone):
-            id = self._info.contents.clones[i]
-            o = self._screen.get_output_by_id(id)
-            clones.append(o)
-        return clones
+        """Return the outputs which can be clones of the output"""
+        return list(self._screen.capabilities.clones[self.id])
 
+    @_synchronized
     def set_relation(self, relative, relation, offset=0):
         """Set the position of the output in relation to the given one"""
         rel = self._screen.get_output_by_name(relative)
@@ -351,13 +960,16 @@ class Crtc:
         """Initializes the hardware pipe object"""
         self._info = info
         self.xid = xid
-        self._screen = screen
+        self._screen = weakref.proxy(screen)
         self._outputs = []
 
-    def __del__(self):
-        """Frees the reference to the rendering pipe if the instance gets 
-           removed"""
-        rr.XRRFreeCrtcConfigInfo(self._info)
+    def _free(self):
+        """Frees the reference to the rendering pipe info. Called by the
+           screen when it gets closed"""
+        if self._info:
+            rr.XRRFreeCrtcInfo(self._info)
+        self._info = None
+        self._outputs = []
 
     def get_xid(self):
         """Returns the internal id of the crtc from the X server"""
@@ -370,42 +982,174 @@ class Crtc:
 
     def set_config(self, x, y, mode, outputs, rotation=xrandr.RR_ROTATE_0):
         """Configures the render pipe with the given mode and outputs. X and y
-           set the position of the crtc output in the screen"""
-        rr.XRRSetCrtcConfig(self._screen._display,
-                            self._screen._resources,
-                            self.xid,
-                            self._screen.get_timestamp(),
-                            c_int(x), c_int(y),
-                            mode,
-                            rotation,
-                            _array_conv(outputs, RROutput, lambda x: x.id),
-                            len(outputs))
+           set the position of the crtc output in the screen. Raises an
+           RRError if the server refuses the configuration"""
+        self._screen._require_display()
+        ids = (RROutput * len(outputs))(*[o.id for o in outputs])
+        for attempt in range(CONFIG_RETRIES):
+            status = rr.XRRSetCrtcConfig(self._screen._display,
+                                         self._screen._resources,
+                                         self.xid,
+                                         self._screen.get_timestamp(),
+                                         x, y,
+                                         mode or 0,
+                                         rotation,
+                                         ids,
+                                         len(outputs))
+            if status != xrandr.RR_SET_CONFIG_INVALID_CONFIG_TIME:
+                break
+            # Another client changed the configuration since the resources
+            # have been loaded
+            self._screen._refresh_timestamps()
+        if status != xrandr.RR_SET_CONFIG_SUCCESS:
+            raise RRError("Failed to configure the crtc", self.xid, status)
+
+    def _update_info(self, mode, x, y, width, height, rotation):
+        """Stores the configuration, which the server reported for the crtc,
+           in the crtc info. The outputs are the ones of the crtc"""
+        info = self._info.contents
+        outputs = []
+        if mode:
+            outputs = [output.id for output in self._outputs]
+        (info.mode, info.x, info.y) = (mode, x, y)
+        (info.width, info.height, info.rotation) = (width, height, rotation)
+        if outputs != info.outputs[:info.noutput]:
+            if len(outputs) > info.noutput:
+                # The array allocated by Xlib cannot grow
+                self._output_ids = (RROutput * len(outputs))(*outputs)
+                info.outputs = cast(self._output_ids, POINTER(RROutput))
+            else:
+                for (i, id) in enumerate(outputs):
+                    info.outputs[i] = id
+            info.noutput = len(outputs)
+
+    def _differs_from_server(self):
+        """Returns True if applying the stored changes would change the
+           configuration of the crtc on the server. The server neither
+           changes nor reports crtcs whose mode, position, rotation and
+           outputs stay the same"""
+        info = self._info.contents
+        if not self._outputs:
+            return bool(info.mode or info.noutput)
+        output = self._outputs[0]
+        if output.has_changed(xrandr.CHANGES_TRANSFORM):
+            return True
+        return (output._mode or 0, output._x, output._y, output._rotation,
+                [o.id for o in self._outputs]) != \
+               (info.mode, info.x, info.y, info.rotation,
+                info.outputs[:info.noutput])
 
     def apply_changes(self):
         """Applies the stored changes"""
         if len(self._outputs) > 0:
             output = self._outputs[0]
+            # The transformation only becomes active by the following
+            # crtc configuration
+            if output.has_changed(xrandr.CHANGES_TRANSFORM):
+                self.set_scale(*output.get_scale())
             self.set_config(output._x, output._y, output._mode, 
                             self._outputs, output._rotation)
         else:
             self.disable()
 
+    def get_transform(self):
+        """Returns the current transformation matrix of the crtc as 3x3 list
+           of floats"""
+        self._screen._require_display()
+        self._screen._check_version((1,3))
+        attr = POINTER(_XRRCrtcTransformAttributes)()
+        if not rr.XRRGetCrtcTransform(self._screen._display, self.xid,
+                                      byref(attr)):
+            raise RRError("Failed to get the transformation of the crtc")
+        matrix = attr.contents.currentTransform.matrix
+        transform = [[matrix[i][j] / 65536.0 for j in range(3)] \
+                     for i in range(3)]
+        xlib.XFree(attr)
+        return transform
+
+    def set_transform(self, transform, filter=None):
+        """Sets the transformation matrix of the crtc. It becomes active
+           with the next configuration of the crtc. By default the bilinear
+           filter is used for scaling and nearest for the identity"""
+        self._screen._require_display()
+        self._screen._check_version((1,3))
+        xt = _XTransform()
+        for i in range(3):
+            for j in range(3):
+                xt.matrix[i][j] = int(round(transform[i][j] * 65536))
+        if filter is None:
+            if transform == [[1, 0, 0], [0, 1, 0], [0, 0, 1]]:
+                filter = "nearest"
+            else:
+                filter = "bilinear"
+        rr.XRRSetCrtcTransform(self._screen._display, self.xid, byref(xt),
+                               filter, None, 0)
+
+    def set_scale(self, sx, sy):
+        """Sets a transformation matrix that scales the crtc by the given
+           factors"""
+        self.set_transform([[sx, 0, 0], [0, sy, 0], [0, 0, 1]])
+
+    def get_panning(self):
+        """Returns the panning area, tracking area and borders of the crtc
+           as dictionary"""
+        self._screen._require_display()
+        self._screen._check_version((1,3))
+        panning = rr.XRRGetPanning(self._screen._display,
+                                   self._screen._resources, self.xid)
+        if not panning:
+            raise RRError("Failed to get the panning of the crtc")
+        result = dict([(f, getattr(panning.contents, f)) \
+                       for (f, t) in _XRRPanning._fields_ \
+                       if f != "timestamp"])
+        rr.XRRFreePanning(panning)
+        return result
+
+    def set_panning(self, left, top, width, height, track_left=0,
+                    track_top=0, track_width=0, track_height=0,
+                    border_left=0, border_top=0, border_right=0,
+                    border_bottom=0):
+        """Lets the crtc pan over the given area of the screen. A width and
+           height of 0 disable panning"""
+        self._screen._require_display()
+        self._screen._check_version((1,3))
+        panning = _XRRPanning(0, left, top, width, height, track_left,
+                              track_top, track_width, track_height,
+                              border_left, border_top, border_right,
+                              border_bottom)
+        status = rr.XRRSetPanning(self._screen._display,
+                                  self._screen._resources, self.xid,
+                                  byref(panning))
+        if status != xrandr.RR_SET_CONFIG_SUCCESS:
+            raise RRError("Failed to set the panning of the crtc", status)
+
     def disable(self):
         """Turns off all outputs on the crtc"""
         self.set_config(0, 0, None, [])
 
-    #FIXME: support gamma settings
-    """
     def get_gamma_size(self):
-        return rr.XRRGetCrtcGammaSize(self._screen._display, self.id)
+        """Returns the number of entries of each gamma ramp of the crtc"""
+        self._screen._require_display()
+        return rr.XRRGetCrtcGammaSize(self._screen._display, self.xid)
+
     def get_gamma(self):
-        result = rr.XRRGetCrtcGamma(self._screen._display, self.id)
-        return _from_gamma(result)
+        """Returns the red, green and blue gamma ramps of the crtc as lists
+           of 16 bit values"""
+        self._screen._require_display()
+        gamma = rr.XRRGetCrtcGamma(self._screen._display, self.xid)
+        if not gamma:
+            raise RRError("Failed to get the gamma ramps of the crtc")
+        return _from_gamma(gamma)
+
     def set_gamma(self, gamma):
+        """Sets the red, green and blue gamma ramps of the crtc. Each ramp
+           needs get_gamma_size() entries"""
+        self._screen._require_display()
         g = _to_gamma(gamma)
-        rr.XRRSetCrtcGamma(self._screen._display, self.id, g)
-        rr.XRRFreeGamma(g)
-        gamma = property(get_gamma, set_gamma)"""
+        try:
+            rr.XRRSetCrtcGamma(self._screen._display, self.xid, g)
+        finally:
+            rr.XRRFreeGamma(g)
 
     def load_outputs(self):
         """Get the currently assigned outputs"""
@@ -428,7 +1172,7 @@ class Crtc:
     def supports_output(self, output):
         """Check if the output can be used by the crtc. 
            See check_crtc_for_output in xrandr.c"""
-        if not self.xid in map(lambda c: c.xid, output.get_crtcs()):
+        if not self._screen.capabilities.can_drive(self, output):
             return False
         if len(self._outputs):
             for other in self._outputs:
@@ -441,8 +1185,8 @@ class Crtc:
         elif self._info.contents.noutput > 0:
             if self._info.contents.x != output._x: return False
             if self._info.contents.y != output._y: return False
-            if self._info.contents.mode_info != output._mode: return False
-            if self._info.rotation != output._rotation: return False
+            if self._info.contents.mode != output._mode: return False
+            if self._info.contents.rotation != output._rotation: return False
         return True
 
     def supports_rotation(self, rotation):
@@ -466,12 +1210,576 @@ class Crtc:
             if output.has_changed(): return True
         return False
 
+class Provider:
+    """The provider is a graphics device, e.g. the integrated and the
+       discrete GPU of a hybrid graphics laptop. It owns crtcs and outputs
+       and can show the outputs of or render for other providers
+       (RandR 1.4)"""
+    def __init__(self, info, xid, screen):
+        """Initializes the provider"""
+        self._info = info
+        self.xid = xid
+        self._screen = weakref.proxy(screen)
+        self.name = info.contents.name
+
+    def __repr__(self):
+        return "<Provider %s 0x%x>" % (self.name, self.xid)
+
+    def _free(self):
+        """Frees the reference to the provider info. Called by the screen
+           when it gets closed"""
+        if self._info:
+            rr.XRRFreeProviderInfo(self._info)
+        self._info = None
+
+    def get_xid(self):
+        """Returns the internal id of the provider from the X server"""
+        return self.xid
+
+    def get_capabilities(self):
+        """Returns the RR_CAPABILITY_* flags of the provider"""
+        return self._info.contents.capabilities
+
+    def has_capability(self, capability):
+        """Returns True if the provider has got all of the given
+           capabilities"""
+        return self.get_capabilities() & capability == capability
+
+    def get_crtcs(self):
+        """Returns the crtcs of the provider"""
+        info = self._info.contents
+        crtcs = [self._screen.get_crtc_by_xid(info.crtcs[i]) \
+                 for i in range(info.ncrtcs)]
+        return [crtc for crtc in crtcs if crtc]
+
+    def get_outputs(self):
+        """Returns the outputs of the provider. The outputs of a sink only
+           become part of the screen resources after an output source has
+           been set and the screen has been reloaded"""
+        info = self._info.contents
+        outputs = [self._screen.get_output_by_id(info.outputs[i]) \
+                   for i in range(info.noutputs)]
+        return [output for output in outputs if output]
+
+    def get_associated_providers(self):
+        """Returns a list of tuples of the providers which are wired to
+           this one and the capabilities of the association"""
+        info = self._info.contents
+        associated = []
+        for i in range(info.nassociatedproviders):
+            provider = self._screen.get_provider_by_xid( \
+                           info.associated_providers[i])
+            if provider:
+                associated.append((provider, info.associated_capability[i]))
+        return associated
+
+    def set_output_source(self, source):
+        """Shows the images rendered by the source provider on the outputs
+           of this provider, e.g. to use the outputs of a secondary GPU.
+           None removes the source. The screen has to be reloaded
+           afterwards to configure the new outputs"""
+        self._screen._require_display()
+        self._screen._check_version((1,4))
+        if source and not \
+           source.has_capability(xrandr.RR_CAPABILITY_SOURCE_OUTPUT):
+            raise RRError("The provider %s cannot be an output source" % \
+                          source.name)
+        if not self.has_capability(xrandr.RR_CAPABILITY_SINK_OUTPUT):
+            raise RRError("The provider %s cannot show the outputs of "
+                          "other providers" % self.name)
+        screen = self._screen
+        with screen.lock:
+            rr.XRRSetProviderOutputSource(screen._display, self.xid,
+                                          source and source.xid or 0)
+            xlib.XFlush(screen._display)
+
+    def set_offload_sink(self, sink):
+        """Lets this provider render for the sink provider, e.g. to offload
+           the rendering of applications to a faster GPU. None removes
+           the sink"""
+        self._screen._require_display()
+        self._screen._check_version((1,4))
+        if sink and not \
+           sink.has_capability(xrandr.RR_CAPABILITY_SINK_OFFLOAD):
+            raise RRError("The provider %s cannot be an offload sink" % \
+                          sink.name)
+        if not self.has_capability(xrandr.RR_CAPABILITY_SOURCE_OFFLOAD):
+            raise RRError("The provider %s cannot offload rendering" % \
+                          self.name)
+        screen = self._screen
+        with screen.lock:
+            rr.XRRSetProviderOffloadSink(screen._display, self.xid,
+                                         sink and sink.xid or 0)
+            xlib.XFlush(screen._display)
+
+class Snapshot:
+    """An immutable copy of the configuration of a screen or an output.
+       The values are available as attributes"""
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A snapshot cannot be changed")
+
+    def __repr__(self):
+        return "<Snapshot %s>" % self.__dict__
+
+    def get_output(self, name):
+        """Returns the snapshot of the output with the given name or None"""
+        for output in self.outputs:
+            if output.name == name:
+                return output
+        return None
+
+class TimingReport:
+    """The durations of the phases of applying a configuration in seconds.
+       Phases is a list of (name, crtc xid or None, duration) tuples in
+       the order of execution. Crtcs maps the xid of each reconfigured crtc
+       to a dictionary with the offsets since the start, at which the crtc
+       was disabled (or None) and configured, and the resulting blank
+       time. The confirm phase is added once the Confirmation of the
+       report is complete, total is the duration of the apply call"""
+    def __init__(self, callback=None):
+        """The optional callback gets the name, the crtc xid or None and
+           the duration of each phase as soon as it is finished"""
+        self.callback = callback
+        self.start = time.time()
+        self.phases = []
+        self.crtcs = {}
+        self.total = None
+        self.pending = None
+        self.confirmation = None
+
+    def __repr__(self):
+        return "<TimingReport total=%s phases=%s>" % (self.total,
+                                                      len(self.phases))
+
+    def _add(self, name, started, crtc=None):
+        duration = time.time() - started
+        self.phases.append((name, crtc, duration))
+        if self.callback:
+            self.callback(name, crtc, duration)
+        return duration
+
+    def _disabled(self, crtc, started):
+        self._add("disable", started, crtc)
+        self.crtcs[crtc] = {"disabled": started - self.start,
+                            "configured": None,
+                            "blank": None}
+
+    def _configured(self, crtc, started):
+        duration = self._add("set-crtc-config", started, crtc)
+        timing = self.crtcs.setdefault(crtc, {"disabled": None})
+        timing["configured"] = started + duration - self.start
+        # The crtc is dark from its disabling or the begin of the mode set
+        # until the configuration has been done
+        if timing["disabled"] is None:
+            timing["blank"] = duration
+        else:
+            timing["blank"] = timing["configured"] - timing["disabled"]
+
+    def get_duration(self, name):
+        """Returns the summed duration of all phases of the given name"""
+        return sum([duration for (phase, crtc, duration) in self.phases \
+                    if phase == name])
+
+    def get_blank_time(self):
+        """Returns the longest blank time of all crtcs"""
+        blanks = [timing["blank"] for timing in self.crtcs.values() \
+                  if timing["blank"] is not None]
+        return max(blanks or [0])
+
+class Confirmation:
+    """Waits for the RandR events, by which the server confirms an applied
+       configuration. The events are selected on the display connection of
+       the screen before the configuration is applied and taken from its
+       queue. Use wait() or integrate fileno() and poll() into a main loop.
+       Once complete, the crtcs of the screen hold the reported
+       configuration and state holds the snapshot of it"""
+    def __init__(self, screen, crtcs=(), size_change=False, reload=False):
+        """Selects the events which are needed to confirm the changes of
+           the given crtc xids and of the screen size. Has to be created
+           before the changes are applied. If reload is True the screen is
+           reloaded once the changes are confirmed, e.g. since the server
+           chose the configuration of the crtcs"""
+        self._screen = screen
+        self._mask = screen._input_mask
+        self._crtcs = dict([(xid, True) for xid in crtcs])
+        self._size_change = size_change
+        self._reload = reload
+        self._events = 0
+        self._infos = {}
+        self._selected = False
+        self._done = False
+        self._report = None
+        self._started = None
+        self.crtcs = {}
+        self.state = None
+        if self._crtcs or size_change:
+            self._select()
+        else:
+            self._finish()
+
+    def __repr__(self):
+        return "<Confirmation done=%s missing=%s>" % (self._done,
+                                                      self._crtcs.keys())
+
+    def _select(self):
+        if not self._selected:
+            self._screen.select_input(self._mask | CONFIRM_MASK)
+            self._selected = True
+
+    def _deselect(self):
+        if self._selected:
+            self._screen.select_input(self._mask)
+            self._selected = False
+
+    def _cancel(self):
+        """Stops waiting, e.g. if applying the changes failed"""
+        if not self._done:
+            self._deselect()
+            self._done = True
+
+    def _time(self, report, started):
+        """Adds the confirm phase, which began at started, to the given
+           TimingReport as soon as the changes are confirmed"""
+        self._report = report
+        self._started = started
+        if self._done:
+            report._add("confirm", started)
+
+    def fileno(self):
+        """Returns the file descriptor of the display connection, e.g. for
+           gobject.io_add_watch()"""
+        return xlib.XConnectionNumber(self._screen._display)
+
+    def is_done(self):
+        """Returns True if all expected events have arrived"""
+        return self._done
+
+    def poll(self):
+        """Processes the queued events without blocking. Returns True if the
+           configuration has been confirmed"""
+        if self._done:
+            return True
+        screen = self._screen
+        screen.lock.acquire()
+        try:
+            event = XEvent()
+            while xlib.XCheckTypedEvent(screen._display,
+                                        screen._event_base + \
+                                        xrandr.RR_SCREEN_CHANGE_NOTIFY,
+                                        byref(event)):
+                if screen.handle_event(event):
+                    self._size_change = False
+                    self._events += 1
+            while xlib.XCheckTypedEvent(screen._display,
+                                        screen._event_base + \
+                                        xrandr.RR_NOTIFY,
+                                        byref(event)):
+                notify = cast(byref(event),
+                              POINTER(_XRRNotifyEvent)).contents
+                if notify.subtype != xrandr.RR_NOTIFY_CRTC_CHANGE:
+                    continue
+                notify = cast(byref(event),
+                              POINTER(_XRRCrtcChangeNotifyEvent)).contents
+                self.crtcs[notify.crtc] = (notify.mode, notify.x, notify.y,
+                                           notify.rotation)
+                self._infos[notify.crtc] = (notify.mode, notify.x, notify.y,
+                                            notify.width, notify.height,
+                                            notify.rotation)
+                self._crtcs.pop(notify.crtc, None)
+                self._events += 1
+            if not self._crtcs and not self._size_change:
+                self._finish()
+        finally:
+            screen.lock.release()
+        return self._done
+
+    def _finish(self):
+        screen = self._screen
+        self._deselect()
+        if self._events and self._reload:
+            screen.reload()
+        elif self._events:
+            # The events report the new configuration of the crtcs, so the
+            # screen doesn't have to be reloaded
+            for (xid, info) in self._infos.items():
+                crtc = screen.get_crtc_by_xid(xid)
+                if crtc is not None:
+                    crtc._update_info(*info)
+            screen._publish()
+        self.state = screen.get_snapshot()
+        self._done = True
+        if self._report is not None:
+            self._report._add("confirm", self._started)
+
+    def wait(self, timeout=None):
+        """Blocks until the configuration has been confirmed and returns the
+           snapshot of the confirmed state. Returns None if the events don't
+           arrive within timeout seconds. The events are only selected
+           while waiting then, wait() can be called again"""
+        if timeout is not None:
+            end = time.time() + timeout
+        display = self._screen._display
+        try:
+            if not self._done:
+                self._select()
+            while not self.poll():
+                remaining = None
+                if timeout is not None:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        return None
+                # Xlib may have read the events from the connection
+                # already, which doesn't become readable for them then
+                queued = xlib.XEventsQueued(display, QUEUED_ALREADY)
+                if xlib.XEventsQueued(display, QUEUED_AFTER_READING) > queued:
+                    continue
+                select.select([self.fileno()], [], [], remaining)
+        finally:
+            if not self._done:
+                self._deselect()
+        return self.state
+
+class _Batch:
+    """Context manager of Screen.batch"""
+    def __init__(self, screen):
+        self.screen = screen
+
+    def __enter__(self):
+        self.screen.lock.acquire()
+        self.screen._batch_depth += 1
+        return self.screen
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        screen = self.screen
+        try:
+            screen._batch_depth -= 1
+            if not screen._batch_depth:
+                screen._flush()
+        finally:
+            screen.lock.release()
+
+class PendingConfig:
+    """A configuration that has been applied on trial. Unless it gets
+       confirmed in time the saved state is restored by a timer thread.
+       The thread uses its own display connection, since Xlib connections
+       must not be shared between threads"""
+    def __init__(self, screen, saved, timeout):
+        """Starts the timer for the given screen and saved state"""
+        self.saved = saved
+        self.error = None
+        self._display_name = xlib.XDisplayString(screen._display)
+        self._screen = screen._screen
+        self._lock = threading.Lock()
+        self._status = "pending"
+        self._timer = threading.Timer(timeout, self._on_timeout)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def is_pending(self):
+        """Returns True if the configuration has been neither confirmed nor
+           reverted yet"""
+        return self._status == "pending"
+
+    def is_reverted(self):
+        """Returns True if the saved state has been restored"""
+        return self._status == "reverted"
+
+    def confirm(self):
+        """Keeps the configuration. Returns False if it is too late, since
+           the saved state has already been restored"""
+        self._lock.acquire()
+        try:
+            if self._status == "pending":
+                self._status = "confirmed"
+                self._timer.cancel()
+            return self._status == "confirmed"
+        finally:
+            self._lock.release()
+
+    def revert(self):
+        """Restores the saved state immediately. Screen instances of the
+           application have to be reloaded afterwards"""
+        self._lock.acquire()
+        try:
+            if self._status != "pending":
+                return self._status == "reverted"
+            self._timer.cancel()
+            self._restore()
+            return True
+        finally:
+            self._lock.release()
+
+    def _on_timeout(self):
+        self._lock.acquire()
+        try:
+            if self._status == "pending":
+                self._restore()
+        finally:
+            self._lock.release()
+
+    def _restore(self):
+        self._status = "reverted"
+        dpy = xlib.XOpenDisplay(self._display_name)
+        if not dpy:
+            self.error = RRError("Cannot open the display",
+                                 self._display_name)
+            return
+        screen = Screen(dpy, self._screen, close_display=True)
+        try:
+            try:
+                screen.restore_state(self.saved)
+            except RRError, error:
+                self.error = error
+        finally:
+            screen.close()
+
+class _OutputDict:
+    """The outputs of a screen by name. Outputs are only added, and their
+       infos requested, when they are looked up by name or listed. If
+       connected_only is True disconnected outputs, which are not active,
+       are left out"""
+    def __init__(self, connected_only=False):
+        self.connected_only = connected_only
+        self._outputs = {}
+        self._pending = []
+
+    def __repr__(self):
+        self._load()
+        return repr(self._outputs)
+
+    def _add_pending(self, outputs):
+        """Adds the outputs, which haven't been loaded yet"""
+        self._pending.extend(outputs)
+
+    def _load(self, name=None):
+        """Adds pending outputs until the one of the given name has been
+           found or all outputs have been added"""
+        while self._pending:
+            output = self._pending.pop(0)
+            if self.connected_only and not output._mode and \
+               not output.is_connected():
+                output._unload()
+                continue
+            self._outputs[output.name] = output
+            if output.name == name:
+                return
+
+    def __getitem__(self, name):
+        if name not in self._outputs:
+            self._load(name)
+        return self._outputs[name]
+
+    def __setitem__(self, name, output):
+        self._outputs[name] = output
+
+    def __delitem__(self, name):
+        self._load()
+        del self._outputs[name]
+
+    def __contains__(self, name):
+        if name not in self._outputs:
+            self._load(name)
+        return name in self._outputs
+
+    has_key = __contains__
+
+    def get(self, name, default=None):
+        if name in self:
+            return self._outputs[name]
+        return default
+
+    def __len__(self):
+        self._load()
+        return len(self._outputs)
+
+    def __iter__(self):
+        self._load()
+        return iter(self._outputs)
+
+    def keys(self):
+        self._load()
+        return self._outputs.keys()
+
+    def values(self):
+        self._load()
+        return self._outputs.values()
+
+    def items(self):
+        self._load()
+        return self._outputs.items()
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
 class Screen:
-    def __init__(self, dpy, screen=-1):
-        """Initializes the screen"""
+    def __init__(self, dpy, screen=-1, close_display=False,
+                 connected_only=False):
+        """Initializes the screen. If close_display is True the connection
+           to the display will be closed together with the screen. If
+           connected_only is True the listings of outputs leave out
+           disconnected and inactive outputs, they can still be accessed by
+           their xid"""
+        self._set_defaults(close_display, connected_only)
+        self._display = dpy
+        if not -1 <= screen < xlib.XScreenCount(dpy):
+            raise RRError("The chosen screen is not available", screen)
+        elif screen == -1:
+            self._screen = xlib.XDefaultScreen(dpy)
+        else:
+            self._screen = screen
+        self._root = xlib.XRootWindow(self._display, self._screen)
+        self._id = rr.XRRRootToScreen(self._display, self._root)
+        # Xrandr caches the version per display, so the screens of a display
+        # only cost a single round trip
+        major = c_int()
+        minor = c_int()
+        if rr.XRRQueryVersion(self._display, byref(major), byref(minor)):
+            self._version = (major.value, minor.value)
+        event_base = c_int()
+        error_base = c_int()
+        rr.XRRQueryExtension(self._display, byref(event_base),
+                             byref(error_base))
+        self._event_base = event_base.value
+        self._load()
+
+    def _set_defaults(self, close_display=False, connected_only=False):
+        """Sets the attributes of an empty screen"""
+        # Writers serialize on the lock, readers use the published snapshot
+        self.lock = threading.RLock()
+        self._snapshot = None
         # Some sane default values
-        self.outputs = {}
+        self._config = None
+        self._resources = None
+        self._display = None
+        # The version of the extension on the display of the screen
+        self._version = None
+        self._close_display = close_display
+        self._connected_only = connected_only
+        self.outputs = _OutputDict(connected_only)
         self.crtcs = []
+        self.modes = ModeTable()
+        self.providers = []
+        self.capabilities = None
+        self._outputs_by_id = {}
+        self._crtcs_by_xid = {}
+        self._providers_by_xid = {}
+        self._atoms = {}
+        self._batch_depth = 0
+        self._input_mask = 0
+        # Modes created or found on the server since the resources have
+        # been loaded by xid
+        self._created_modes = {}
+        # Modes of resize_virtual by size, the least recently used first
+        self._virtual_modes = OrderedDict()
         self._width = 0
         self._height = 0
         self._width_max = 0
@@ -480,46 +1788,211 @@ class Screen:
         self._height_min = 0
         self._width_mm = 0
         self._height_mm = 0
-
-        self._display = dpy
-        if not -1 <= screen < xlib.XScreenCount(dpy):
-            raise RRError("The chosen screen is not available", screen)
-        elif screen == -1:
-            self._screen = xlib.XDefaultScreen(dpy)
-        else:
-            self._screen = screen
-        self._root = xlib.XDefaultRootWindow(self._display, self._screen)
-        self._id = rr.XRRRootToScreen(self._display, self._root)
-        
+        # Cached RandR 1.0 configuration, see _load_config
+        self._sizes = []
+        self._size_rates = []
+        self._config_rotations = 0
+        self._config_rotation = 0
+        self._config_size_index = 0
+        self._config_rate = 0
+
+    def _require_display(self):
+        """Raises an exception if the screen isn't connected to a X server,
+           e.g. since it is detached or closed, instead of passing a NULL
+           display to Xlib"""
+        if not self._display:
+            raise RRError("The screen is not connected to a X server")
+
+    def _check_version(self, version):
+        """Raises an exception if the given or a later version of xrandr is
+           not available on the display of the screen"""
+        if self._version == None or self._version < version:
+            raise UnsupportedRRError(version, self._version)
+
+    def _load(self, crtcs={}, outputs={}, providers={}):
+        """Loads the configuration of the screen from the server. The given
+           crtc, output and provider instances are reused for the xids they
+           refer to"""
         self._load_resources()
         self._load_config()
         (self._width, self._height, 
          self._width_mm, self._height_mm) = self.get_size()
-        if xrandr.get_version() >= (1,2):
+        if self._version >= (1,2):
             self._load_screen_size_range()
-            self._load_crtcs()
-            self._load_outputs()
+            self._load_crtcs(crtcs)
+            self._load_outputs(outputs)
+            self.capabilities = Capabilities(self)
+        if self._version >= (1,4):
+            self._load_providers(providers)
 
         # Store XRandR 1.0 changes here
         self._rate = self.get_current_rate()
         self._rotation = self.get_current_rotation()
         self._size_index = self.get_current_size_index()
+        self._publish()
+
+    def _publish(self):
+        """Replaces the published snapshot by one of the configuration,
+           which the server reported for the crtcs. Has to be called with
+           the lock held. The snapshot holds the active outputs, so that
+           only their output infos are needed"""
+        outputs = []
+        for crtc in self.crtcs:
+            info = crtc._info.contents
+            if not info.mode:
+                continue
+            for i in range(info.noutput):
+                output = self._outputs_by_id.get(info.outputs[i])
+                if output is None:
+                    continue
+                outputs.append(Snapshot(name=output.name,
+                                        id=output.id,
+                                        connected=output.is_connected(),
+                                        mode=info.mode,
+                                        crtc=crtc.xid,
+                                        x=info.x,
+                                        y=info.y,
+                                        rotation=info.rotation,
+                                        scale=self._get_crtc_scale(info),
+                                        size=(info.width, info.height)))
+        outputs.sort(key=lambda output: output.name)
+        # Replacing the reference is atomic, so readers either get the old
+        # or the new snapshot
+        self._snapshot = Snapshot(width=self._width,
+                                  height=self._height,
+                                  width_mm=self._width_mm,
+                                  height_mm=self._height_mm,
+                                  size_index=self._config_size_index,
+                                  rate=self._config_rate,
+                                  rotation=self._config_rotation,
+                                  outputs=tuple(outputs))
+
+    def get_snapshot(self):
+        """Returns the immutable snapshot of the last loaded or confirmed
+           configuration. It can be read from any thread without locking,
+           pending changes are not included"""
+        return self._snapshot
+
+    @_synchronized
+    def reload(self):
+        """Reloads the configuration from the server, e.g. after modes have
+           been created. Pending changes get lost. Output and crtc instances
+           which still exist on the server stay valid"""
+        crtcs = dict([(crtc.xid, crtc) for crtc in self.crtcs])
+        outputs = dict(self._outputs_by_id)
+        providers = dict([(provider.xid, provider) for provider in \
+                          self.providers])
+        for output in outputs.values():
+            output._free()
+        for crtc in crtcs.values():
+            crtc._free()
+        for provider in providers.values():
+            provider._free()
+        self.outputs = _OutputDict(self._connected_only)
+        self.crtcs = []
+        self.providers = []
+        self.capabilities = None
+        self._outputs_by_id = {}
+        self._crtcs_by_xid = {}
+        self._providers_by_xid = {}
+        if self._resources:
+            rr.XRRFreeScreenResources(self._resources)
+            self._resources = None
+        self._load(crtcs, outputs, providers)
 
     def __del__(self):
         """Free the reference to the interal screen config if the screen
            gets removed"""
-        rr.XRRFreeScreenConfigInfo(self._config)
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @_synchronized
+    def close(self):
+        """Frees all Xlib allocations of the screen and closes the display
+           connection if the screen owns it. The screen and its outputs and
+           crtcs cannot be used afterwards"""
+        # The output and crtc infos refer to the resources, so they have
+        # to be freed first
+        for output in self._outputs_by_id.values():
+            output._free()
+        for crtc in self.crtcs:
+            crtc._free()
+        for provider in self.providers:
+            provider._free()
+        self.outputs = _OutputDict(self._connected_only)
+        self.crtcs = []
+        self.providers = []
+        self.capabilities = None
+        self._outputs_by_id = {}
+        self._crtcs_by_xid = {}
+        self._providers_by_xid = {}
+        if self._resources:
+            rr.XRRFreeScreenResources(self._resources)
+            self._resources = None
+        if self._config:
+            rr.XRRFreeScreenConfigInfo(self._config)
+            self._config = None
+        if self._display and self._close_display:
+            xlib.XCloseDisplay(self._display)
+        self._display = None
 
     def _load_config(self):
         """Loads the screen configuration. Only needed privately by the
            the bindings"""
-        class XRRScreenConfiguration(Structure):
-            " private to Xrandr "
-            pass
-        gsi = rr.XRRGetScreenInfo
-        gsi.restype = POINTER(XRRScreenConfiguration)
-        self._config = gsi(self._display, self._root)
-        
+        if self._config:
+            rr.XRRFreeScreenConfigInfo(self._config)
+        self._config = rr.XRRGetScreenInfo(self._display, self._root)
+        # Copy the sizes, rates and rotations out of the configuration, so
+        # that the queries don't have to call into Xlib again
+        nsizes = c_int()
+        _sizes = rr.XRRConfigSizes(self._config, byref(nsizes))
+        self._sizes = []
+        self._size_rates = []
+        for i in range(nsizes.value):
+            size = _sizes[i]
+            self._sizes.append(_XRRScreenSize(size.width, size.height,
+                                              size.mwidth, size.mheight))
+            nrates = c_int()
+            _rates = rr.XRRConfigRates(self._config, i, byref(nrates))
+            self._size_rates.append(tuple(_rates[:nrates.value]))
+        current = Rotation()
+        self._config_rotations = rr.XRRConfigRotations(self._config,
+                                                       byref(current))
+        self._config_rotation = current.value
+        self._config_size_index = \
+                rr.XRRConfigCurrentConfiguration(self._config,
+                                                 byref(current))
+        self._config_rate = rr.XRRConfigCurrentRate(self._config)
+
+    def select_input(self, mask):
+        """Requests the RandR events of the given mask, e.g.
+           RR_SCREEN_CHANGE_NOTIFY_MASK, for the root window of the screen"""
+        rr.XRRSelectInput(self._display, self._root, mask)
+        self._input_mask = mask
+
+    @_synchronized
+    def handle_event(self, event):
+        """Updates the cached RandR 1.0 configuration if the given XEvent
+           reports a change of the screen. Returns True if the event was a
+           screen change notify of this screen"""
+        if event.type != self._event_base + xrandr.RR_SCREEN_CHANGE_NOTIFY:
+            return False
+        notify = cast(byref(event),
+                      POINTER(_XRRScreenChangeNotifyEvent)).contents
+        if notify.root != self._root:
+            return False
+        rr.XRRUpdateConfiguration(byref(event))
+        self._load_config()
+        (self._width, self._height,
+         self._width_mm, self._height_mm) = self.get_size()
+        self._publish()
+        return True
+
     def _load_screen_size_range(self):
         """Detects the dimensionios of the screen"""
         minWidth = c_int()
@@ -538,35 +2011,104 @@ class Screen:
     def _load_resources(self):
         """Loads the screen resources. Only needed privately for the 
            bindings"""
-        gsr = rr.XRRGetScreenResources
-        gsr.restype = POINTER(_XRRScreenResources)
-        self._resources = gsr(self._display, self._root)
-
-    def _load_crtcs(self):
+        self._resources = rr.XRRGetScreenResources(self._display, self._root)
+        # Copy the mode lines into a table, which also holds the
+        # precalculated refresh rates
+        modes = self._resources.contents.modes
+        self.modes = ModeTable([modes[i] for i in \
+                                range(self._resources.contents.nmode)])
+        self._created_modes = {}
+
+    def _load_crtcs(self, reuse={}):
         """Loads the available XRandR 1.2 crtcs (hardware pipes) of
            the screen"""
         gci = rr.XRRGetCrtcInfo
-        gci.restype = POINTER(_XRRCrtcInfo)
         c = self._resources.contents.crtcs
         for i in range(self._resources.contents.ncrtc):
             xrrcrtcinfo = gci(self._display, self._resources, c[i])
-            self.crtcs.append(Crtc(xrrcrtcinfo, c[i], self))
+            if c[i] in reuse:
+                crtc = reuse[c[i]]
+                crtc.__init__(xrrcrtcinfo, c[i], self)
+            else:
+                crtc = Crtc(xrrcrtcinfo, c[i], self)
+            self.crtcs.append(crtc)
+            self._crtcs_by_xid[c[i]] = crtc
 
-    def _load_outputs(self):
-        """Loads the available XRandR 1.2 outputs of the screen"""
-        goi = rr.XRRGetOutputInfo
-        goi.restype = POINTER(_XRROutputInfo)
+    def _load_outputs(self, reuse={}):
+        """Loads the available XRandR 1.2 outputs of the screen. The output
+           infos are only requested on first use, see Output.__getattr__"""
         o = self._resources.contents.outputs
+        outputs = []
         for i in range(self._resources.contents.noutput):
-            xrroutputinfo = goi(self._display, self._resources, o[i])
-            output = Output(xrroutputinfo, o[i], self)
-            self.outputs[xrroutputinfo.contents.name] = output
-            # Store the mode of the crtc in the output instance
-            crtc = self.get_crtc_by_xid(output.get_crtc())
-            if crtc:
-                output._mode = crtc._info.contents.mode
+            if o[i] in reuse:
+                output = reuse[o[i]]
+                output.__init__(None, o[i], self)
+            else:
+                output = Output(None, o[i], self)
+            outputs.append(output)
+            self._outputs_by_id[o[i]] = output
+        self.outputs._add_pending(outputs)
+        # Store the mode of the crtc in its outputs. The crtc infos know
+        # the active outputs, so the output infos aren't needed here
+        for crtc in self.crtcs:
+            info = crtc._info.contents
+            if not info.mode:
+                continue
+            for i in range(info.noutput):
+                output = self._outputs_by_id.get(info.outputs[i])
+                if output is None:
+                    continue
+                output._mode = info.mode
+                output._x = info.x
+                output._y = info.y
+                output._rotation = info.rotation
+                output._scale = self._get_crtc_scale(info)
                 crtc.add_output(output)
 
+    def _get_crtc_scale(self, info):
+        """Returns the horizontal and vertical scale of the given crtc info
+           or None. The size of the crtc differs from the one of its mode if
+           it is transformed"""
+        mode = self.get_mode_by_xid(info.mode)
+        if mode is None:
+            return None
+        width = get_mode_width(mode, info.rotation)
+        height = get_mode_height(mode, info.rotation)
+        if width and height and (width, height) != (info.width, info.height):
+            return (float(info.width) / width, float(info.height) / height)
+        return None
+
+    def _get_output_info(self, id):
+        """Requests the info of the output with the given xid"""
+        self._require_display()
+        info = rr.XRRGetOutputInfo(self._display, self._resources, id)
+        if not info:
+            raise RRError("Failed to get the info of the output", id)
+        return info
+
+    def _load_providers(self, reuse={}):
+        """Loads the XRandR 1.4 providers (graphics devices) of the
+           screen"""
+        resources = rr.XRRGetProviderResources(self._display, self._root)
+        if not resources:
+            return
+        p = resources.contents.providers
+        try:
+            for i in range(resources.contents.nproviders):
+                info = rr.XRRGetProviderInfo(self._display, self._resources,
+                                             p[i])
+                if not info:
+                    continue
+                if p[i] in reuse:
+                    provider = reuse[p[i]]
+                    provider.__init__(info, p[i], self)
+                else:
+                    provider = Provider(info, p[i], self)
+                self.providers.append(provider)
+                self._providers_by_xid[p[i]] = provider
+        finally:
+            rr.XRRFreeProviderResources(resources)
+
     def get_size(self):
         """Returns the current pixel and physical size of the screen"""
         width = xlib.XDisplayWidth(self._display, self._screen)
@@ -575,82 +2117,74 @@ class Screen:
         height_mm = xlib.XDisplayHeightMM(self._display, self._screen)
         return width, height, width_mm, height_mm
 
+    def _refresh_timestamps(self):
+        """Updates the timestamps of the loaded resources, which are
+           checked by the server when applying a configuration"""
+        if self._version >= (1,3):
+            # Doesn't probe the outputs again
+            resources = rr.XRRGetScreenResourcesCurrent(self._display,
+                                                        self._root)
+        else:
+            resources = rr.XRRGetScreenResources(self._display, self._root)
+        if not resources:
+            raise RRError("Failed to get the screen resources")
+        self._resources.contents.timestamp = resources.contents.timestamp
+        self._resources.contents.configTimestamp = \
+                resources.contents.configTimestamp
+        rr.XRRFreeScreenResources(resources)
+
     def get_timestamp(self):
         """Creates a X timestamp that must be used when applying changes, since
            they can be delayed"""
         config_timestamp = Time()
-        rr.XRRTimes.restpye = c_ulong
         return rr.XRRTimes(self._display, self._id, byref(config_timestamp))
 
     def get_crtc_by_xid(self, xid):
         """Returns the crtc with the given xid or None"""
-        for crtc in self.crtcs:
-            if crtc.xid == xid:
-                return crtc
-        return None
+        return self._crtcs_by_xid.get(xid)
 
     def get_current_rate(self):
         """Returns the currently used refresh rate"""
-        xrandr._check_required_version((1,0))
-        xccr = rr.XRRConfigCurrentRate
-        xccr.restype = c_int
-        return xccr(self._config)
+        self._check_version((1,0))
+        return self._config_rate
 
     def get_available_rates_for_size_index(self, size_index):
         """Returns the refresh rates that are supported by the screen for
            the given resolution. See get_available_sizes for the resolution to
            which size_index points"""
-        xrandr._check_required_version((1,0))
-        rates = []
-        nrates = c_int()
-        rr.XRRConfigRates.restype = POINTER(c_ushort)
-        _rates = rr.XRRConfigRates(self._config, size_index, byref(nrates))
-        for r in range(nrates.value):
-            rates.append(_rates[r])
-        return rates
+        self._check_version((1,0))
+        if 0 <= size_index < len(self._size_rates):
+            return list(self._size_rates[size_index])
+        return []
 
     def get_current_rotation(self):
         """Returns the currently used rotation. Can be RR_ROTATE_0, 
         RR_ROTATE_90, RR_ROTATE_180 or RR_ROTATE_270"""
-        xrandr._check_required_version((1,0))
-        current = c_ushort()
-        rotations = rr.XRRConfigRotations(self._config, byref(current))
-        return current.value
+        self._check_version((1,0))
+        return self._config_rotation
 
     def get_available_rotations(self):
         """Returns a binary flag that holds the available resolutions"""
-        xrandr._check_required_version((1,0))
-        current = c_ushort()
-        rotations = rr.XRRConfigRotations(self._config, byref(current))
-        return rotations
+        self._check_version((1,0))
+        return self._config_rotations
 
     def get_current_size_index(self):
         """Returns the position of the currently used resolution size in the
            list of available resolutions. See get_available_sizes"""
-        xrandr._check_required_version((1,0))
-        rotation = c_ushort()
-        size = rr.XRRConfigCurrentConfiguration(self._config,
-                                                byref(rotation))
-        return size
+        self._check_version((1,0))
+        return self._config_size_index
 
     def get_available_sizes(self):
         """Returns the available resolution sizes of the screen. The size
            index points to the corresponding resolution of this list"""
-        xrandr._check_required_version((1,0))
-        sizes = []
-        nsizes = c_int()
-        xcs = rr.XRRConfigSizes
-        xcs.restype = POINTER(_XRRScreenSize)
-        _sizes = xcs(self._config, byref(nsizes))
-        for r in range(nsizes.value):
-            sizes.append(_sizes[r])
-        return sizes
+        self._check_version((1,0))
+        return list(self._sizes)
 
     def set_config(self, size_index, rate, rotation):
         """Configures the screen with the given resolution at the given size 
            index, rotation and refresh rate. To get in effect call
            Screen.apply_config()"""
-        xrandr._check_required_version((1,0))
+        self._check_version((1,0))
         self.set_size_index(size_index)
         self.set_refresh_rate(rate)
         self.set_rotation(rotation)
@@ -658,7 +2192,7 @@ class Screen:
     def set_size_index(self, index):
         """Sets the reoslution of the screen. To get in effect call
            Screen.apply_config()"""
-        if index in range(len(self.get_available_sizes())):
+        if 0 <= index < len(self._sizes):
             self._size_index = index
         else:
             raise RRError("There isn't any size associated "
@@ -667,7 +2201,7 @@ class Screen:
     def set_rotation(self, rotation):
         """Sets the rotation of the screen. To get in effect call
            Screen.apply_config()"""
-        if self.get_available_rotations() & rotation:
+        if self._config_rotations & rotation:
             self._rotation = rotation
         else:
             raise RRError("The chosen rotation is not supported")
@@ -675,45 +2209,92 @@ class Screen:
     def set_refresh_rate(self, rate):
         """Sets the refresh rate of the screen. To get in effect call
            Screen.apply_config()"""
-        if rate in self.get_available_rates_for_size_index(self._size_index):
+        if 0 <= self._size_index < len(self._size_rates) and \
+           rate in self._size_rates[self._size_index]:
             self._rate = rate
         else:
             raise RRError("The chosen refresh rate %s is not "
                           "supported" % rate)
 
+    @_synchronized
+    def create_mode(self, mode):
+        """Creates a new mode on the server from the given mode line, e.g.
+           one of the timings module, and returns its xid. The mode has to
+           be added to an output by Output.add_mode before it can be used.
+           It is available by get_mode_by_xid at once, but only shows up in
+           the available modes of the outputs after reloading the screen"""
+        self._check_version((1,2))
+        name = mode.name
+        info = _XRRModeInfo(0, mode.width, mode.height, mode.dotClock,
+                            mode.hSyncStart, mode.hSyncEnd, mode.hTotal,
+                            mode.hSkew, mode.vSyncStart, mode.vSyncEnd,
+                            mode.vTotal, name, len(name), mode.modeFlags)
+        xid = rr.XRRCreateMode(self._display, self._root, byref(info))
+        if not xid:
+            raise RRError("Failed to create the mode %s" % name)
+        mode.id = xid
+        info.id = xid
+        self._created_modes[xid] = info
+        self.modes.append(info)
+        return xid
+
+    @_synchronized
+    def destroy_mode(self, mode):
+        """Removes the given mode xid from the server. The mode must not be
+           used by any output"""
+        self._check_version((1,2))
+        rr.XRRDestroyMode(self._display, mode)
+        self._created_modes.pop(mode, None)
+
     def get_mode_by_name(self, name):
         """Returns the mode of the given name"""
         screen_modes = self._resources.contents.modes
         for s in range(self._resources.contents.nmode):
             if screen_modes[s].name == name:
                 return screen_modes[s]
+        for mode in self._created_modes.values():
+            if mode.name == name:
+                return mode
         return None
 
     def get_mode_by_xid(self, xid):
         """Returns the mode of the given xid"""
-        screen_modes = self._resources.contents.modes
-        for s in range(self._resources.contents.nmode):
-            if screen_modes[s].id == xid:
-                return screen_modes[s]
-        return None
+        row = self.modes.index(xid)
+        if row is None:
+            return None
+        if row >= self._resources.contents.nmode:
+            # Created since the resources have been loaded
+            return self._created_modes.get(xid)
+        return self._resources.contents.modes[row]
 
     def get_output_by_name(self, name):
-        """Returns the output of the screen with the given name or None"""
-        if self.outputs.has_key(name):
-            return self.outputs[name]
-        else:
-            return None
+        """Returns the output of the screen with the given name or None.
+           Only the outputs before the found one are loaded"""
+        return self.outputs.get(name)
 
     def get_output_by_id(self, id):
         """Returns the output of the screen with the given xid or None"""
-        for o in self.outputs.values():
-            if o.id == id:
-                return o
+        return self._outputs_by_id.get(id)
+
+    def get_providers(self):
+        """Returns the providers of the screen"""
+        self._check_version((1,4))
+        return list(self.providers)
+
+    def get_provider_by_xid(self, xid):
+        """Returns the provider with the given xid or None"""
+        return self._providers_by_xid.get(xid)
+
+    def get_provider_by_name(self, name):
+        """Returns the first provider of the given name or None"""
+        for provider in self.providers:
+            if provider.name == name:
+                return provider
         return None
 
     def print_info(self, verbose=False):
         """Prints some information about the detected screen and its outputs"""
-        xrandr._check_required_version((1,0))
+        self._check_version((1,0))
         print "Screen %s: minimum %s x %s, current %s x %s, maximum %s x %s" %\
               (self._screen,
                self._width_min, self._height_min,
@@ -721,6 +2302,12 @@ class Screen:
                self._width_max, self._height_max)
         print "          %smm x %smm" % (self._width_mm, self._height_mm)
         print "Crtcs: %s" % len(self.crtcs)
+        if self.providers:
+            print "Providers:"
+            for provider in self.providers:
+                print "  0x%x %s: %s crtcs, %s outputs" % \
+                      (provider.xid, provider.name,
+                       len(provider.get_crtcs()), len(provider.get_outputs()))
         if verbose:
             print "Modes (%s):" % self._resources.contents.nmode
             modes = self._resources.contents.modes
@@ -728,14 +2315,12 @@ class Screen:
                 print "  %s - %sx%s" % (modes[i].name,
                                        modes[i].width,
                                        modes[i].height)
-        i = 0
         print "Sizes @ Refresh Rates:"
-        for s in self.get_available_sizes():
+        for (i, s) in enumerate(self._sizes):
             print "  [%s] %s x %s @ %s" % (i, s.width, s.height,
-                                           self.get_available_rates_for_size_index(i))
-            i += 1
+                                           list(self._size_rates[i]))
         print "Rotations:",
-        rots = self.get_available_rotations()
+        rots = self._config_rotations
         if rots & xrandr.RR_ROTATE_0: print "normal",
         if rots & xrandr.RR_ROTATE_90: print "right",
         if rots & xrandr.RR_ROTATE_180: print "inverted",
@@ -752,8 +2337,8 @@ class Screen:
                 print "    Modes:"
                 for m in range(len(modes)):
                     mode = modes[m]
-                    refresh = mode.dotClock / (mode.hTotal * mode.vTotal)
-                    print "      [%s] %s x %s @ %s" % (m,
+                    refresh = self.modes.get_rate(mode.id)
+                    print "      [%s] %s x %s @ %.2f" % (m,
                                                        mode.width,
                                                        mode.height,
                                                        refresh),
@@ -777,31 +2362,547 @@ class Screen:
                     print "      %s: %s" % (f,
                                             getattr(output._info.contents, f))
 
+    def get_primary_output(self):
+        """Returns the primary output or None"""
+        self._check_version((1,3))
+        return self.get_output_by_id(rr.XRRGetOutputPrimary(self._display,
+                                                            self._root))
+
+    def get_monitors(self, active=True):
+        """Returns the monitors of the screen. Servers before RandR 1.5 don't
+           know about monitors, so the monitors are derived from the active
+           crtcs"""
+        self._check_version((1,2))
+        if self._version >= (1,5):
+            return query_monitors(self._display, self._root, active)
+        primary = None
+        if self._version >= (1,3):
+            primary = self.get_primary_output()
+        return self._get_crtc_monitors(primary)
+
+    def _get_crtc_monitors(self, primary):
+        """Returns a monitor for each active crtc"""
+        monitors = []
+        for crtc in self.crtcs:
+            info = crtc._info.contents
+            outputs = crtc.get_outputs()
+            if not info.mode or not outputs:
+                continue
+            monitors.append(Monitor(outputs[0].name, info.x, info.y,
+                                    info.width, info.height,
+                                    outputs[0].get_physical_width(),
+                                    outputs[0].get_physical_height(),
+                                    primary in outputs, True,
+                                    [o.id for o in outputs]))
+        if primary is None and monitors:
+            monitors[0].primary = True
+        return monitors
+
+    @_synchronized
+    def set_monitor(self, name, x, y, width, height, mwidth=0, mheight=0,
+                    outputs=(), primary=False):
+        """Creates or replaces the monitor of the given name, e.g. to split a
+           large panel into several virtual monitors. Outputs is a list of
+           Output instances, which can also be empty"""
+        self._check_version((1,5))
+        monitor = rr.XRRAllocateMonitor(self._display, len(outputs))
+        if not monitor:
+            raise RRError("Failed to allocate the monitor")
+        info = monitor.contents
+        info.name = xlib.XInternAtom(self._display, name, False)
+        info.primary = primary
+        info.automatic = False
+        info.x = x
+        info.y = y
+        info.width = width
+        info.height = height
+        info.mwidth = mwidth
+        info.mheight = mheight
+        for (i, output) in enumerate(outputs):
+            info.outputs[i] = output.id
+        rr.XRRSetMonitor(self._display, self._root, monitor)
+        xlib.XFree(monitor)
+
+    @_synchronized
+    def delete_monitor(self, name):
+        """Removes the monitor of the given name"""
+        self._check_version((1,5))
+        atom = xlib.XInternAtom(self._display, name, True)
+        if not atom:
+            raise RRError("There isn't any monitor called %s" % name)
+        rr.XRRDeleteMonitor(self._display, self._root, atom)
+
+    def _get_atom(self, name, only_if_exists=False):
+        """Returns the atom of the given name. Atoms are permanent on the
+           server, so they are only looked up once"""
+        self._require_display()
+        atom = self._atoms.get(name)
+        if not atom:
+            atom = xlib.XInternAtom(self._display, name, only_if_exists)
+            if atom:
+                self._atoms[name] = atom
+        return atom
+
+    def _flush(self):
+        """Sends all queued requests and marks the property changes of the
+           outputs as done"""
+        self._require_display()
+        xlib.XFlush(self._display)
+        for output in self._outputs_by_id.values():
+            output._changes = output._changes & ~xrandr.CHANGES_PROPERTY
+
+    def batch(self):
+        """Returns a context manager, which queues all property changes
+           until the outermost batch ends. They are sent with a single
+           flush then:
+
+           with screen.batch():
+               for output in outputs:
+                   output.set_property("Backlight", 50)
+        """
+        self._require_display()
+        return _Batch(self)
+
+    def fade_backlights(self, targets, duration, rate=None):
+        """Fades the backlights of the given outputs to the target values
+           in duration seconds. Targets maps outputs to values within the
+           range of their backlight property. The values are precomputed
+           and all outputs are updated together once per frame at the
+           given or the highest current refresh rate"""
+        self._require_display()
+        if rate is None:
+            rates = [output.get_current_rate() for output in targets]
+            rate = max([r for r in rates if r] or [60.0])
+        steps = max(1, int(round(duration * rate)))
+        table = []
+        for (output, target) in targets.items():
+            name = output.get_backlight_property()
+            if name is None:
+                raise RRError("The output %s doesn't support changing the "
+                              "backlight" % output.name)
+            (low, high) = output.get_property_range(name) or (target, target)
+            target = max(low, min(high, target))
+            start = (output.get_property(name) or [target])[0]
+            values = [int(round(start + (target - start) * (i + 1) / \
+                                float(steps))) for i in range(steps)]
+            table.append((output, name, values))
+        interval = float(duration) / steps
+        begin = time.time()
+        last = {}
+        for step in range(steps):
+            with self.batch():
+                for (output, name, values) in table:
+                    # Skip the steps that don't change the integer value
+                    if last.get(output) != values[step]:
+                        output.set_property(name, values[step])
+                        last[output] = values[step]
+            delay = begin + (step + 1) * interval - time.time()
+            if delay > 0 and step < steps - 1:
+                time.sleep(delay)
+
     def get_outputs(self):
         """Returns the outputs of the screen"""
-        xrandr._check_required_version((1,2))
+        self._check_version((1,2))
         return self.outputs.values()
 
     def get_output_names(self):
-        xrandr._check_required_version((1,2))
+        self._check_version((1,2))
         return self.outputs.keys()
 
+    @_synchronized
     def set_size(self, width, height, width_mm, height_mm):
         """Apply the given pixel and physical size to the screen"""
-        xrandr._check_required_version((1,2))
+        self._check_version((1,2))
         # Check if we really need to apply the changes
         if (width, height, width_mm, height_mm) == self.get_size(): return
         rr.XRRSetScreenSize(self._display, self._root,
-                            c_int(width), c_int(height),
-                            c_int(width_mm), c_int(height_mm))
+                            width, height, width_mm, height_mm)
+
+    @_synchronized
+    def resize_virtual(self, width, height, output=None):
+        """Resizes the screen and the given or first active output to
+           exactly the given size, e.g. to follow the window of a remote
+           desktop client on Xvnc or Xvfb. If the output doesn't provide a
+           mode of that size, a reduced blanking mode is created. Up to
+           VIRTUAL_MODES created modes are kept for reuse, the least
+           recently used ones are removed. Other crtcs outside of the new
+           size are turned off. Only the needed requests are sent and the
+           screen isn't reloaded, pending changes are kept"""
+        self._require_display()
+        self._check_version((1,2))
+        if not (self._width_min <= width <= self._width_max and \
+                self._height_min <= height <= self._height_max):
+            raise RRError("The required size is not supported",
+                          (width, height))
+        if output is None:
+            for crtc in self.crtcs:
+                if crtc._info.contents.mode and crtc.get_outputs():
+                    output = crtc.get_outputs()[0]
+                    break
+            else:
+                raise RRError("There isn't any active output")
+        crtc = output._crtc
+        if crtc is None or not crtc._info.contents.mode:
+            raise RRError("The output %s is not active" % output.name)
+        info = crtc._info.contents
+        if info.rotation & (xrandr.RR_ROTATE_90 | xrandr.RR_ROTATE_270):
+            mode = self._get_virtual_mode(output, height, width)
+        else:
+            mode = self._get_virtual_mode(output, width, height)
+        # The crtc has to fit into the screen all the time, so the screen
+        # grows before and shrinks after the crtc is configured
+        (old_width, old_height) = (self._width, self._height)
+        if width > old_width or height > old_height:
+            self._resize_screen(max(width, old_width),
+                                max(height, old_height))
+        if mode != info.mode or info.x or info.y:
+            outputs = crtc.get_outputs()
+            crtc.set_config(0, 0, mode, outputs, info.rotation)
+            # Update the cached configuration instead of reloading it
+            info.mode = mode
+            info.x = 0
+            info.y = 0
+            info.width = width
+            info.height = height
+            for o in outputs:
+                o._mode = mode
+                o._x = 0
+                o._y = 0
+        if (self._width, self._height) != (width, height):
+            # Other crtcs which don't fit into the smaller screen have to be
+            # turned off, otherwise the server refuses the size
+            for other in self.crtcs:
+                if other is crtc:
+                    continue
+                other_info = other._info.contents
+                if other_info.mode and \
+                   (other_info.x + other_info.width > width or \
+                    other_info.y + other_info.height > height):
+                    other.disable()
+                    other_info.mode = 0
+                    other_info.noutput = 0
+                    for o in other.get_outputs():
+                        o._mode = None
+                        o._crtc = None
+                    other._outputs = []
+            self._resize_screen(width, height)
+        self._evict_virtual_modes()
+        # The cached RandR 1.0 configuration is outdated now
+        self._load_config()
+        self._publish()
+
+    def _resize_screen(self, width, height):
+        """Sets the screen size and keeps its resolution"""
+        if self._width and self._height and self._width_mm and \
+           self._height_mm:
+            width_mm = int(round(width * self._width_mm / \
+                                 float(self._width)))
+            height_mm = int(round(height * self._height_mm / \
+                                  float(self._height)))
+        else:
+            # Assume 96 dpi
+            width_mm = int(round(width * 25.4 / 96))
+            height_mm = int(round(height * 25.4 / 96))
+        rr.XRRSetScreenSize(self._display, self._root, width, height,
+                            width_mm, height_mm)
+        (self._width, self._height) = (width, height)
+        (self._width_mm, self._height_mm) = (width_mm, height_mm)
+
+    def _get_virtual_mode(self, output, width, height):
+        """Returns the xid of a mode of the given size for the output.
+           Created modes are reused, then the modes of the output, otherwise
+           a new mode is created"""
+        key = (width, height)
+        entry = self._virtual_modes.pop(key, None)
+        if entry is not None:
+            # Move the mode to the end of the recently used ones
+            self._virtual_modes[key] = entry
+            (xid, outputs) = entry
+            if output.id not in outputs:
+                output.add_mode(xid)
+                outputs.add(output.id)
+            return xid
+        positions = output.query.find(width, height)
+        if positions:
+            return output.query.get_xid(positions[0])
+        # Version 2 of the reduced blanking keeps the exact width
+        line = timings.cvt(width, height, 60, timings.CVT_REDUCED_V2)
+        # The loaded resources can still hold a mode of the name, which
+        # has been destroyed since, e.g. by an earlier eviction
+        mode = self._get_server_mode(line.name)
+        if mode is None:
+            xid = self.create_mode(line)
+        else:
+            xid = mode.id
+            if self.get_mode_by_xid(xid) is None:
+                # Created by another client
+                self._created_modes[xid] = mode
+                self.modes.append(mode)
+        output.add_mode(xid)
+        self._virtual_modes[key] = (xid, set([output.id]))
+        return xid
+
+    def _get_server_mode(self, name):
+        """Returns a copy of the mode of the given name from freshly
+           requested screen resources or None"""
+        if self._version >= (1,3):
+            # Doesn't probe the outputs again
+            resources = rr.XRRGetScreenResourcesCurrent(self._display,
+                                                        self._root)
+        else:
+            resources = rr.XRRGetScreenResources(self._display, self._root)
+        if not resources:
+            raise RRError("Failed to get the screen resources")
+        try:
+            modes = resources.contents.modes
+            for i in range(resources.contents.nmode):
+                mode = modes[i]
+                if mode.name != name:
+                    continue
+                # The name has to outlive the resources
+                return _XRRModeInfo(mode.id, mode.width, mode.height,
+                                    mode.dotClock, mode.hSyncStart,
+                                    mode.hSyncEnd, mode.hTotal, mode.hSkew,
+                                    mode.vSyncStart, mode.vSyncEnd,
+                                    mode.vTotal, name, len(name),
+                                    mode.modeFlags)
+        finally:
+            rr.XRRFreeScreenResources(resources)
+        return None
 
-    def apply_output_config(self):
-        """Used for instantly applying RandR 1.2 changes"""
-        xrandr._check_required_version((1,2))
+    def _evict_virtual_modes(self):
+        """Removes the least recently used created modes, which exceed
+           VIRTUAL_MODES and aren't used by any crtc"""
+        if len(self._virtual_modes) <= VIRTUAL_MODES:
+            return
+        used = set([crtc._info.contents.mode for crtc in self.crtcs])
+        for key in self._virtual_modes.keys():
+            if len(self._virtual_modes) <= VIRTUAL_MODES:
+                break
+            (xid, outputs) = self._virtual_modes[key]
+            if xid in used:
+                continue
+            del self._virtual_modes[key]
+            for id in outputs:
+                rr.XRRDeleteOutputMode(self._display, id, xid)
+            self.destroy_mode(xid)
+
+    def get_requested_state(self):
+        """Returns the configuration that the pending changes of the outputs
+           would result in, as dictionary of output names and dictionaries
+           with the mode, x, y, rotation, scale and crtc. The positions are
+           calculated from the relations, but the outputs are not changed"""
+        positions = self._get_arranged_positions()
+        state = {}
+        for output in self.outputs.values():
+            if output._mode:
+                (x, y) = positions.get(output, (output._x, output._y))
+            else:
+                (x, y) = (0, 0)
+            crtc = None
+            if output._crtc:
+                crtc = output._crtc.xid
+            state[output.name] = {"mode": output._mode,
+                                  "x": x,
+                                  "y": y,
+                                  "rotation": output._rotation,
+                                  "scale": output._scale,
+                                  "crtc": crtc}
+        return state
+
+    def validate(self, state=None, max_crtc_pixel_clock=None,
+                 max_total_pixel_clock=None):
+        """Checks the given requested state (see get_requested_state) or the
+           pending changes against the capabilities of the screen, without
+           any request to the server. Returns the list of all violations,
+           which is empty if the configuration can be applied. The pixel
+           clocks are given in Hz"""
+        self._check_version((1,2))
+        if state is None:
+            state = self.get_requested_state()
+        violations = []
+        active = []
+        for (name, config) in state.items():
+            output = self.get_output_by_name(name)
+            if output is None:
+                violations.append("%s: there isn't any output of this "
+                                  "name" % name)
+                continue
+            if not config.get("mode"):
+                continue
+            mode = self.get_mode_by_xid(config["mode"])
+            if mode is None or config["mode"] not in output.query:
+                violations.append("%s: the mode %s is not available" % \
+                                  (name, config["mode"]))
+                continue
+            if not output.is_connected():
+                violations.append("%s: the output is not connected" % name)
+            active.append((output, config, mode))
+
+        # Screen size
+        width = 1
+        height = 1
+        for (output, config, mode) in active:
+            (w, h) = get_output_size(mode,
+                                     config.get("rotation",
+                                                xrandr.RR_ROTATE_0),
+                                     config.get("scale"))
+            if config.get("x", 0) < 0 or config.get("y", 0) < 0:
+                violations.append("%s: the position is outside of the "
+                                  "screen" % output.name)
+            width = max(width, config.get("x", 0) + w)
+            height = max(height, config.get("y", 0) + h)
+        if width > self._width_max or height > self._height_max:
+            violations.append("the required screen size %sx%s exceeds the "
+                              "maximum of %sx%s" % (width, height,
+                                                    self._width_max,
+                                                    self._height_max))
+
+        # Assign the crtcs in the same way as apply_output_config: outputs
+        # keep their crtc, all others get the first one that fits
+        assigned = {}
+        capabilities = self.capabilities
+        def fits(crtc, output, config):
+            if not capabilities.can_drive(crtc, output):
+                return False
+            for (other, other_config) in assigned.get(crtc, []):
+                if not capabilities.can_clone(output, other):
+                    return False
+                for key in ("mode", "x", "y", "rotation"):
+                    if other_config.get(key) != config.get(key):
+                        return False
+            return True
+        pending = []
+        for (output, config, mode) in active:
+            crtc = self.get_crtc_by_xid(config.get("crtc"))
+            if crtc is None:
+                pending.append((output, config, mode))
+            elif not fits(crtc, output, config):
+                violations.append("%s: the crtc %s cannot drive the output "
+                                  "in this configuration" % (output.name,
+                                                             crtc.xid))
+            else:
+                assigned.setdefault(crtc, []).append((output, config))
+        for (output, config, mode) in pending:
+            for crtc in output.get_crtcs():
+                if fits(crtc, output, config):
+                    assigned.setdefault(crtc, []).append((output, config))
+                    break
+            else:
+                violations.append("%s: there is no matching crtc for the "
+                                  "output" % output.name)
+
+        # Rotations and pixel clocks of the used crtcs
+        total_clock = 0
+        for (crtc, outputs) in assigned.items():
+            (output, config) = outputs[0]
+            rotation = config.get("rotation", xrandr.RR_ROTATE_0)
+            if not crtc.supports_rotation(rotation):
+                violations.append("%s: the rotation %s is not supported by "
+                                  "the crtc %s" % (output.name, rotation,
+                                                   crtc.xid))
+            clock = self.modes.dotClock[self.modes.index(config["mode"])]
+            total_clock += clock
+            if max_crtc_pixel_clock is not None and \
+               clock > max_crtc_pixel_clock:
+                violations.append("%s: the pixel clock %s of the mode "
+                                  "exceeds the limit of the crtc" % \
+                                  (output.name, clock))
+        if max_total_pixel_clock is not None and \
+           total_clock > max_total_pixel_clock:
+            violations.append("the total pixel clock %s exceeds the limit "
+                              "of %s" % (total_clock, max_total_pixel_clock))
+        return violations
+
+    def save_state(self):
+        """Returns the current configuration of the crtcs and the size of
+           the screen, which can be restored by restore_state()"""
+        self._check_version((1,2))
+        crtcs = {}
+        for crtc in self.crtcs:
+            info = crtc._info.contents
+            crtcs[crtc.xid] = {"mode": info.mode,
+                               "x": info.x,
+                               "y": info.y,
+                               "rotation": info.rotation,
+                               "outputs": [info.outputs[i] for i in \
+                                           range(info.noutput)]}
+        return {"size": self.get_size(), "crtcs": crtcs}
+
+    @_synchronized
+    def restore_state(self, saved):
+        """Restores a state of save_state(). Only the crtcs which differ
+           from the saved state are reconfigured. The screen is reloaded
+           afterwards, so pending changes get lost"""
+        self._check_version((1,2))
+        current = self.save_state()
+        changed = [xid for (xid, config) in saved["crtcs"].items() \
+                   if xid in current["crtcs"] and \
+                      current["crtcs"][xid] != config]
+        if not changed and current["size"] == saved["size"]:
+            return
+        (width, height, width_mm, height_mm) = saved["size"]
+        # Outputs which move to another crtc have to be released by their
+        # current one first. Crtcs that don't fit into the restored screen
+        # size have to be turned off before the screen can be resized
+        targets = {}
+        for xid in changed:
+            for id in saved["crtcs"][xid]["outputs"]:
+                targets[id] = xid
+        disabled = set()
+        for xid in changed:
+            config = current["crtcs"][xid]
+            if not config["mode"]:
+                continue
+            mode = self.get_mode_by_xid(config["mode"])
+            (w, h) = get_output_size(mode, config["rotation"])
+            moved = [id for id in config["outputs"] \
+                     if targets.get(id, xid) != xid]
+            if moved or config["x"] + w > width or \
+               config["y"] + h > height:
+                self.get_crtc_by_xid(xid).disable()
+                disabled.add(xid)
+        self.set_size(width, height, width_mm, height_mm)
+        for xid in changed:
+            config = saved["crtcs"][xid]
+            crtc = self.get_crtc_by_xid(xid)
+            if not config["mode"]:
+                if xid not in disabled:
+                    crtc.disable()
+                continue
+            outputs = [self.get_output_by_id(id) for id in config["outputs"]]
+            outputs = [output for output in outputs if output is not None]
+            crtc.set_config(config["x"], config["y"], config["mode"],
+                            outputs, config["rotation"])
+        self.reload()
+
+    @_synchronized
+    def apply_output_config(self, revert_after=None, callback=None):
+        """Used for instantly applying RandR 1.2 changes. Raises an
+           InvalidConfigError before changing anything if the configuration
+           is not supported. Returns a TimingReport of the phases, the
+           callback gets each phase as soon as it is done. If revert_after
+           is given the previous state is restored after that many seconds,
+           unless the PendingConfig of the report gets confirmed. Doesn't
+           wait for the server to report the changes, the Confirmation of
+           the report does. The confirm phase is added to the report once
+           the last event has arrived"""
+        self._check_version((1,2))
+        report = TimingReport(callback)
+        started = time.time()
+        violations = self.validate()
+        report._add("validate", started)
+        if violations:
+            raise InvalidConfigError(violations)
+        if revert_after is not None:
+            saved = self.save_state()
+        started = time.time()
         self._arrange_outputs()
+        report._add("arrange", started)
+        started = time.time()
+        size = (self._width, self._height)
         self._calculate_size()
-        self.set_size(self._width, self._height,
-                      self._width_mm, self._height_mm)
+        report._add("calculate-size", started)
 
         # Assign all active outputs to crtcs
         for output in self.outputs.values():
@@ -815,67 +2916,129 @@ class Screen:
                 #FIXME: Take a look at the pick_crtc code in xrandr.c
                 raise RRError("There is no matching crtc for the output")
 
-        # Apply stored changes of crtcs
-        for crtc in self.crtcs:
-            if crtc.has_changed(): 
+        # Only crtcs whose configuration differs from the one of the server
+        # are applied, the server doesn't confirm the others. Changed crtcs
+        # which don't fit into the new screen size have to be turned off
+        # before the screen can be resized
+        changed = [crtc for crtc in self.crtcs \
+                   if crtc.has_changed() and crtc._differs_from_server()]
+        confirmation = Confirmation(self, [crtc.xid for crtc in changed],
+                                    size != (self._width, self._height))
+        report.confirmation = confirmation
+        try:
+            for crtc in changed:
+                info = crtc._info.contents
+                if info.mode and (info.x + info.width > self._width or \
+                                  info.y + info.height > self._height):
+                    started = time.time()
+                    crtc.disable()
+                    report._disabled(crtc.xid, started)
+            started = time.time()
+            self.set_size(self._width, self._height,
+                          self._width_mm, self._height_mm)
+            # The size is set without a reply, so wait for the server
+            xlib.XSync(self._display, False)
+            report._add("set-screen-size", started)
+
+            # Apply stored changes of crtcs
+            for crtc in changed:
+                if not crtc.get_outputs() and crtc.xid in report.crtcs:
+                    continue
+                started = time.time()
                 crtc.apply_changes()
-
+                report._configured(crtc.xid, started)
+        except:
+            confirmation._cancel()
+            raise
+        # All changes have been processed by the server after a round
+        # trip, which is also required before the timer could restore the
+        # saved state on another connection. The server sends the events
+        # of the changes before the reply, so they are usually queued by
+        # then. The confirm phase lasts until all of them have arrived
+        started = time.time()
+        xlib.XSync(self._display, False)
+        confirmation._time(report, started)
+        confirmation.poll()
+        report.total = time.time() - report.start
+        if revert_after is not None:
+            report.pending = PendingConfig(self, saved, revert_after)
+        return report
+
+    @_synchronized
     def apply_config(self):
-        """Used for instantly applying RandR 1.0 changes"""
-        xrandr._check_required_version((1,0))
-        status = rr.XRRSetScreenConfigAndRate(self._display,
-                                              self._config,
-                                              self._root,
-                                              self._size_index,
-                                              self._rotation,
-                                              self._rate,
-                                              self.get_timestamp())
-
-    def _arrange_outputs(self):
-        """Arrange all output positions according to their relative position"""
+        """Used for instantly applying RandR 1.0 changes. Returns a
+           Confirmation, which waits for the server to report the change"""
+        self._check_version((1,0))
+        changed = (self._size_index, self._rotation, self._rate) != \
+                  (self._config_size_index, self._config_rotation,
+                   self._config_rate)
+        # The server chooses the configuration of the crtcs
+        confirmation = Confirmation(self, size_change=changed, reload=True)
+        for attempt in range(CONFIG_RETRIES):
+            status = rr.XRRSetScreenConfigAndRate(self._display,
+                                                  self._config,
+                                                  self._root,
+                                                  self._size_index,
+                                                  self._rotation,
+                                                  self._rate,
+                                                  self.get_timestamp())
+            if status != xrandr.RR_SET_CONFIG_INVALID_CONFIG_TIME:
+                break
+            # Another client changed the configuration, so the timestamps
+            # of the cached one are outdated
+            self._load_config()
+        if status != xrandr.RR_SET_CONFIG_SUCCESS:
+            confirmation._cancel()
+            raise RRError("Failed to apply the configuration", status)
+        # The cached configuration is outdated now
+        self._load_config()
+        self._publish()
+        confirmation.poll()
+        return confirmation
+
+    def _get_arranged_positions(self):
+        """Returns the positions of all active outputs according to their
+           relative position, without changing the outputs"""
+        positions = {}
+        for output in self.get_outputs():
+            if output._mode == None: continue
+            positions[output] = (output._x, output._y)
         for output in self.get_outputs():
             # Skip not changed and not used outputs
             if not output.has_changed(xrandr.CHANGES_RELATION) or \
                output._mode == None: continue
             relative = output._relative_to
-            mode = self.get_mode_by_xid(output._mode)
-            mode_relative = self.get_mode_by_xid(relative._mode)
             if not relative or not relative._mode:
-                output._x = 0
-                output._y = 0
-                output._changes = output._changes | xrandr.CHANGES_POSITION
+                positions[output] = (0, 0)
+                continue
+            (width, height) = output.get_size()
+            (width_relative, height_relative) = relative.get_size()
+            (x, y) = positions[relative]
+            offset = output._relation_offset
             if output._relation == xrandr.RELATION_LEFT_OF:
-                output._y = relative._y + output._relation_offset
-                output._x = relative._x - \
-                            get_mode_width(mode, output._rotation)
+                positions[output] = (x - width, y + offset)
             elif output._relation == xrandr.RELATION_RIGHT_OF:
-                output._y = relative._y + output._relation_offset
-                output._x = relative._x + get_mode_width(mode_relative,
-                                                         output._rotation)
+                positions[output] = (x + width_relative, y + offset)
             elif output._relation == xrandr.RELATION_ABOVE:
-                output._y = relative._y - get_mode_height(mode,
-                                                          output._rotation)
-                output._x = relative._x + output._relation_offset
+                positions[output] = (x + offset, y - height)
             elif output._relation == xrandr.RELATION_BELOW:
-                output._y = relative._y + get_mode_height(mode_relative,
-                                                          output._rotation)
-                output._x = relative._x + output._relation_offset
+                positions[output] = (x + offset, y + height_relative)
             elif output._relation == xrandr.RELATION_SAME_AS:
-                output._y = relative._y + output._relation_offset
-                output._x = relative._x + output._relation_offset
-            output._changes = output._changes | xrandr.CHANGES_POSITION
+                positions[output] = (x + offset, y + offset)
         # Normalize the postions so to the upper left cornor of all outputs 
         # is at 0,0
-        min_x = 32768
-        min_y = 32768
-        for output in self.get_outputs():
-            if output._mode == None: continue
-            if output._x < min_x: min_x = output._x
-            if output._y < min_y: min_y = output._y
-        for output in self.get_outputs():
-            if output._mode == None: continue
-            output._x -= min_x
-            output._y -= min_y
+        if positions:
+            min_x = min([x for (x, y) in positions.values()])
+            min_y = min([y for (x, y) in positions.values()])
+            for (output, (x, y)) in positions.items():
+                positions[output] = (x - min_x, y - min_y)
+        return positions
+
+    def _arrange_outputs(self):
+        """Arrange all output positions according to their relative position"""
+        for (output, (x, y)) in self._get_arranged_positions().items():
+            output._x = x
+            output._y = y
             output._changes = output._changes | xrandr.CHANGES_POSITION
 
     def _calculate_size(self):
@@ -885,11 +3048,10 @@ class Screen:
         height = 1
         for output in self.get_outputs():
             if not output._mode: continue
-            mode = self.get_mode_by_xid(output._mode)
             x = output._x
             y = output._y
-            w = get_mode_width(mode, output._rotation)
-            h = get_mode_height(mode, output._rotation)
+            # Scaled outputs cover a different area than their mode
+            (w, h) = output.get_size()
             if x + w > width: width = x + w
             if y + h > height: height = y + h
         if width > self._width_max or height > self._height_max:
@@ -897,7 +3059,7 @@ class Screen:
                           (width, height), (self._width_max, self._width_min))
         else:
             if height < self._height_min: 
-                self._fb_height = self._height_min
+                self._height = self._height_min
             else:
                 self._height = height
             if width < self._width_min: 
@@ -907,20 +3069,35 @@ class Screen:
         #FIXME: Physical size is missing
 
 def _to_gamma(gamma):
-    g = rr.XRRAllocGamma(len(gamma[0]))
-    for i in range(gamma[0]):
-        g.red[i] = gamma[0][i]
-        g.green[i] = gamma[1][i]
-        g.blue[i] = gamma[2][i]
+    """Returns a new XRRCrtcGamma of the given red, green and blue ramps,
+       which has to be freed by XRRFreeGamma"""
+    size = len(gamma[0])
+    g = rr.XRRAllocGamma(size)
+    for (ramp, values) in zip((g.contents.red, g.contents.green,
+                               g.contents.blue), gamma):
+        if len(values) != size:
+            rr.XRRFreeGamma(g)
+            raise RRError("The gamma ramps differ in size")
+        memmove(ramp, (c_ushort * size)(*values), size * sizeof(c_ushort))
     return g
 
 def _from_gamma(g):
-    gamma = ([], [], [])
-    for i in range(g.size):
-        gamma[0].append(g.red[i])
-        gamma[1].append(g.green[i])
-        gamma[2].append(g.blue[i])
+    """Returns the ramps of the given XRRCrtcGamma and frees it"""
+    info = g.contents
+    gamma = (info.red[:info.size], info.green[:info.size],
+             info.blue[:info.size])
     rr.XRRFreeGamma(g)
+    return gamma
+
+def get_output_size(mode, rotation, scale=None):
+    """Return the width and height that the given mode covers on the screen
+       taking the rotation and the scaling factors into account"""
+    width = get_mode_width(mode, rotation)
+    height = get_mode_height(mode, rotation)
+    if scale:
+        width = int(math.ceil(width * scale[0]))
+        height = int(math.ceil(height * scale[1]))
+    return (width, height)
 
 def get_mode_height(mode, rotation):
     """Return the height of the given mode taking the rotation into account"""
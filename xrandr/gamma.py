@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Python-XRandR provides a high level API for the XRandR extension of the
+# X.org server. XRandR allows to configure resolution, refresh rate, rotation
+# of the screen and multiple outputs of graphics cards.
+#
+# This module changes the color temperature of crtcs gradually, e.g. for
+# a night light. The gamma ramps are kept per gamma size for a bounded
+# number of whitepoint levels, so that each step only copies memory.
+#
+# Copyright 2007 © Sebastian Heinlein <sebastian.heinlein@web.de>
+# Copyright 2007 © Michael Vogt <mvo@ubuntu.com>
+# Copyright 2007 © Canonical Ltd.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+import math
+import threading
+import time
+from ctypes import *
+
+from core import RRError, xlib, rr
+
+# Color temperature of an unchanged display in Kelvin
+NEUTRAL = 6500
+# Upper limit of steps per transition
+MAX_STEPS = 3600
+# Number of ramps per gamma size and color channel, the whitepoint factors
+# are rounded to 1/(LEVELS - 1)
+LEVELS = 256
+
+def get_whitepoint(temperature):
+    """Returns the red, green and blue factors of the given color
+       temperature in Kelvin, following the approximation of the black
+       body radiation by Tanner Helland"""
+    t = temperature / 100.0
+    if t <= 66:
+        red = 1.0
+        green = (99.4708025861 * math.log(t) - 161.1195681661) / 255
+    else:
+        red = 329.698727446 * math.pow(t - 60, -0.1332047592) / 255
+        green = 288.1221695283 * math.pow(t - 60, -0.0755148492) / 255
+    if t >= 66:
+        blue = 1.0
+    elif t <= 19:
+        blue = 0.0
+    else:
+        blue = (138.5177312231 * math.log(t - 10) - 305.0447927307) / 255
+    return tuple([max(0.0, min(1.0, value)) for value in (red, green, blue)])
+
+class GammaTables:
+    """The gamma ramps of a single gamma size for LEVELS whitepoint factors
+       of a color channel. A ramp is computed on first use of its level,
+       so that the memory and the CPU time are bounded by the gamma size
+       instead of the number of steps"""
+    def __init__(self, size, brightness=1.0):
+        """Computes the ramp of the neutral channel"""
+        self.size = size
+        self.nbytes = size * sizeof(c_ushort)
+        self._base = [i * 65535.0 * brightness / max(1, size - 1) \
+                      for i in range(size)]
+        self._ramps = [None] * LEVELS
+
+    def get_ramp(self, factor):
+        """Returns the ramp of the level, which is next to the given
+           whitepoint factor"""
+        level = int(round(max(0.0, min(1.0, factor)) * (LEVELS - 1)))
+        ramp = self._ramps[level]
+        if ramp is None:
+            scale = float(level) / (LEVELS - 1)
+            ramp = (c_ushort * self.size)(*[int(value * scale + 0.5) \
+                                            for value in self._base])
+            self._ramps[level] = ramp
+        return ramp
+
+    def copy(self, whitepoint, gamma):
+        """Copies the ramps of the given whitepoint into the XRRCrtcGamma"""
+        for (factor, ramp) in zip(whitepoint, (gamma.contents.red,
+                                               gamma.contents.green,
+                                               gamma.contents.blue)):
+            memmove(ramp, self.get_ramp(factor), self.nbytes)
+
+class GammaTransition:
+    """Changes the color temperature of the crtcs of a screen from start to
+       end within duration seconds at a fixed rate of steps per second.
+       The transition either runs in its own thread by start() or is
+       driven by calling step() from a main loop timer every interval
+       seconds"""
+    def __init__(self, screen, start, end, duration, rate=10, crtcs=None,
+                 brightness=1.0):
+        """Prepares the gamma ramps of the crtcs. By default all active
+           crtcs of the screen are changed. Long transitions take fewer
+           steps than the rate, at most MAX_STEPS"""
+        # Set first, so that close() works even if the setup fails
+        self._crtcs = []
+        self._thread = None
+        self._stop = threading.Event()
+        if crtcs is None:
+            crtcs = [crtc for crtc in screen.crtcs if crtc.get_outputs()]
+        self.screen = screen
+        self.start_temperature = start
+        self.end_temperature = end
+        self.rate = float(rate)
+        self.steps = max(1, min(MAX_STEPS, int(round(duration * rate))))
+        # The time between two steps, which keeps the duration if the
+        # steps are limited
+        self.interval = duration / float(self.steps)
+        # Crtcs of the same card usually share the gamma size, so the
+        # tables are only kept once
+        tables = {}
+        for crtc in crtcs:
+            size = crtc.get_gamma_size()
+            if not size:
+                continue
+            if size not in tables:
+                tables[size] = GammaTables(size, brightness)
+            self._crtcs.append((crtc.xid, tables[size],
+                                rr.XRRAllocGamma(size)))
+        self.position = 0
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Stops the transition and frees the gamma ramps"""
+        self.stop()
+        for (xid, tables, gamma) in self._crtcs:
+            rr.XRRFreeGamma(gamma)
+        self._crtcs = []
+
+    def is_done(self):
+        """Returns True if the end temperature has been reached"""
+        return self.position >= self.steps
+
+    def step(self):
+        """Applies the next step to all crtcs. Returns False after the last
+           step, so that it can be used as main loop timer callback"""
+        if self.is_done():
+            return False
+        self.screen._require_display()
+        temperature = self.start_temperature + \
+                      (self.end_temperature - self.start_temperature) * \
+                      (self.position + 1) / float(self.steps)
+        whitepoint = get_whitepoint(temperature)
+        screen = self.screen
+        screen.lock.acquire()
+        try:
+            for (xid, tables, gamma) in self._crtcs:
+                tables.copy(whitepoint, gamma)
+                rr.XRRSetCrtcGamma(screen._display, xid, gamma)
+            xlib.XFlush(screen._display)
+        finally:
+            screen.lock.release()
+        self.position += 1
+        return not self.is_done()
+
+    def start(self):
+        """Runs the transition in a background thread"""
+        if self._thread:
+            raise RRError("The transition is already running")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops the background thread at the current step"""
+        if self._thread:
+            self._stop.set()
+            if self._thread is not threading.currentThread():
+                self._thread.join()
+            self._thread = None
+
+    def wait(self, timeout=None):
+        """Waits for the background thread to finish"""
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        begin = time.time()
+        first = self.position
+        while self.step():
+            # The steps follow a fixed schedule, so that slow steps don't
+            # delay the end of the transition
+            delay = begin + (self.position - first) * self.interval - \
+                    time.time()
+            if self._stop.wait(max(0, delay)) or self._stop.isSet():
+                break
+
+# vim:ts=4:sw=4:et
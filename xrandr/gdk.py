@@ -26,13 +26,65 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
 
+from ctypes import *
+
 import pygtk
 pygtk.require("2.0")
+import gobject
 import gtk.gdk
 
 import xrandr
+from xrandr.core import XEvent
+
+class _GSList(Structure):
+    pass
+
+_GSList._fields_ = [
+    ("data", c_void_p),
+    ("next", POINTER(_GSList)),
+    ]
+
+gdk = cdll.LoadLibrary("libgdk-x11-2.0.so.0")
+gdk.gdk_x11_display_get_xdisplay.restype = c_void_p
+gdk.gdk_x11_display_get_xdisplay.argtypes = [c_void_p]
+gdk.gdk_display_manager_get.restype = c_void_p
+gdk.gdk_display_manager_get.argtypes = []
+gdk.gdk_display_manager_list_displays.restype = POINTER(_GSList)
+gdk.gdk_display_manager_list_displays.argtypes = [c_void_p]
+gdk.gdk_display_get_name.restype = c_char_p
+gdk.gdk_display_get_name.argtypes = [c_void_p]
+gdk.g_slist_free.restype = None
+gdk.g_slist_free.argtypes = [POINTER(_GSList)]
+
+GDK_FILTER_CONTINUE = 0
+
+# GdkFilterReturn (*GdkFilterFunc) (GdkXEvent *, GdkEvent *, gpointer)
+GdkFilterFunc = CFUNCTYPE(c_int, c_void_p, c_void_p, c_void_p)
+gdk.gdk_window_add_filter.argtypes = [c_void_p, GdkFilterFunc, c_void_p]
+gdk.gdk_window_remove_filter.argtypes = [c_void_p, GdkFilterFunc, c_void_p]
+
+# Installed event filters by their id
+_watches = {}
 
-#FIXME: Perhaps using gdk_x11_screen_get_xscreen would be more elegant
+def _get_gdk_display(display):
+    """Returns the address of the GdkDisplay of the given gtk.gdk.Display.
+       It is looked up by its name among the open displays of GDK"""
+    name = display.get_name()
+    displays = gdk.gdk_display_manager_list_displays(
+        gdk.gdk_display_manager_get())
+    try:
+        node = displays
+        while node:
+            if gdk.gdk_display_get_name(node.contents.data) == name:
+                return node.contents.data
+            node = node.contents.next
+    finally:
+        gdk.g_slist_free(displays)
+    raise xrandr.RRError("The display is not opened by GDK", name)
+
+def get_xdisplay(display):
+    """Returns the Xlib display connection of the given gtk.gdk.Display"""
+    return gdk.gdk_x11_display_get_xdisplay(_get_gdk_display(display))
 
 def get_default_screen_config():
     dpy = gtk.gdk.display_get_default()
@@ -40,10 +92,62 @@ def get_default_screen_config():
     return get_screen_config(screen)
 
 def get_screen_config(screen):
-    """Returns the XRandR screen config instance for the given gtk.gdk.Screen"""
-    dpy = screen.get_display()
-    dpy_url = dpy.get_name()
-    count = screen.get_number()
-    return xrandr.get_screen_of_display(dpy_url, count)
+    """Returns the XRandR screen config instance for the given
+       gtk.gdk.Screen. It uses the display connection of GDK, which stays
+       open if the screen config gets closed"""
+    xdpy = get_xdisplay(screen.get_display())
+    return xrandr.Screen(xdpy, screen.get_number())
+
+class _Watch:
+    """Passes the RandR events of the GDK connection to a screen config
+       and calls back from the main loop once the events are processed"""
+    def __init__(self, config, callback):
+        self.config = config
+        self.callback = callback
+        self.filter = GdkFilterFunc(self._filter)
+        self._idle = None
+
+    def _filter(self, xevent, event, data):
+        event = cast(xevent, POINTER(XEvent)).contents
+        base = self.config._event_base
+        if event.type == base + xrandr.RR_SCREEN_CHANGE_NOTIFY:
+            self.config.handle_event(event)
+        elif event.type != base + xrandr.RR_NOTIFY:
+            return GDK_FILTER_CONTINUE
+        # A burst of events only results in a single reload
+        if self._idle is None:
+            self._idle = gobject.idle_add(self._dispatch)
+        return GDK_FILTER_CONTINUE
+
+    def _dispatch(self):
+        self._idle = None
+        self.config.reload()
+        self.callback(self.config)
+        return False
+
+    def remove(self):
+        if self._idle is not None:
+            gobject.source_remove(self._idle)
+            self._idle = None
+
+def watch_screen_config(config, callback,
+                        mask=xrandr.RR_SCREEN_CHANGE_NOTIFY_MASK |
+                             xrandr.RR_CRTC_CHANGE_NOTIFY_MASK |
+                             xrandr.RR_OUTPUT_CHANGE_NOTIFY_MASK):
+    """Calls callback(config) from the GLib main loop after the RandR
+       configuration of the screen changed. The screen config has to be
+       created by get_screen_config() and gets reloaded before. Returns an
+       id for unwatch_screen_config()"""
+    config.select_input(mask)
+    watch = _Watch(config, callback)
+    gdk.gdk_window_add_filter(None, watch.filter, None)
+    _watches[id(watch)] = watch
+    return id(watch)
+
+def unwatch_screen_config(watch_id):
+    """Stops the callbacks of the given watch"""
+    watch = _watches.pop(watch_id)
+    gdk.gdk_window_remove_filter(None, watch.filter, None)
+    watch.remove()
 
 # vim:ts=4:sw=4:et
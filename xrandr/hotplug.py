@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Python-XRandR provides a high level API for the XRandR extension of the
+# X.org server. XRandR allows to configure resolution, refresh rate, rotation
+# of the screen and multiple outputs of graphics cards.
+#
+# This module watches the screen for hotplug events. Docking stations and
+# KVM switches send bursts of events, which are merged into a single
+# change set after the configuration has settled.
+#
+# Copyright 2007 © Sebastian Heinlein <sebastian.heinlein@web.de>
+# Copyright 2007 © Michael Vogt <mvo@ubuntu.com>
+# Copyright 2007 © Canonical Ltd.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+import select
+import time
+from ctypes import *
+
+import xrandr
+from core import XEvent, xlib, rr
+
+HOTPLUG_MASK = xrandr.RR_SCREEN_CHANGE_NOTIFY_MASK | \
+               xrandr.RR_CRTC_CHANGE_NOTIFY_MASK | \
+               xrandr.RR_OUTPUT_CHANGE_NOTIFY_MASK
+
+def _get_output_state(screen):
+    """Returns the connection and configuration of all outputs by name"""
+    state = {}
+    for output in screen.get_outputs():
+        crtc = None
+        if output._crtc:
+            crtc = output._crtc.xid
+        state[output.name] = (output.is_connected(), output._mode, crtc,
+                              output._x, output._y, output._rotation)
+    return state
+
+class ChangeSet:
+    """The settled result of a burst of events. Added and removed contain
+       the names of the outputs which have been connected or disconnected,
+       changed the names of the outputs with a new mode, crtc, position or
+       rotation"""
+    def __init__(self, old, new, events):
+        """Compares the output states before and after the burst"""
+        self.events = events
+        self.added = []
+        self.removed = []
+        self.changed = []
+        for name in set(old.keys()) | set(new.keys()):
+            was_connected = name in old and old[name][0]
+            is_connected = name in new and new[name][0]
+            if is_connected and not was_connected:
+                self.added.append(name)
+            elif was_connected and not is_connected:
+                self.removed.append(name)
+            elif name in old and name in new and old[name] != new[name]:
+                self.changed.append(name)
+        self.added.sort()
+        self.removed.sort()
+        self.changed.sort()
+
+    def __nonzero__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return "<ChangeSet added=%s removed=%s changed=%s events=%s>" % \
+               (self.added, self.removed, self.changed, self.events)
+
+class HotplugWatcher:
+    """Collects the RandR events of a screen. A burst ends if no further
+       event arrives within the debounce time or at the latest after
+       max_delay seconds. The screen is reloaded only once per burst.
+       The screen should have its own display connection, since all
+       pending events of the connection are consumed"""
+    def __init__(self, screen, callback=None, debounce=0.3, max_delay=2.0):
+        """Selects the hotplug events of the screen. The callback gets the
+           screen and the ChangeSet of each settled burst"""
+        self.screen = screen
+        self.callback = callback
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._state = _get_output_state(screen)
+        self._events = 0
+        self._first = None
+        self._last = None
+        self._running = False
+        screen.select_input(HOTPLUG_MASK)
+
+    def fileno(self):
+        """Returns the file descriptor of the display connection, e.g. for
+           select() or a main loop integration"""
+        return xlib.XConnectionNumber(self.screen._display)
+
+    def _read_events(self):
+        """Yields the pending events of the display connection"""
+        dpy = self.screen._display
+        event = XEvent()
+        while xlib.XPending(dpy):
+            xlib.XNextEvent(dpy, byref(event))
+            yield event
+
+    def process_events(self):
+        """Reads all pending events without blocking. Returns the number of
+           RandR events of the screen"""
+        base = self.screen._event_base
+        count = 0
+        for event in self._read_events():
+            if event.type == base + xrandr.RR_SCREEN_CHANGE_NOTIFY:
+                self.screen.handle_event(event)
+            elif event.type == base + xrandr.RR_NOTIFY:
+                rr.XRRUpdateConfiguration(byref(event))
+            else:
+                continue
+            count += 1
+        if count:
+            now = time.time()
+            if self._first is None:
+                self._first = now
+            self._last = now
+            self._events += count
+        return count
+
+    def get_timeout(self):
+        """Returns the seconds until the current burst settles, or None if
+           there isn't any burst"""
+        if self._first is None:
+            return None
+        deadline = min(self._last + self.debounce,
+                       self._first + self.max_delay)
+        return max(0, deadline - time.time())
+
+    def check(self):
+        """Finishes a settled burst. Reloads the screen and returns the
+           ChangeSet, or None if the burst hasn't settled yet. The callback
+           is only called for non empty change sets"""
+        timeout = self.get_timeout()
+        if timeout is None or timeout > 0:
+            return None
+        events = self._events
+        self._first = None
+        self._last = None
+        self._events = 0
+        self.screen.reload()
+        state = _get_output_state(self.screen)
+        changes = ChangeSet(self._state, state, events)
+        self._state = state
+        if changes and self.callback:
+            self.callback(self.screen, changes)
+        return changes
+
+    def wait(self, timeout=None):
+        """Blocks until a burst has settled and returns its ChangeSet. If
+           no burst settles within timeout seconds None is returned"""
+        if timeout is not None:
+            end = time.time() + timeout
+        while True:
+            self.process_events()
+            changes = self.check()
+            if changes is not None:
+                return changes
+            wait = self.get_timeout()
+            if timeout is not None:
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return None
+                if wait is None or remaining < wait:
+                    wait = remaining
+            select.select([self.fileno()], [], [], wait)
+
+    def run(self):
+        """Calls the callback for each settled burst until interrupted or
+           stopped"""
+        self._running = True
+        while self._running:
+            # Check the flag at least every max_delay seconds
+            self.wait(self.max_delay)
+
+    def stop(self):
+        """Lets run() return, at the latest after max_delay seconds. Can be
+           called from the callback or from another thread"""
+        self._running = False
+
+# vim:ts=4:sw=4:et
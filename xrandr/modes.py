@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Python-XRandR provides a high level API for the XRandR extension of the
+# X.org server. XRandR allows to configure resolution, refresh rate, rotation
+# of the screen and multiple outputs of graphics cards.
+#
+# This module provides a columnar table of mode lines, that allows to
+# filter and sort large numbers of modes quickly.
+#
+# Copyright 2007 © Sebastian Heinlein <sebastian.heinlein@web.de>
+# Copyright 2007 © Michael Vogt <mvo@ubuntu.com>
+# Copyright 2007 © Canonical Ltd.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+from array import array
+
+import xrandr
+
+# Name and array type code of the numeric columns. The names follow the
+# fields of the XRRModeInfo structure
+COLUMNS = (("id", "L"),
+           ("width", "i"),
+           ("height", "i"),
+           ("dotClock", "l"),
+           ("hSyncStart", "i"),
+           ("hSyncEnd", "i"),
+           ("hTotal", "i"),
+           ("hSkew", "i"),
+           ("vSyncStart", "i"),
+           ("vSyncEnd", "i"),
+           ("vTotal", "i"),
+           ("modeFlags", "l"),
+           ("rate", "d"))
+
+def get_mode_rate(mode):
+    """Returns the vertical refresh rate of the given mode in Hz. Interlaced
+       and double scan modes are taken into account"""
+    v_total = float(mode.vTotal)
+    if mode.modeFlags & xrandr.RR_DOUBLE_SCAN:
+        v_total *= 2
+    if mode.modeFlags & xrandr.RR_INTERLACE:
+        v_total /= 2
+    if not mode.hTotal or not v_total:
+        return 0.0
+    return mode.dotClock / (mode.hTotal * v_total)
+
+class ModeTable:
+    """Stores mode lines column by column in typed arrays. The refresh rate
+       is calculated only once when a mode is added. Each column is
+       available as an attribute of the same name, e.g. table.width"""
+    def __init__(self, modes=()):
+        """Initializes the table with the given modes"""
+        for (column, code) in COLUMNS:
+            setattr(self, column, array(code))
+        self.name = []
+        self._rows = {}
+        for mode in modes:
+            self.append(mode)
+
+    def __len__(self):
+        return len(self.id)
+
+    def __contains__(self, xid):
+        return xid in self._rows
+
+    def append(self, mode):
+        """Adds a mode. Accepts any object with the attributes of
+           XRRModeInfo"""
+        self._rows[mode.id] = len(self.id)
+        for (column, code) in COLUMNS[:-1]:
+            getattr(self, column).append(getattr(mode, column))
+        self.rate.append(get_mode_rate(mode))
+        self.name.append(mode.name)
+
+    def index(self, xid):
+        """Returns the row of the mode with the given xid or None"""
+        return self._rows.get(xid)
+
+    def get_rate(self, xid):
+        """Returns the refresh rate of the mode with the given xid or
+           None"""
+        row = self._rows.get(xid)
+        if row is None:
+            return None
+        return self.rate[row]
+
+    def get_row(self, row):
+        """Returns a dictionary with the values of the given row"""
+        values = dict([(column, getattr(self, column)[row]) \
+                       for (column, code) in COLUMNS])
+        values["name"] = self.name[row]
+        return values
+
+    def select(self, min_width=None, max_width=None, min_height=None,
+               max_height=None, min_rate=None, max_rate=None,
+               min_dot_clock=None, max_dot_clock=None, ids=None,
+               exclude_flags=0):
+        """Returns the rows of all modes that match the given constraints.
+           Each constraint narrows down the remaining rows in a single
+           pass over its column"""
+        rows = range(len(self.id))
+        if ids is not None:
+            rows = [self._rows[xid] for xid in ids if xid in self._rows]
+            rows.sort()
+        for (column, low, high) in ((self.width, min_width, max_width),
+                                    (self.height, min_height, max_height),
+                                    (self.rate, min_rate, max_rate),
+                                    (self.dotClock, min_dot_clock,
+                                     max_dot_clock)):
+            if low is not None:
+                rows = [r for r in rows if column[r] >= low]
+            if high is not None:
+                rows = [r for r in rows if column[r] <= high]
+        if exclude_flags:
+            flags = self.modeFlags
+            rows = [r for r in rows if not flags[r] & exclude_flags]
+        return list(rows)
+
+    def sort(self, rows, column="dotClock", reverse=False):
+        """Returns the given rows sorted by the values of the column"""
+        values = getattr(self, column)
+        return sorted(rows, key=values.__getitem__, reverse=reverse)
+
+    def take(self, rows):
+        """Returns a new table which only contains the given rows"""
+        table = ModeTable()
+        for (column, code) in COLUMNS:
+            values = getattr(self, column)
+            getattr(table, column).extend([values[r] for r in rows])
+        table.name = [self.name[r] for r in rows]
+        table._rows = dict([(xid, i) for (i, xid) in enumerate(table.id)])
+        return table
+
+    def filter(self, order_by=None, reverse=False, **constraints):
+        """Returns a new table of the modes matching the constraints of
+           select(), optionally sorted by the given column. E.g.
+           table.filter(min_width=1920, min_rate=59.9, order_by="dotClock")
+        """
+        rows = self.select(**constraints)
+        if order_by:
+            rows = self.sort(rows, order_by, reverse)
+        return self.take(rows)
+
+    def to_numpy(self):
+        """Returns the table as a NumPy structured array. Requires NumPy"""
+        import numpy
+        dtype = [(column, code == "d" and "f8" or "i8") \
+                 for (column, code) in COLUMNS]
+        table = numpy.zeros(len(self.id), dtype=dtype)
+        for (column, code) in COLUMNS:
+            table[column] = getattr(self, column)
+        return table
+
+def get_aspect(width, height):
+    """Returns the aspect ratio of the given size as reduced fraction, e.g.
+       (16, 9) for 1920 x 1080"""
+    a, b = width, height
+    while b:
+        a, b = b, a % b
+    divisor = a or 1
+    return (width // divisor, height // divisor)
+
+class ModeQuery:
+    """Answers questions about the modes of a single output. The modes are
+       indexed by resolution, refresh rate and aspect ratio once, so that
+       queries don't have to scan the modes again. Modes are referred to by
+       their position in the list of available modes of the output"""
+    def __init__(self, table, mode_ids):
+        """Builds the indexes for the given mode xids of the output"""
+        self._table = table
+        # Rows of the modes in the table, in the order of the output
+        self.rows = [row for row in map(table.index, mode_ids) \
+                     if row is not None]
+        self._xids = set([table.id[row] for row in self.rows])
+        self._by_resolution = {}
+        self._by_rate = {}
+        self._by_aspect = {}
+        for (pos, row) in enumerate(self.rows):
+            width = table.width[row]
+            height = table.height[row]
+            self._by_resolution.setdefault((width, height), []).append(pos)
+            self._by_rate.setdefault(round(table.rate[row], 2),
+                                     []).append(pos)
+            self._by_aspect.setdefault(get_aspect(width, height),
+                                       []).append(pos)
+        self._resolutions = sorted(self._by_resolution.keys())
+        self._rates = {}
+        for (resolution, positions) in self._by_resolution.items():
+            rates = set([table.rate[self.rows[p]] for p in positions])
+            self._rates[resolution] = sorted(rates)
+        # Candidates for best_mode(): largest area first, then the highest
+        # rate and the lowest pixel clock
+        key = self._rank_key
+        self._ranked = sorted(range(len(self.rows)), key=key)
+        self._ranked_by_aspect = {}
+        for (aspect, positions) in self._by_aspect.items():
+            self._ranked_by_aspect[aspect] = sorted(positions, key=key)
+
+    def _rank_key(self, pos):
+        row = self.rows[pos]
+        table = self._table
+        return (-table.width[row] * table.height[row], -table.rate[row],
+                table.dotClock[row])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, xid):
+        return xid in self._xids
+
+    def get_xid(self, pos):
+        """Returns the xid of the mode at the given position"""
+        return self._table.id[self.rows[pos]]
+
+    def resolutions(self, reverse=False):
+        """Returns the sorted list of available resolution pairs"""
+        if reverse:
+            return self._resolutions[::-1]
+        return list(self._resolutions)
+
+    def rates(self, width, height, reverse=False):
+        """Returns the sorted refresh rates of the given resolution"""
+        rates = self._rates.get((width, height), [])
+        if reverse:
+            return rates[::-1]
+        return list(rates)
+
+    def aspects(self):
+        """Returns the available aspect ratios as reduced fractions"""
+        return sorted(self._by_aspect.keys())
+
+    def find(self, width, height, rate=None, tolerance=0.01):
+        """Returns the positions of the modes with the given resolution and
+           optionally the given refresh rate"""
+        positions = self._by_resolution.get((width, height), [])
+        if rate is None:
+            return list(positions)
+        table = self._table
+        return [p for p in positions \
+                if abs(table.rate[self.rows[p]] - rate) <= tolerance]
+
+    def with_rate(self, rate):
+        """Returns the positions of the modes with the given refresh rate
+           rounded to two decimals"""
+        return list(self._by_rate.get(round(rate, 2), []))
+
+    def best_mode(self, min_rate=None, max_pixel_clock=None, aspect=None,
+                  max_width=None, max_height=None, tolerance=0.01):
+        """Returns the position of the largest mode that matches the
+           constraints or None. The aspect ratio can be given as a pair,
+           e.g. (16, 9), or as a float"""
+        if aspect is None:
+            candidates = self._ranked
+        else:
+            if isinstance(aspect, tuple):
+                aspect = float(aspect[0]) / aspect[1]
+            candidates = []
+            for (key, positions) in self._ranked_by_aspect.items():
+                if abs(float(key[0]) / key[1] - aspect) <= \
+                   aspect * tolerance:
+                    candidates.extend(positions)
+            candidates.sort(key=self._rank_key)
+        table = self._table
+        for pos in candidates:
+            row = self.rows[pos]
+            if min_rate is not None and table.rate[row] < min_rate:
+                continue
+            if max_pixel_clock is not None and \
+               table.dotClock[row] > max_pixel_clock:
+                continue
+            if max_width is not None and table.width[row] > max_width:
+                continue
+            if max_height is not None and table.height[row] > max_height:
+                continue
+            return pos
+        return None
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,740 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Python-XRandR provides a high level API for the XRandR extension of the
+# X.org server. XRandR allows to configure resolution, refresh rate, rotation
+# of the screen and multiple outputs of graphics cards.
+#
+# This module provides a pure Python client for the X11 and RandR wire
+# protocol. It talks to the display socket directly and does not need
+# libX11 or libXrandr. Requests are queued and sent together, so that
+# many queries only cost a single round trip.
+#
+# Copyright 2007 © Sebastian Heinlein <sebastian.heinlein@web.de>
+# Copyright 2007 © Michael Vogt <mvo@ubuntu.com>
+# Copyright 2007 © Canonical Ltd.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+import errno
+import os
+import socket
+import struct
+
+# Only the standard library is used here on purpose: the module must stay
+# usable on systems without the X libraries. The package itself only loads
+# them on first use, see core._Library
+
+X_PROTOCOL_MAJOR = 11
+X_PROTOCOL_MINOR = 0
+
+# Core requests
+X_INTERN_ATOM = 16
+X_GET_ATOM_NAME = 17
+X_GET_INPUT_FOCUS = 43
+X_QUERY_EXTENSION = 98
+
+# RandR minor opcodes
+RR_QUERY_VERSION = 0
+RR_SELECT_INPUT = 4
+RR_GET_SCREEN_INFO = 5
+RR_GET_SCREEN_SIZE_RANGE = 6
+RR_SET_SCREEN_SIZE = 7
+RR_GET_SCREEN_RESOURCES = 8
+RR_GET_OUTPUT_INFO = 9
+RR_GET_CRTC_INFO = 20
+RR_SET_CRTC_CONFIG = 21
+RR_GET_SCREEN_RESOURCES_CURRENT = 25
+RR_GET_OUTPUT_PRIMARY = 31
+
+# Event masks of RRSelectInput
+RR_SCREEN_CHANGE_NOTIFY_MASK = 1
+RR_CRTC_CHANGE_NOTIFY_MASK = 2
+RR_OUTPUT_CHANGE_NOTIFY_MASK = 4
+RR_OUTPUT_PROPERTY_NOTIFY_MASK = 8
+
+# Xauthority address families
+FAMILY_INTERNET = 0
+FAMILY_INTERNET6 = 6
+FAMILY_LOCAL = 256
+FAMILY_WILD = 65535
+
+_BUFFER_SIZE = 65536
+
+
+class ProtocolError(Exception):
+    """Raised if the connection to the X server fails or the server sends
+       something that cannot be understood"""
+    pass
+
+class XError(ProtocolError):
+    """Raised if the server answered a request with an error"""
+    def __init__(self, code, sequence, resource, minor, major):
+        ProtocolError.__init__(self, "X error %s for request %s.%s "
+                               "(resource 0x%x)" % (code, major, minor,
+                                                    resource))
+        self.code = code
+        self.sequence = sequence
+        self.resource = resource
+        self.minor = minor
+        self.major = major
+
+
+class Reply(object):
+    """A decoded reply. The attributes follow the names used by the
+       Xlib structures of core.py, so that both can be used alike"""
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __repr__(self):
+        return "<Reply %s>" % ", ".join(["%s=%r" % item for item in
+                                          sorted(self.__dict__.items())])
+
+
+class Cookie(object):
+    """Refers to a sent request whose reply has not been read yet"""
+    def __init__(self, connection, sequence, parser):
+        self._connection = connection
+        self.sequence = sequence
+        self._parser = parser
+        self._done = False
+        self._value = None
+        self._error = None
+
+    def reply(self):
+        """Returns the decoded reply and blocks until it is available"""
+        self._connection._wait_for(self)
+        if self._error:
+            raise self._error
+        return self._value
+
+    def is_ready(self):
+        """Returns True if the reply has already been received"""
+        return self._done
+
+
+def _pad(length):
+    return (4 - length % 4) % 4
+
+def _pack_string(data):
+    return data + b"\0" * _pad(len(data))
+
+def _to_bytes(text):
+    if isinstance(text, bytes):
+        return text
+    return text.encode("latin-1")
+
+def parse_display(display=None):
+    """Splits the display name into host, display number and screen number.
+       The DISPLAY environment variable is used if no name is given"""
+    if display is None:
+        display = os.getenv("DISPLAY")
+    if not display:
+        raise ProtocolError("No display given")
+    host, sep, rest = display.rpartition(":")
+    if not sep:
+        raise ProtocolError("Invalid display name %s" % display)
+    if host.startswith("unix/"):
+        host = host[5:]
+    number, sep, screen = rest.partition(".")
+    try:
+        number = int(number)
+        screen = int(screen or 0)
+    except ValueError:
+        raise ProtocolError("Invalid display name %s" % display)
+    return host, number, screen
+
+def read_xauthority(path=None):
+    """Returns the entries of the given Xauthority file as tuples of
+       family, address, display number, auth name and auth data"""
+    if path is None:
+        path = os.getenv("XAUTHORITY") or \
+               os.path.join(os.path.expanduser("~"), ".Xauthority")
+    try:
+        data = open(path, "rb").read()
+    except IOError:
+        return []
+    entries = []
+    offset = 0
+    while offset + 2 <= len(data):
+        family, = struct.unpack_from(">H", data, offset)
+        offset += 2
+        fields = []
+        for i in range(4):
+            if offset + 2 > len(data):
+                return entries
+            length, = struct.unpack_from(">H", data, offset)
+            offset += 2
+            fields.append(data[offset:offset + length])
+            offset += length
+        entries.append((family,) + tuple(fields))
+    return entries
+
+def get_auth(family, address, number, path=None):
+    """Returns the auth name and data for the given display or an empty
+       pair if no cookie matches"""
+    number = _to_bytes(str(number))
+    for (e_family, e_address, e_number, name, data) in read_xauthority(path):
+        if e_number and e_number != number:
+            continue
+        if e_family == FAMILY_WILD or \
+           (e_family == family and e_address == address):
+            return name, data
+    return b"", b""
+
+
+class Connection(object):
+    """A connection to the X server, that only implements the few core
+       requests which are needed by RandR clients"""
+    def __init__(self, display=None, xauthority=None):
+        """Connects to the given display and performs the setup
+           handshake"""
+        host, number, screen = parse_display(display)
+        self._socket, family, address = self._connect(host, number)
+        self.display_number = number
+        self.default_screen = screen
+        # Outgoing requests are queued until a reply is needed or the queue
+        # gets flushed, so that independent requests share one round trip
+        self._outgoing = []
+        self._sequence = 0
+        self._last_read = 0
+        self._cookies = {}
+        self.events = []
+        self.errors = []
+        # All incoming data is read into a single buffer that gets reused
+        # for the whole lifetime of the connection
+        self._buffer = bytearray(_BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self._extensions = {}
+        self._atoms = {}
+        auth_name, auth_data = get_auth(family, address, number, xauthority)
+        self._setup(auth_name, auth_data)
+        if not 0 <= screen < len(self.screens):
+            raise ProtocolError("The chosen screen is not available", screen)
+
+    def _connect(self, host, number):
+        """Opens the socket and returns it with the Xauthority family and
+           address to look up the cookie"""
+        if host in ("", "unix"):
+            path = "/tmp/.X11-unix/X%s" % number
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(path)
+            except socket.error:
+                # Linux servers often only listen on the abstract socket
+                try:
+                    sock.connect("\0" + path)
+                except socket.error as error:
+                    sock.close()
+                    raise ProtocolError("Cannot connect to %s: %s" % \
+                                        (path, error))
+            return sock, FAMILY_LOCAL, _to_bytes(socket.gethostname())
+        try:
+            sock = socket.create_connection((host, 6000 + number))
+        except socket.error as error:
+            raise ProtocolError("Cannot connect to %s:%s: %s" % \
+                                (host, number, error))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        peer = sock.getpeername()[0]
+        if host in ("localhost",) or peer.startswith("127."):
+            return sock, FAMILY_LOCAL, _to_bytes(socket.gethostname())
+        if sock.family == socket.AF_INET6:
+            return sock, FAMILY_INTERNET6, \
+                   socket.inet_pton(socket.AF_INET6, peer)
+        return sock, FAMILY_INTERNET, socket.inet_aton(peer)
+
+    def _setup(self, auth_name, auth_data):
+        """Sends the connection setup and parses the server information"""
+        self._socket.sendall(struct.pack("<BxHHHHxx", ord("l"),
+                                         X_PROTOCOL_MAJOR, X_PROTOCOL_MINOR,
+                                         len(auth_name), len(auth_data)) +
+                             _pack_string(auth_name) +
+                             _pack_string(auth_data))
+        self._fill(8)
+        status, reason_len, major, minor, length = \
+                struct.unpack_from("<BBHHH", self._view, self._start)
+        self._fill(8 + length * 4)
+        view = self._view
+        offset = self._start + 8
+        if status != 1:
+            reason = view[offset:offset + (reason_len or length * 4)]
+            raise ProtocolError("Connection refused by the server: %s" % \
+                                reason.tobytes().rstrip(b"\0"))
+        (self.release, self.resource_id_base, self.resource_id_mask, motion,
+         vendor_len, self.maximum_request_length, nscreens, nformats) = \
+                struct.unpack_from("<IIIIHHBB", view, offset)
+        offset += 32
+        self.vendor = view[offset:offset + vendor_len].tobytes()
+        offset += vendor_len + _pad(vendor_len) + 8 * nformats
+        self.screens = []
+        for i in range(nscreens):
+            (root, colormap, white, black, masks, width, height,
+             width_mm, height_mm, min_maps, max_maps, visual,
+             backing, save_unders, depth, ndepths) = \
+                    struct.unpack_from("<IIIIIHHHHHHIBBBB", view, offset)
+            self.screens.append(Reply(root=root, width=width, height=height,
+                                      width_mm=width_mm,
+                                      height_mm=height_mm,
+                                      root_depth=depth))
+            offset += 40
+            for d in range(ndepths):
+                nvisuals, = struct.unpack_from("<H", view, offset + 2)
+                offset += 8 + 24 * nvisuals
+        self._consume(8 + length * 4)
+
+    def close(self):
+        """Closes the connection"""
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+    def fileno(self):
+        """Returns the file descriptor of the connection, e.g. to wait for
+           events by select or a main loop"""
+        return self._socket.fileno()
+
+    def get_root(self, screen=None):
+        """Returns the root window of the given or default screen"""
+        if screen is None:
+            screen = self.default_screen
+        return self.screens[screen].root
+
+    # Sending
+
+    def request(self, opcode, data1, body, parser=None):
+        """Queues a request. If a parser is given the request has got a
+           reply and a cookie is returned to fetch it"""
+        length = 4 + len(body)
+        self._outgoing.append(struct.pack("<BBH", opcode, data1,
+                                          (length + _pad(length)) // 4))
+        self._outgoing.append(body + b"\0" * _pad(length))
+        self._sequence += 1
+        if parser is None:
+            return None
+        cookie = Cookie(self, self._sequence, parser)
+        self._cookies[self._sequence] = cookie
+        return cookie
+
+    def flush(self):
+        """Sends all queued requests in one go"""
+        if self._outgoing:
+            data = b"".join(self._outgoing)
+            self._outgoing = []
+            self._socket.sendall(data)
+
+    def sync(self):
+        """Waits until the server has processed all sent requests"""
+        self.request(X_GET_INPUT_FOCUS, 0, b"", lambda view, offset: None)\
+                .reply()
+
+    # Receiving
+
+    def _fill(self, size, block=True):
+        """Makes sure that there are at least size unparsed bytes in the
+           buffer. Returns False if no data was available in non blocking
+           mode"""
+        while self._end - self._start < size:
+            if self._start + size > len(self._buffer):
+                self._compact(size)
+            try:
+                if block:
+                    count = self._socket.recv_into(self._view[self._end:])
+                else:
+                    count = self._socket.recv_into(self._view[self._end:],
+                                                   0, socket.MSG_DONTWAIT)
+            except socket.error as error:
+                if error.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return False
+                raise ProtocolError("Connection lost: %s" % error)
+            if count == 0:
+                raise ProtocolError("Connection closed by the server")
+            self._end += count
+        return True
+
+    def _compact(self, size):
+        """Moves the unparsed data to the front of the buffer and grows the
+           buffer if the size does not fit at all"""
+        pending = self._end - self._start
+        if size > len(self._buffer):
+            buffer = bytearray(max(size, 2 * len(self._buffer)))
+            buffer[:pending] = self._buffer[self._start:self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        else:
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+    def _consume(self, size):
+        """Marks the given amount of bytes as parsed"""
+        self._start += size
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def _read_packet(self, block=True):
+        """Reads and dispatches a single reply, error or event. Returns
+           False if nothing could be read in non blocking mode"""
+        if not self._fill(32, block):
+            return False
+        view = self._view
+        start = self._start
+        kind, data1, sequence = struct.unpack_from("<BBH", view, start)
+        # Expand the 16 bit sequence number of the server
+        full = (self._last_read & ~0xffff) | sequence
+        if full < self._last_read:
+            full += 0x10000
+        if kind == 1:
+            length, = struct.unpack_from("<I", view, start + 4)
+            size = 32 + length * 4
+            # A reply has to be complete, since it cannot be parsed partly
+            self._fill(size)
+            view = self._view
+            start = self._start
+            self._last_read = full
+            cookie = self._cookies.pop(full, None)
+            if cookie:
+                try:
+                    cookie._value = cookie._parser(view, start)
+                except struct.error as error:
+                    cookie._error = ProtocolError("Malformed reply: %s" % \
+                                                  error)
+                cookie._done = True
+            self._consume(size)
+        elif kind == 0:
+            self._last_read = full
+            code, resource, minor, major = \
+                    struct.unpack_from("<xBxxIHB", view, start)
+            error = XError(code, full, resource, minor, major)
+            cookie = self._cookies.pop(full, None)
+            if cookie:
+                cookie._error = error
+                cookie._done = True
+            else:
+                self.errors.append(error)
+            self._consume(32)
+        else:
+            self.events.append(self._parse_event(kind & 0x7f, view, start))
+            self._consume(32)
+        return True
+
+    def _wait_for(self, cookie):
+        """Reads from the server until the reply of the cookie arrived"""
+        if cookie._done:
+            return
+        self.flush()
+        while not cookie._done:
+            self._read_packet()
+
+    def poll(self):
+        """Reads everything the server has sent without blocking and
+           returns the received events"""
+        self.flush()
+        while self._read_packet(block=False):
+            pass
+        events = self.events
+        self.events = []
+        return events
+
+    def wait_for_event(self):
+        """Blocks until an event arrives and returns it"""
+        self.flush()
+        while not self.events:
+            self._read_packet()
+        return self.events.pop(0)
+
+    def _parse_event(self, code, view, offset):
+        """Returns a generic event with a copy of the raw data. Extensions
+           can register themselves to decode their events"""
+        for ext in self._extensions.values():
+            if ext is not None and ext.first_event is not None and \
+               hasattr(ext, "parse_event"):
+                event = ext.parse_event(code, view, offset)
+                if event is not None:
+                    return event
+        return Reply(code=code, data=view[offset:offset + 32].tobytes())
+
+    # Core requests
+
+    def query_extension(self, name):
+        """Returns a cookie for the major opcode, first event and first
+           error of the given extension"""
+        name = _to_bytes(name)
+        def parse(view, offset):
+            present, major, event, error = \
+                    struct.unpack_from("<BBBB", view, offset + 8)
+            if not present:
+                return None
+            return Reply(major_opcode=major, first_event=event,
+                         first_error=error)
+        return self.request(X_QUERY_EXTENSION, 0,
+                            struct.pack("<Hxx", len(name)) + name, parse)
+
+    def intern_atom(self, name, only_if_exists=False):
+        """Returns a cookie for the atom of the given name"""
+        name = _to_bytes(name)
+        def parse(view, offset):
+            atom, = struct.unpack_from("<I", view, offset + 8)
+            self._atoms[atom] = name
+            return atom
+        return self.request(X_INTERN_ATOM, int(only_if_exists),
+                            struct.pack("<Hxx", len(name)) + name, parse)
+
+    def get_atom_name(self, atom):
+        """Returns a cookie for the name of the given atom"""
+        def parse(view, offset):
+            length, = struct.unpack_from("<H", view, offset + 8)
+            name = view[offset + 32:offset + 32 + length].tobytes()
+            self._atoms[atom] = name
+            return name
+        return self.request(X_GET_ATOM_NAME, 0, struct.pack("<I", atom),
+                            parse)
+
+
+def _parse_mode_infos(view, offset, nmodes, names_offset):
+    modes = []
+    for i in range(nmodes):
+        (id, width, height, dot_clock, h_sync_start, h_sync_end, h_total,
+         h_skew, v_sync_start, v_sync_end, v_total, name_len, flags) = \
+                struct.unpack_from("<IHHIHHHHHHHHI", view, offset + i * 32)
+        name = view[names_offset:names_offset + name_len].tobytes()
+        names_offset += name_len
+        modes.append(Reply(id=id, width=width, height=height,
+                           dotClock=dot_clock, hSyncStart=h_sync_start,
+                           hSyncEnd=h_sync_end, hTotal=h_total,
+                           hSkew=h_skew, vSyncStart=v_sync_start,
+                           vSyncEnd=v_sync_end, vTotal=v_total,
+                           name=name, nameLength=name_len,
+                           modeFlags=flags))
+    return modes
+
+def _parse_ids(view, offset, count):
+    return list(struct.unpack_from("<%sI" % count, view, offset))
+
+
+class RandR(object):
+    """The RandR extension on top of a wire protocol connection. All
+       request methods return cookies, so that requests can be pipelined:
+       send all of them first and fetch the replies afterwards"""
+    def __init__(self, connection):
+        """Looks up the extension on the server"""
+        self.connection = connection
+        ext = connection.query_extension("RANDR").reply()
+        if ext is None:
+            raise ProtocolError("The RandR extension is not available")
+        self.major_opcode = ext.major_opcode
+        self.first_event = ext.first_event
+        self.first_error = ext.first_error
+        connection._extensions["RANDR"] = self
+        self.version = self.query_version().reply()
+
+    def _request(self, minor, body, parser=None):
+        return self.connection.request(self.major_opcode, minor, body, parser)
+
+    def parse_event(self, code, view, offset):
+        """Decodes RandR events or returns None for foreign ones"""
+        if code == self.first_event:
+            (rotation, timestamp, config_timestamp, root, window, size_id,
+             subpixel, width, height, width_mm, height_mm) = \
+                    struct.unpack_from("<xBxxIIIIHHHHHH", view, offset)
+            return Reply(type="screen-change", rotation=rotation,
+                         timestamp=timestamp,
+                         config_timestamp=config_timestamp, root=root,
+                         window=window, size_index=size_id, width=width,
+                         height=height, width_mm=width_mm,
+                         height_mm=height_mm)
+        if code == self.first_event + 1:
+            subcode, = struct.unpack_from("<B", view, offset + 1)
+            if subcode == 0:
+                (timestamp, window, crtc, mode, rotation, x, y, width,
+                 height) = struct.unpack_from("<IIIIHxxhhHH", view,
+                                              offset + 4)
+                return Reply(type="crtc-change", timestamp=timestamp,
+                             window=window, crtc=crtc, mode=mode,
+                             rotation=rotation, x=x, y=y, width=width,
+                             height=height)
+            if subcode == 1:
+                (timestamp, config_timestamp, window, output, crtc, mode,
+                 rotation, connection, subpixel) = \
+                        struct.unpack_from("<IIIIIIHBB", view, offset + 4)
+                return Reply(type="output-change", timestamp=timestamp,
+                             config_timestamp=config_timestamp,
+                             window=window, output=output, crtc=crtc,
+                             mode=mode, rotation=rotation,
+                             connection=connection)
+            if subcode == 2:
+                window, output, atom, timestamp, state = \
+                        struct.unpack_from("<IIIIB", view, offset + 4)
+                return Reply(type="output-property", window=window,
+                             output=output, atom=atom, timestamp=timestamp,
+                             state=state)
+        return None
+
+    def query_version(self, major=1, minor=5):
+        """Returns a cookie for the (major, minor) version supported by
+           the server"""
+        def parse(view, offset):
+            return struct.unpack_from("<II", view, offset + 8)
+        return self._request(RR_QUERY_VERSION, struct.pack("<II", major,
+                                                           minor), parse)
+
+    def select_input(self, window, mask):
+        """Selects the RandR events of the given mask on the window"""
+        self._request(RR_SELECT_INPUT, struct.pack("<IHxx", window, mask))
+
+    def get_screen_info(self, window):
+        """Returns a cookie for the RandR 1.0 sizes, rates and rotations"""
+        def parse(view, offset):
+            rotations, = struct.unpack_from("<B", view, offset + 1)
+            (root, timestamp, config_timestamp, nsizes, size_index,
+             rotation, rate, ninfo) = struct.unpack_from("<IIIHHHHH", view,
+                                                         offset + 8)
+            sizes = []
+            pos = offset + 32
+            for i in range(nsizes):
+                width, height, mwidth, mheight = \
+                        struct.unpack_from("<HHHH", view, pos)
+                sizes.append(Reply(width=width, height=height,
+                                   mwidth=mwidth, mheight=mheight))
+                pos += 8
+            rates = []
+            end = pos + 2 * ninfo
+            while pos < end and len(rates) < nsizes:
+                nrates, = struct.unpack_from("<H", view, pos)
+                rates.append(list(struct.unpack_from("<%sH" % nrates, view,
+                                                     pos + 2)))
+                pos += 2 + 2 * nrates
+            return Reply(root=root, timestamp=timestamp,
+                         config_timestamp=config_timestamp,
+                         rotations=rotations, rotation=rotation,
+                         size_index=size_index, rate=rate, sizes=sizes,
+                         rates=rates)
+        return self._request(RR_GET_SCREEN_INFO, struct.pack("<I", window),
+                             parse)
+
+    def get_screen_size_range(self, window):
+        """Returns a cookie for the minimum and maximum screen size"""
+        def parse(view, offset):
+            min_w, min_h, max_w, max_h = struct.unpack_from("<HHHH", view,
+                                                            offset + 8)
+            return Reply(min_width=min_w, min_height=min_h,
+                         max_width=max_w, max_height=max_h)
+        return self._request(RR_GET_SCREEN_SIZE_RANGE,
+                             struct.pack("<I", window), parse)
+
+    def set_screen_size(self, window, width, height, width_mm, height_mm):
+        """Changes the size of the screen"""
+        self._request(RR_SET_SCREEN_SIZE,
+                      struct.pack("<IHHII", window, width, height,
+                                  width_mm, height_mm))
+
+    def get_screen_resources(self, window, current=False):
+        """Returns a cookie for the crtcs, outputs and modes of the screen.
+           If current is True the server does not poll the hardware"""
+        def parse(view, offset):
+            (timestamp, config_timestamp, ncrtc, noutput, nmode,
+             names_len) = struct.unpack_from("<IIHHHH", view, offset + 8)
+            pos = offset + 32
+            crtcs = _parse_ids(view, pos, ncrtc)
+            pos += 4 * ncrtc
+            outputs = _parse_ids(view, pos, noutput)
+            pos += 4 * noutput
+            modes = _parse_mode_infos(view, pos, nmode, pos + 32 * nmode)
+            return Reply(timestamp=timestamp,
+                         configTimestamp=config_timestamp, crtcs=crtcs,
+                         outputs=outputs, modes=modes)
+        if current:
+            minor = RR_GET_SCREEN_RESOURCES_CURRENT
+        else:
+            minor = RR_GET_SCREEN_RESOURCES
+        return self._request(minor, struct.pack("<I", window), parse)
+
+    def get_output_info(self, output, config_timestamp=0):
+        """Returns a cookie for the information about the output"""
+        def parse(view, offset):
+            status, = struct.unpack_from("<B", view, offset + 1)
+            (timestamp, crtc, mm_width, mm_height, connection, subpixel,
+             ncrtc, nmode, npreferred, nclone, name_len) = \
+                    struct.unpack_from("<IIIIBBHHHHH", view, offset + 8)
+            pos = offset + 36
+            crtcs = _parse_ids(view, pos, ncrtc)
+            pos += 4 * ncrtc
+            modes = _parse_ids(view, pos, nmode)
+            pos += 4 * nmode
+            clones = _parse_ids(view, pos, nclone)
+            pos += 4 * nclone
+            name = view[pos:pos + name_len].tobytes()
+            return Reply(status=status, timestamp=timestamp, crtc=crtc,
+                         name=name, nameLen=name_len, mm_width=mm_width,
+                         mm_height=mm_height, connection=connection,
+                         subpixel_order=subpixel, crtcs=crtcs,
+                         clones=clones, npreferred=npreferred, modes=modes)
+        return self._request(RR_GET_OUTPUT_INFO,
+                             struct.pack("<II", output, config_timestamp),
+                             parse)
+
+    def get_crtc_info(self, crtc, config_timestamp=0):
+        """Returns a cookie for the information about the crtc"""
+        def parse(view, offset):
+            status, = struct.unpack_from("<B", view, offset + 1)
+            (timestamp, x, y, width, height, mode, rotation, rotations,
+             noutput, npossible) = struct.unpack_from("<IhhHHIHHHH", view,
+                                                      offset + 8)
+            pos = offset + 32
+            outputs = _parse_ids(view, pos, noutput)
+            possible = _parse_ids(view, pos + 4 * noutput, npossible)
+            return Reply(status=status, timestamp=timestamp, x=x, y=y,
+                         width=width, height=height, mode=mode,
+                         rotation=rotation, rotations=rotations,
+                         outputs=outputs, possible=possible)
+        return self._request(RR_GET_CRTC_INFO,
+                             struct.pack("<II", crtc, config_timestamp),
+                             parse)
+
+    def set_crtc_config(self, crtc, timestamp, config_timestamp, x, y, mode,
+                        rotation, outputs):
+        """Returns a cookie for the status of the crtc configuration"""
+        def parse(view, offset):
+            return struct.unpack_from("<B", view, offset + 1)[0]
+        return self._request(RR_SET_CRTC_CONFIG,
+                             struct.pack("<IIIhhIHxx", crtc, timestamp,
+                                         config_timestamp, x, y, mode or 0,
+                                         rotation) +
+                             struct.pack("<%sI" % len(outputs), *outputs),
+                             parse)
+
+    def get_output_primary(self, window):
+        """Returns a cookie for the xid of the primary output"""
+        def parse(view, offset):
+            return struct.unpack_from("<I", view, offset + 8)[0]
+        return self._request(RR_GET_OUTPUT_PRIMARY,
+                             struct.pack("<I", window), parse)
+
+    def get_screen_state(self, window, current=True):
+        """Returns the resources with the information of all crtcs and
+           outputs. Costs two round trips independent of the number of
+           crtcs and outputs"""
+        resources = self.get_screen_resources(window, current).reply()
+        ts = resources.configTimestamp
+        crtcs = [self.get_crtc_info(c, ts) for c in resources.crtcs]
+        outputs = [self.get_output_info(o, ts) for o in resources.outputs]
+        resources.crtc_infos = dict(zip(resources.crtcs,
+                                        [c.reply() for c in crtcs]))
+        resources.output_infos = dict(zip(resources.outputs,
+                                          [o.reply() for o in outputs]))
+        return resources
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,610 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Python-XRandR provides a high level API for the XRandR extension of the
+# X.org server. XRandR allows to configure resolution, refresh rate, rotation
+# of the screen and multiple outputs of graphics cards.
+#
+# This module exports the complete state of a screen including the pending
+# changes, either as dictionary that can be stored as JSON or in a compact
+# binary format. Both can be loaded into a detached and read-only screen.
+#
+# Copyright 2007 © Sebastian Heinlein <sebastian.heinlein@web.de>
+# Copyright 2007 © Michael Vogt <mvo@ubuntu.com>
+# Copyright 2007 © Canonical Ltd.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+import struct
+from ctypes import *
+
+import xrandr
+from core import Screen, Output, Crtc, Capabilities, RRError, \
+                 UnsupportedRRError, RRCrtc, RROutput, RRMode, \
+                 _XRRModeInfo, _XRRScreenSize, _XRRCrtcInfo, \
+                 _XRROutputInfo, _XRRScreenResources, get_mode_width, \
+                 get_mode_height
+from modes import COLUMNS, ModeTable
+import proto
+
+FORMAT_VERSION = 1
+MAGIC = "XRRS"
+
+# Fields of the mode lines without the calculated rate
+MODE_FIELDS = [column for (column, code) in COLUMNS if column != "rate"]
+
+def to_dict(screen):
+    """Returns the state of the given RandR 1.2 screen as dictionary of
+       lists, numbers and strings, which can be stored as JSON. Modes,
+       crtcs and outputs are referred to by their xid"""
+    screen._check_version((1,2))
+    resources = screen._resources.contents
+    primary = 0
+    if screen._version >= (1,3):
+        output = screen.get_primary_output()
+        if output:
+            primary = output.id
+    data = {"version": FORMAT_VERSION,
+            "screen": screen._screen,
+            "size": [screen._width, screen._height,
+                     screen._width_mm, screen._height_mm],
+            "size_range": [screen._width_min, screen._height_min,
+                           screen._width_max, screen._height_max],
+            "timestamp": resources.timestamp,
+            "config_timestamp": resources.configTimestamp,
+            "primary": primary,
+            "config": {"sizes": [[size.width, size.height, size.mwidth,
+                                  size.mheight] for size in screen._sizes],
+                       "rates": [list(rates) for rates in \
+                                 screen._size_rates],
+                       "rotations": screen._config_rotations,
+                       "rotation": screen._config_rotation,
+                       "size_index": screen._config_size_index,
+                       "rate": screen._config_rate},
+            "modes": [],
+            "crtcs": [],
+            "outputs": []}
+    for i in range(resources.nmode):
+        mode = resources.modes[i]
+        values = dict([(field, getattr(mode, field)) \
+                       for field in MODE_FIELDS])
+        values["name"] = mode.name
+        data["modes"].append(values)
+    for crtc in screen.crtcs:
+        info = crtc._info.contents
+        data["crtcs"].append({"xid": crtc.xid,
+                              "timestamp": info.timestamp,
+                              "x": info.x,
+                              "y": info.y,
+                              "width": info.width,
+                              "height": info.height,
+                              "mode": info.mode,
+                              "rotation": info.rotation,
+                              "rotations": info.rotations,
+                              "outputs": info.outputs[:info.noutput],
+                              "possible": info.possible[:info.npossible]})
+    for i in range(resources.noutput):
+        output = screen.get_output_by_id(resources.outputs[i])
+        info = output._info.contents
+        crtc = None
+        if output._crtc:
+            crtc = output._crtc.xid
+        relative = None
+        if output._relative_to:
+            relative = output._relative_to.name
+        data["outputs"].append({"id": output.id,
+                                "timestamp": info.timestamp,
+                                "crtc": info.crtc,
+                                "name": info.name,
+                                "mm_width": info.mm_width,
+                                "mm_height": info.mm_height,
+                                "connection": info.connection,
+                                "subpixel_order": info.subpixel_order,
+                                "crtcs": info.crtcs[:info.ncrtc],
+                                "clones": info.clones[:info.nclone],
+                                "modes": info.modes[:info.nmode],
+                                "npreferred": info.npreferred,
+                                "pending": {"mode": output._mode or 0,
+                                            "crtc": crtc or 0,
+                                            "x": output._x,
+                                            "y": output._y,
+                                            "rotation": output._rotation,
+                                            "scale": output._scale and \
+                                                     list(output._scale),
+                                            "relation": output._relation,
+                                            "relative_to": relative,
+                                            "relation_offset": \
+                                                    output._relation_offset,
+                                            "changes": output._changes}})
+    return data
+
+def wire_to_dict(display=None):
+    """Returns the current state of the default screen of the given or
+       current display like to_dict(), but reads it by the pure Python
+       client of proto.py instead of libXrandr. There aren't any pending
+       changes, so the outputs keep their current configuration. The
+       version of the extension is stored as rr_version in addition"""
+    try:
+        connection = proto.Connection(display)
+    except (proto.ProtocolError, EnvironmentError), error:
+        raise RRError("Cannot open the display", display, error)
+    try:
+        try:
+            randr = proto.RandR(connection)
+            if randr.version < (1,2):
+                raise UnsupportedRRError((1,2), randr.version)
+            setup = connection.screens[connection.default_screen]
+            root = setup.root
+            size_range = randr.get_screen_size_range(root)
+            info = randr.get_screen_info(root)
+            primary = None
+            if randr.version >= (1,3):
+                primary = randr.get_output_primary(root)
+            state = randr.get_screen_state(root, randr.version >= (1,3))
+            size_range = size_range.reply()
+            info = info.reply()
+            primary = primary and primary.reply() or 0
+        except proto.ProtocolError, error:
+            raise RRError("The state of the screen cannot be read", error)
+    finally:
+        connection.close()
+    data = {"version": FORMAT_VERSION,
+            "rr_version": list(randr.version),
+            "screen": connection.default_screen,
+            "size": [setup.width, setup.height,
+                     setup.width_mm, setup.height_mm],
+            "size_range": [size_range.min_width, size_range.min_height,
+                           size_range.max_width, size_range.max_height],
+            "timestamp": state.timestamp,
+            "config_timestamp": state.configTimestamp,
+            "primary": primary,
+            "config": {"sizes": [[size.width, size.height, size.mwidth,
+                                  size.mheight] for size in info.sizes],
+                       "rates": info.rates,
+                       "rotations": info.rotations,
+                       "rotation": info.rotation,
+                       "size_index": info.size_index,
+                       "rate": info.rate},
+            "modes": [],
+            "crtcs": [],
+            "outputs": []}
+    for mode in state.modes:
+        values = dict([(field, getattr(mode, field)) \
+                       for field in MODE_FIELDS])
+        values["name"] = mode.name
+        data["modes"].append(values)
+    modes = dict([(mode.id, mode) for mode in state.modes])
+    for xid in state.crtcs:
+        crtc = state.crtc_infos[xid]
+        data["crtcs"].append({"xid": xid,
+                              "timestamp": crtc.timestamp,
+                              "x": crtc.x,
+                              "y": crtc.y,
+                              "width": crtc.width,
+                              "height": crtc.height,
+                              "mode": crtc.mode,
+                              "rotation": crtc.rotation,
+                              "rotations": crtc.rotations,
+                              "outputs": crtc.outputs,
+                              "possible": crtc.possible})
+    for id in state.outputs:
+        output = state.output_infos[id]
+        pending = {"mode": 0, "crtc": 0, "x": 0, "y": 0,
+                   "rotation": xrandr.RR_ROTATE_0, "scale": None,
+                   "relation": None, "relative_to": None,
+                   "relation_offset": 0, "changes": xrandr.CHANGES_NONE}
+        crtc = state.crtc_infos.get(output.crtc)
+        if crtc and crtc.mode:
+            pending.update({"mode": crtc.mode, "crtc": output.crtc,
+                            "x": crtc.x, "y": crtc.y,
+                            "rotation": crtc.rotation})
+            # Like Screen._load_crtcs a differing crtc size is a scale
+            mode = modes[crtc.mode]
+            width = get_mode_width(mode, crtc.rotation)
+            height = get_mode_height(mode, crtc.rotation)
+            if width and height and \
+               (width, height) != (crtc.width, crtc.height):
+                pending["scale"] = [float(crtc.width) / width,
+                                    float(crtc.height) / height]
+        data["outputs"].append({"id": id,
+                                "timestamp": output.timestamp,
+                                "crtc": output.crtc,
+                                "name": output.name,
+                                "mm_width": output.mm_width,
+                                "mm_height": output.mm_height,
+                                "connection": output.connection,
+                                "subpixel_order": output.subpixel_order,
+                                "crtcs": output.crtcs,
+                                "clones": output.clones,
+                                "modes": output.modes,
+                                "npreferred": output.npreferred,
+                                "pending": pending})
+    return data
+
+def from_wire(display=None):
+    """Returns a detached screen of the current state of the given or
+       current display, which is read without the X libraries, see
+       wire_to_dict()"""
+    return DetachedScreen(wire_to_dict(display))
+
+def from_dict(data):
+    """Returns a detached screen of the given dictionary of to_dict()"""
+    if data.get("version") != FORMAT_VERSION:
+        raise RRError("Unsupported format version", data.get("version"))
+    return DetachedScreen(data)
+
+def _array(type, values):
+    """Returns a ctypes array of the given values"""
+    return (type * len(values))(*values)
+
+class DetachedScreen(Screen):
+    """A read-only screen without a connection to the X server. All queries
+       and validate() work on the loaded state, while all methods which
+       would talk to the server raise a RRError"""
+    def __init__(self, data):
+        """Rebuilds the Xlib structures of the screen from the given
+           dictionary of to_dict()"""
+        self._set_defaults()
+        # Only the state read by wire_to_dict() knows the version, dumps
+        # are treated like RandR 1.3 ones, whose state they hold completely
+        self._version = tuple(data.get("rr_version", (1,3)))
+        self._screen = data["screen"]
+        self._root = 0
+        self._id = None
+        self._event_base = 0
+        self._primary = data["primary"]
+        (self._width, self._height,
+         self._width_mm, self._height_mm) = data["size"]
+        (self._width_min, self._height_min,
+         self._width_max, self._height_max) = data["size_range"]
+        config = data["config"]
+        self._sizes = [_XRRScreenSize(*size) for size in config["sizes"]]
+        self._size_rates = [tuple(rates) for rates in config["rates"]]
+        self._config_rotations = config["rotations"]
+        self._config_rotation = config["rotation"]
+        self._config_size_index = config["size_index"]
+        self._config_rate = config["rate"]
+        self._rate = self._config_rate
+        self._rotation = self._config_rotation
+        self._size_index = self._config_size_index
+
+        # The structures of Xlib are rebuilt in memory, so that outputs and
+        # crtcs work in the same way as for a connected screen. ctypes keeps
+        # the assigned arrays and strings alive
+        modes = []
+        for values in data["modes"]:
+            mode = _XRRModeInfo()
+            for field in MODE_FIELDS:
+                setattr(mode, field, values[field])
+            mode.name = values["name"]
+            mode.nameLength = len(values["name"])
+            modes.append(mode)
+        resources = _XRRScreenResources()
+        resources.timestamp = data["timestamp"]
+        resources.configTimestamp = data["config_timestamp"]
+        resources.ncrtc = len(data["crtcs"])
+        resources.crtcs = _array(RRCrtc, [c["xid"] for c in data["crtcs"]])
+        resources.noutput = len(data["outputs"])
+        resources.outputs = _array(RROutput,
+                                   [o["id"] for o in data["outputs"]])
+        resources.nmode = len(modes)
+        resources.modes = _array(_XRRModeInfo, modes)
+        self._resources = pointer(resources)
+        self.modes = ModeTable(modes)
+
+        for values in data["crtcs"]:
+            info = _XRRCrtcInfo()
+            for field in ("timestamp", "x", "y", "width", "height", "mode",
+                          "rotation", "rotations"):
+                setattr(info, field, values[field])
+            info.noutput = len(values["outputs"])
+            info.outputs = _array(RROutput, values["outputs"])
+            info.npossible = len(values["possible"])
+            info.possible = _array(RROutput, values["possible"])
+            crtc = Crtc(pointer(info), values["xid"], self)
+            self.crtcs.append(crtc)
+            self._crtcs_by_xid[crtc.xid] = crtc
+
+        for values in data["outputs"]:
+            info = _XRROutputInfo()
+            for field in ("timestamp", "crtc", "name", "mm_width",
+                          "mm_height", "connection", "subpixel_order",
+                          "npreferred"):
+                setattr(info, field, values[field])
+            info.nameLen = len(values["name"])
+            info.ncrtc = len(values["crtcs"])
+            info.crtcs = _array(RRCrtc, values["crtcs"])
+            info.nclone = len(values["clones"])
+            info.clones = _array(RROutput, values["clones"])
+            info.nmode = len(values["modes"])
+            info.modes = _array(RRMode, values["modes"])
+            output = Output(pointer(info), values["id"], self)
+            self.outputs[output.name] = output
+            self._outputs_by_id[output.id] = output
+
+        # Restore the pending changes
+        for values in data["outputs"]:
+            output = self.outputs[values["name"]]
+            pending = values["pending"]
+            output._mode = pending["mode"] or None
+            output._x = pending["x"]
+            output._y = pending["y"]
+            output._rotation = pending["rotation"]
+            if pending["scale"]:
+                output._scale = tuple(pending["scale"])
+            output._relation = pending["relation"]
+            output._relative_to = self.outputs.get(pending["relative_to"])
+            output._relation_offset = pending["relation_offset"]
+            output._changes = pending["changes"]
+            crtc = self.get_crtc_by_xid(pending["crtc"])
+            if crtc:
+                crtc.add_output(output)
+        self.capabilities = Capabilities(self)
+        self._publish()
+
+    def _detached(self, *args, **kwargs):
+        raise RRError("The screen is not connected to a X server")
+
+    reload = apply_output_config = apply_config = _detached
+    set_size = create_mode = destroy_mode = _detached
+    set_monitor = delete_monitor = restore_state = _detached
+    select_input = handle_event = get_timestamp = _detached
+
+    def close(self):
+        """Drops the loaded state. There aren't any Xlib allocations"""
+        self.outputs = {}
+        self.crtcs = []
+        self.capabilities = None
+        self._outputs_by_id = {}
+        self._crtcs_by_xid = {}
+        self._resources = None
+
+    def get_size(self):
+        """Returns the stored pixel and physical size of the screen"""
+        return self._width, self._height, self._width_mm, self._height_mm
+
+    def get_primary_output(self):
+        """Returns the stored primary output or None"""
+        return self.get_output_by_id(self._primary)
+
+    def get_monitors(self, active=True):
+        """Returns the monitors derived from the active crtcs"""
+        return self._get_crtc_monitors(self.get_primary_output())
+
+# Binary format. All numbers are little endian, the modes are stored once
+# and referred to by their index, like the crtcs and outputs. Mode names
+# are interned, since most of them occur several times
+NONE = 0xffff
+HEADER = struct.Struct("<4sBHiiiiiiiiLLL")
+CONFIG = struct.Struct("<HHHhH")
+SIZE = struct.Struct("<iiiiB")
+MODE = struct.Struct("<LiiLHiiiiiiiL")
+CRTC = struct.Struct("<LLiiiiHHH")
+OUTPUT = struct.Struct("<LLHLLBB")
+PENDING = struct.Struct("<HHiiHBddbHiH")
+COUNT = struct.Struct("<H")
+
+def _pack_list(values):
+    return COUNT.pack(len(values)) + struct.pack("<%sH" % len(values),
+                                                 *values)
+
+def _pack_string(value):
+    return COUNT.pack(len(value)) + value
+
+def dumps(screen):
+    """Returns the state of the given screen in the binary format"""
+    return dict_to_bytes(to_dict(screen))
+
+def loads(data):
+    """Returns a detached screen of the given binary data of dumps()"""
+    return from_dict(bytes_to_dict(data))
+
+def dict_to_bytes(data):
+    """Encodes a dictionary of to_dict() in the binary format"""
+    modes = dict([(mode["id"], i) for (i, mode) in \
+                  enumerate(data["modes"])])
+    crtcs = dict([(crtc["xid"], i) for (i, crtc) in \
+                  enumerate(data["crtcs"])])
+    outputs = dict([(output["id"], i) for (i, output) in \
+                    enumerate(data["outputs"])])
+    names = []
+    name_index = {}
+    for mode in data["modes"]:
+        if mode["name"] not in name_index:
+            name_index[mode["name"]] = len(names)
+            names.append(mode["name"])
+    config = data["config"]
+    chunks = [HEADER.pack(*([MAGIC, FORMAT_VERSION, data["screen"]] +
+                            data["size"] + data["size_range"] +
+                            [data["timestamp"], data["config_timestamp"],
+                             data["primary"]])),
+              CONFIG.pack(config["rotations"], config["rotation"],
+                          config["size_index"], config["rate"],
+                          len(config["sizes"]))]
+    for (size, rates) in zip(config["sizes"], config["rates"]):
+        chunks.append(SIZE.pack(*(size + [len(rates)])))
+        chunks.append(struct.pack("<%sH" % len(rates), *rates))
+    chunks.append(COUNT.pack(len(names)))
+    chunks.extend([_pack_string(name) for name in names])
+    chunks.append(COUNT.pack(len(data["modes"])))
+    for mode in data["modes"]:
+        chunks.append(MODE.pack(mode["id"], mode["width"], mode["height"],
+                                mode["dotClock"], name_index[mode["name"]],
+                                mode["hSyncStart"], mode["hSyncEnd"],
+                                mode["hTotal"], mode["hSkew"],
+                                mode["vSyncStart"], mode["vSyncEnd"],
+                                mode["vTotal"], mode["modeFlags"]))
+    chunks.append(COUNT.pack(len(data["crtcs"])))
+    for crtc in data["crtcs"]:
+        chunks.append(CRTC.pack(crtc["xid"], crtc["timestamp"], crtc["x"],
+                                crtc["y"], crtc["width"], crtc["height"],
+                                modes.get(crtc["mode"], NONE),
+                                crtc["rotation"], crtc["rotations"]))
+        chunks.append(_pack_list([outputs[o] for o in crtc["outputs"]]))
+        chunks.append(_pack_list([outputs[o] for o in crtc["possible"]]))
+    chunks.append(COUNT.pack(len(data["outputs"])))
+    for output in data["outputs"]:
+        chunks.append(OUTPUT.pack(output["id"], output["timestamp"],
+                                  crtcs.get(output["crtc"], NONE),
+                                  output["mm_width"], output["mm_height"],
+                                  output["connection"],
+                                  output["subpixel_order"]))
+        chunks.append(_pack_string(output["name"]))
+        chunks.append(_pack_list([crtcs[c] for c in output["crtcs"]]))
+        chunks.append(_pack_list([outputs[o] for o in output["clones"]]))
+        chunks.append(_pack_list([modes[m] for m in output["modes"]]))
+        pending = output["pending"]
+        scale = pending["scale"] or (0.0, 0.0)
+        relation = pending["relation"]
+        if relation is None:
+            relation = -1
+        relative = NONE
+        for (i, other) in enumerate(data["outputs"]):
+            if other["name"] == pending["relative_to"]:
+                relative = i
+        chunks.append(PENDING.pack(modes.get(pending["mode"], NONE),
+                                   crtcs.get(pending["crtc"], NONE),
+                                   pending["x"], pending["y"],
+                                   pending["rotation"],
+                                   pending["scale"] is not None,
+                                   scale[0], scale[1], relation, relative,
+                                   pending["relation_offset"],
+                                   pending["changes"]))
+        chunks.append(COUNT.pack(output["npreferred"]))
+    return "".join(chunks)
+
+class _Reader:
+    """Reads the structures of the binary format one after the other"""
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, format):
+        try:
+            values = format.unpack_from(self.data, self.offset)
+        except struct.error:
+            raise RRError("The data is truncated")
+        self.offset += format.size
+        return values
+
+    def count(self):
+        return self.unpack(COUNT)[0]
+
+    def list(self):
+        count = self.count()
+        return list(self.unpack(struct.Struct("<%sH" % count)))
+
+    def string(self):
+        length = self.count()
+        value = self.data[self.offset:self.offset + length]
+        if len(value) != length:
+            raise RRError("The data is truncated")
+        self.offset += length
+        return value
+
+def bytes_to_dict(data):
+    """Decodes the binary format into a dictionary of to_dict()"""
+    reader = _Reader(data)
+    header = reader.unpack(HEADER)
+    if header[0] != MAGIC:
+        raise RRError("The data is not a screen state")
+    if header[1] != FORMAT_VERSION:
+        raise RRError("Unsupported format version", header[1])
+    (rotations, rotation, size_index, rate, nsizes) = reader.unpack(CONFIG)
+    sizes = []
+    rates = []
+    for i in range(nsizes):
+        values = reader.unpack(SIZE)
+        sizes.append(list(values[:4]))
+        rates.append(list(reader.unpack(struct.Struct("<%sH" % values[4]))))
+    names = [reader.string() for i in range(reader.count())]
+    modes = []
+    for i in range(reader.count()):
+        values = reader.unpack(MODE)
+        modes.append({"id": values[0], "width": values[1],
+                      "height": values[2], "dotClock": values[3],
+                      "name": names[values[4]], "hSyncStart": values[5],
+                      "hSyncEnd": values[6], "hTotal": values[7],
+                      "hSkew": values[8], "vSyncStart": values[9],
+                      "vSyncEnd": values[10], "vTotal": values[11],
+                      "modeFlags": values[12]})
+    mode_ids = [mode["id"] for mode in modes]
+    crtcs = []
+    for i in range(reader.count()):
+        values = reader.unpack(CRTC)
+        crtcs.append({"xid": values[0], "timestamp": values[1],
+                      "x": values[2], "y": values[3], "width": values[4],
+                      "height": values[5], "mode": values[6],
+                      "rotation": values[7], "rotations": values[8],
+                      "outputs": reader.list(), "possible": reader.list()})
+    outputs = []
+    for i in range(reader.count()):
+        values = reader.unpack(OUTPUT)
+        output = {"id": values[0], "timestamp": values[1],
+                  "crtc": values[2], "mm_width": values[3],
+                  "mm_height": values[4], "connection": values[5],
+                  "subpixel_order": values[6], "name": reader.string(),
+                  "crtcs": reader.list(), "clones": reader.list(),
+                  "modes": [mode_ids[m] for m in reader.list()]}
+        pending = reader.unpack(PENDING)
+        output["pending"] = {"mode": pending[0], "crtc": pending[1],
+                             "x": pending[2], "y": pending[3],
+                             "rotation": pending[4],
+                             "scale": pending[5] and \
+                                      [pending[6], pending[7]] or None,
+                             "relation": pending[8], "relative_to": pending[9],
+                             "relation_offset": pending[10],
+                             "changes": pending[11]}
+        output["npreferred"] = reader.count()
+        outputs.append(output)
+    # Resolve the indexes to xids and names
+    def xid(items, key, index):
+        if index == NONE:
+            return 0
+        return items[index][key]
+    crtc_ids = [crtc["xid"] for crtc in crtcs]
+    output_ids = [output["id"] for output in outputs]
+    for crtc in crtcs:
+        crtc["mode"] = xid(modes, "id", crtc["mode"])
+        crtc["outputs"] = [output_ids[o] for o in crtc["outputs"]]
+        crtc["possible"] = [output_ids[o] for o in crtc["possible"]]
+    for output in outputs:
+        output["crtc"] = xid(crtcs, "xid", output["crtc"])
+        output["crtcs"] = [crtc_ids[c] for c in output["crtcs"]]
+        output["clones"] = [output_ids[o] for o in output["clones"]]
+        pending = output["pending"]
+        pending["mode"] = xid(modes, "id", pending["mode"])
+        pending["crtc"] = xid(crtcs, "xid", pending["crtc"])
+        if pending["relation"] == -1:
+            pending["relation"] = None
+        if pending["relative_to"] == NONE:
+            pending["relative_to"] = None
+        else:
+            pending["relative_to"] = outputs[pending["relative_to"]]["name"]
+    return {"version": header[1],
+            "screen": header[2],
+            "size": list(header[3:7]),
+            "size_range": list(header[7:11]),
+            "timestamp": header[11],
+            "config_timestamp": header[12],
+            "primary": header[13],
+            "config": {"sizes": sizes, "rates": rates,
+                       "rotations": rotations, "rotation": rotation,
+                       "size_index": size_index, "rate": rate},
+            "modes": modes,
+            "crtcs": crtcs,
+            "outputs": outputs}
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Python-XRandR provides a high level API for the XRandR extension of the
+# X.org server. XRandR allows to configure resolution, refresh rate, rotation
+# of the screen and multiple outputs of graphics cards.
+#
+# This module publishes the state of a screen in a memory mapped file of a
+# fixed layout, so that many local processes can read the outputs, modes
+# and geometry without a display connection or a Screen of their own.
+# A single publisher updates the file, readers detect torn reads by the
+# sequence counter in the header: it is odd while the publisher writes
+# and increased again afterwards.
+#
+# Copyright 2007 © Sebastian Heinlein <sebastian.heinlein@web.de>
+# Copyright 2007 © Michael Vogt <mvo@ubuntu.com>
+# Copyright 2007 © Canonical Ltd.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from core import RRError, Snapshot, xlib
+
+LAYOUT_VERSION = 1
+MAGIC = "XRSM"
+
+# Capacity of the fixed layout
+MAX_OUTPUTS = 64
+MAX_MODES = 512
+MAX_OUTPUT_MODES = 4096
+
+# Magic, layout version, screen number and sequence counter
+HEADER = struct.Struct("<4sHHL")
+SEQUENCE = struct.Struct("<L")
+SEQUENCE_OFFSET = 8
+# Config timestamp, primary output, size in pixels and millimeters,
+# rotation and the number of outputs, modes and output modes
+STATE = struct.Struct("<LLiiiiHHHH")
+# Name, id, crtc, connection, primary, rotation, geometry, physical size,
+# mode, rate, first output mode, number of modes and preferred modes
+OUTPUT = struct.Struct("<32sLLBBHiiiiLLLdHHH")
+# Id, width, height, rate and name
+MODE = struct.Struct("<LHHd32s")
+OUTPUT_MODE = struct.Struct("<L")
+
+OUTPUTS_OFFSET = HEADER.size + STATE.size
+MODES_OFFSET = OUTPUTS_OFFSET + OUTPUT.size * MAX_OUTPUTS
+OUTPUT_MODES_OFFSET = MODES_OFFSET + MODE.size * MAX_MODES
+SIZE = OUTPUT_MODES_OFFSET + OUTPUT_MODE.size * MAX_OUTPUT_MODES
+
+# How long a reader retries while the publisher is writing
+READ_TIMEOUT = 0.1
+
+def get_default_path(display=None, screen=0):
+    """Returns the path of the state file of the given or current display
+       and screen in the runtime directory of the user"""
+    if display is None:
+        display = os.getenv("DISPLAY") or ":0"
+    # Strip the screen of the display name and make it a valid file name
+    host, sep, number = display.rpartition(":")
+    number = number.split(".")[0]
+    name = "xrandr-%s%s.%s" % (host.replace("/", "_"), number, screen)
+    directory = os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, name)
+
+class SharedStatePublisher:
+    """Writes the state of a screen into the state file. Only one
+       publisher per file is allowed. Call publish() after the screen has
+       been reloaded or use get_watcher() to publish on RandR events"""
+    def __init__(self, screen, path=None):
+        """Creates the state file and publishes the current state"""
+        screen._check_version((1,2))
+        self.screen = screen
+        if path is None:
+            path = get_default_path(xlib.XDisplayString(screen._display),
+                                    screen._screen)
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0644)
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            os.close(self._fd)
+            raise RRError("The state is already published by another "
+                          "process", path)
+        os.ftruncate(self._fd, SIZE)
+        self._map = mmap.mmap(self._fd, SIZE, mmap.MAP_SHARED,
+                              mmap.PROT_READ | mmap.PROT_WRITE)
+        (magic, version, number, sequence) = HEADER.unpack(
+            self._map[:HEADER.size])
+        # Keep counting on, so that readers of an old state notice the
+        # change. Odd values are left behind by a crashed publisher
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            sequence = 0
+        self._sequence = sequence + sequence % 2
+        self._map[:HEADER.size] = HEADER.pack(MAGIC, LAYOUT_VERSION,
+                                              screen._screen, self._sequence)
+        self.publish()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Unmaps and unlocks the state file. The file is kept, so that
+           readers still get the last state"""
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+            os.close(self._fd)
+
+    def _pack(self):
+        """Returns the state of the screen in the fixed layout without the
+           header"""
+        screen = self.screen
+        primary = 0
+        if screen._version >= (1,3):
+            output = screen.get_primary_output()
+            if output:
+                primary = output.id
+        with screen.lock:
+            outputs = sorted(screen.get_outputs(),
+                             key=lambda output: output.name)
+            modes = screen.modes
+            if len(outputs) > MAX_OUTPUTS or len(modes) > MAX_MODES:
+                raise RRError("The screen has got too many outputs or "
+                              "modes for the state file")
+            chunks = []
+            output_modes = []
+            for output in outputs:
+                info = output._info.contents
+                available = info.modes[:info.nmode]
+                crtc = 0
+                if output._crtc and output._mode:
+                    crtc = output._crtc.xid
+                (width, height) = output.get_size()
+                # Names are cut to fit into the fixed layout
+                chunks.append(OUTPUT.pack(output.name[:31], output.id, crtc,
+                                          output.is_connected(),
+                                          output.id == primary,
+                                          output._rotation, output._x,
+                                          output._y, width, height,
+                                          info.mm_width, info.mm_height,
+                                          output._mode or 0,
+                                          output.get_current_rate() or 0,
+                                          len(output_modes), len(available),
+                                          info.npreferred))
+                output_modes.extend(available)
+            if len(output_modes) > MAX_OUTPUT_MODES:
+                raise RRError("The outputs have got too many modes for the "
+                              "state file")
+            chunks.append("\0" * (OUTPUT.size * (MAX_OUTPUTS - len(outputs))))
+            for row in range(len(modes)):
+                chunks.append(MODE.pack(modes.id[row], modes.width[row],
+                                        modes.height[row], modes.rate[row],
+                                        modes.name[row][:31]))
+            chunks.append("\0" * (MODE.size * (MAX_MODES - len(modes))))
+            chunks.append(struct.pack("<%sL" % len(output_modes),
+                                      *output_modes))
+            chunks.append("\0" * (OUTPUT_MODE.size * \
+                                  (MAX_OUTPUT_MODES - len(output_modes))))
+            state = STATE.pack(screen._resources.contents.configTimestamp,
+                               primary, screen._width, screen._height,
+                               screen._width_mm, screen._height_mm,
+                               screen._config_rotation, len(outputs),
+                               len(modes), len(output_modes))
+        return state + "".join(chunks)
+
+    def publish(self):
+        """Writes the current state of the screen into the state file"""
+        # Pack first, so that the file is only inconsistent during a
+        # single copy
+        data = self._pack()
+        self._map[SEQUENCE_OFFSET:HEADER.size] = \
+                SEQUENCE.pack(self._sequence + 1)
+        self._map[HEADER.size:SIZE] = data
+        self._sequence += 2
+        self._map[SEQUENCE_OFFSET:HEADER.size] = SEQUENCE.pack(self._sequence)
+
+    def get_watcher(self, debounce=0.3, max_delay=2.0):
+        """Returns a HotplugWatcher of the screen, which publishes the
+           state after each burst of RandR events"""
+        import hotplug
+        return hotplug.HotplugWatcher(self.screen, self._on_change,
+                                      debounce, max_delay)
+
+    def _on_change(self, screen, changes):
+        self.publish()
+
+    def run(self):
+        """Publishes the state on RandR events until interrupted"""
+        self.get_watcher().run()
+
+class SharedStateReader:
+    """Reads the state file of a publisher. Neither a display connection nor
+       a Screen is required"""
+    def __init__(self, path=None):
+        """Maps the state file of the given path or of the current
+           display"""
+        if path is None:
+            path = get_default_path()
+        self.path = path
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError, error:
+            raise RRError("The state is not published", path, error)
+        try:
+            if os.fstat(fd).st_size < SIZE:
+                raise RRError("The state file is incomplete", path)
+            self._map = mmap.mmap(fd, SIZE, mmap.MAP_SHARED, mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        (magic, version, number, sequence) = HEADER.unpack(
+            self._map[:HEADER.size])
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            self.close()
+            raise RRError("Unsupported state file", path)
+        self.screen = number
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Unmaps the state file"""
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+
+    def get_sequence(self):
+        """Returns the sequence counter of the state. It changes with every
+           published state, so that readers can cheaply poll for changes"""
+        return SEQUENCE.unpack(self._map[SEQUENCE_OFFSET:HEADER.size])[0]
+
+    def has_changed(self, sequence):
+        """Returns True if a state has been published after the state of
+           the given sequence"""
+        return self.get_sequence() != sequence
+
+    def read(self, timeout=READ_TIMEOUT):
+        """Returns a consistent copy of the published state as Snapshot.
+           Retries while the publisher is writing"""
+        end = time.time() + timeout
+        while True:
+            before = self.get_sequence()
+            if before and not before % 2:
+                data = self._map[:SIZE]
+                if self.get_sequence() == before:
+                    return self._unpack(data, before)
+            if time.time() > end:
+                raise RRError("The state is not available", self.path)
+            # Give the publisher a chance to finish
+            time.sleep(0)
+
+    def _unpack(self, data, sequence):
+        """Returns the snapshot of a copy of the state file"""
+        (timestamp, primary, width, height, width_mm, height_mm, rotation,
+         noutputs, nmodes, noutput_modes) = STATE.unpack_from(data,
+                                                              HEADER.size)
+        output_modes = struct.unpack_from("<%sL" % noutput_modes, data,
+                                          OUTPUT_MODES_OFFSET)
+        modes = []
+        for i in range(nmodes):
+            (id, mode_width, mode_height, rate, name) = MODE.unpack_from(
+                data, MODES_OFFSET + i * MODE.size)
+            modes.append(Snapshot(id=id, name=name.rstrip("\0"),
+                                  width=mode_width, height=mode_height,
+                                  rate=rate))
+        outputs = []
+        for i in range(noutputs):
+            values = OUTPUT.unpack_from(data, OUTPUTS_OFFSET + i * OUTPUT.size)
+            (first, count) = values[14:16]
+            outputs.append(Snapshot(name=values[0].rstrip("\0"),
+                                    id=values[1],
+                                    crtc=values[2] or None,
+                                    connected=bool(values[3]),
+                                    primary=bool(values[4]),
+                                    rotation=values[5],
+                                    x=values[6],
+                                    y=values[7],
+                                    size=(values[8], values[9]),
+                                    mm_width=values[10],
+                                    mm_height=values[11],
+                                    mode=values[12] or None,
+                                    rate=values[13] or None,
+                                    modes=output_modes[first:first + count],
+                                    npreferred=values[16]))
+        return Snapshot(sequence=sequence,
+                        screen=self.screen,
+                        timestamp=timestamp,
+                        primary=primary or None,
+                        width=width,
+                        height=height,
+                        width_mm=width_mm,
+                        height_mm=height_mm,
+                        rotation=rotation,
+                        outputs=tuple(outputs),
+                        modes=tuple(modes))
+
+    def get_monitor_geometry(self):
+        """Returns the name and geometry of all active outputs"""
+        state = self.read()
+        return [(output.name, output.x, output.y) + output.size \
+                for output in state.outputs if output.mode]
+
+def read_state(path=None):
+    """Returns the published state of the given path or of the current
+       display as Snapshot"""
+    reader = SharedStateReader(path)
+    try:
+        return reader.read()
+    finally:
+        reader.close()
+
+# vim:ts=4:sw=4:et
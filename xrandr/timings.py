@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Python-XRandR provides a high level API for the XRandR extension of the
+# X.org server. XRandR allows to configure resolution, refresh rate, rotation
+# of the screen and multiple outputs of graphics cards.
+#
+# This module calculates mode lines according to the VESA Coordinated
+# Video Timings (CVT) including reduced blanking and the older Generalized
+# Timing Formula (GTF). It follows cvt.c and gtf.c of the X.org server.
+#
+# Copyright 2007 © Sebastian Heinlein <sebastian.heinlein@web.de>
+# Copyright 2007 © Michael Vogt <mvo@ubuntu.com>
+# Copyright 2007 © Canonical Ltd.
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+import math
+
+import xrandr
+
+# Reduced blanking versions
+CVT_STANDARD = 0
+CVT_REDUCED = 1
+CVT_REDUCED_V2 = 2
+
+# CVT constants
+CVT_H_GRANULARITY = 8
+CVT_MIN_V_PORCH = 3
+CVT_MIN_V_BPORCH = 6
+CVT_CLOCK_STEP = 250
+CVT_HSYNC_PERCENTAGE = 8
+CVT_MIN_VSYNC_BP = 550.0
+CVT_M_FACTOR = 600
+CVT_C_FACTOR = 40
+CVT_K_FACTOR = 128
+CVT_J_FACTOR = 20
+CVT_M_PRIME = CVT_M_FACTOR * CVT_K_FACTOR / 256.0
+CVT_C_PRIME = (CVT_C_FACTOR - CVT_J_FACTOR) * CVT_K_FACTOR / 256.0 + \
+              CVT_J_FACTOR
+CVT_RB_MIN_VBLANK = 460.0
+CVT_RB_H_SYNC = 32
+CVT_RB_H_BLANK = 160
+CVT_RB_VFPORCH = 3
+CVT_RB_MIN_VBPORCH = 6
+CVT_RB2_H_BLANK = 80
+CVT_RB2_H_FPORCH = 8
+CVT_RB2_V_SYNC = 8
+CVT_RB2_MIN_VFPORCH = 1
+CVT_RB2_CLOCK_STEP = 1
+
+# GTF constants
+GTF_CELL_GRAN = 8.0
+GTF_MIN_PORCH = 1
+GTF_V_SYNC_RQD = 3
+GTF_H_SYNC_PERCENT = 8.0
+GTF_MIN_VSYNC_PLUS_PORCH = 550.0
+GTF_M = 600.0
+GTF_C = 40.0
+GTF_K = 128.0
+GTF_J = 20.0
+GTF_C_PRIME = ((GTF_C - GTF_J) * GTF_K / 256.0) + GTF_J
+GTF_M_PRIME = GTF_K / 256.0 * GTF_M
+
+class ModeLine:
+    """The timings of a mode. The attributes follow the fields of the
+       XRRModeInfo structure, the dot clock is given in Hz"""
+    def __init__(self, name, width, height, dotClock, hSyncStart, hSyncEnd,
+                 hTotal, vSyncStart, vSyncEnd, vTotal, modeFlags, hSkew=0):
+        """Initializes the mode line"""
+        self.id = 0
+        self.name = name
+        self.width = width
+        self.height = height
+        self.dotClock = dotClock
+        self.hSyncStart = hSyncStart
+        self.hSyncEnd = hSyncEnd
+        self.hTotal = hTotal
+        self.hSkew = hSkew
+        self.vSyncStart = vSyncStart
+        self.vSyncEnd = vSyncEnd
+        self.vTotal = vTotal
+        self.modeFlags = modeFlags
+
+    def __repr__(self):
+        return "<ModeLine %s>" % self.to_modeline()
+
+    def get_rate(self):
+        """Returns the vertical refresh rate in Hz"""
+        return float(self.dotClock) / (self.hTotal * self.vTotal)
+
+    def to_modeline(self):
+        """Returns the mode in the Modeline syntax of xorg.conf"""
+        flags = []
+        if self.modeFlags & xrandr.RR_HSYNC_POSITIVE: flags.append("+hsync")
+        if self.modeFlags & xrandr.RR_HSYNC_NEGATIVE: flags.append("-hsync")
+        if self.modeFlags & xrandr.RR_VSYNC_POSITIVE: flags.append("+vsync")
+        if self.modeFlags & xrandr.RR_VSYNC_NEGATIVE: flags.append("-vsync")
+        return '"%s" %.2f %s %s %s %s %s %s %s %s %s' % \
+               (self.name, self.dotClock / 1000000.0, self.width,
+                self.hSyncStart, self.hSyncEnd, self.hTotal, self.height,
+                self.vSyncStart, self.vSyncEnd, self.vTotal,
+                " ".join(flags))
+
+def _rint(value):
+    """Rounds half to even like rint() of C"""
+    lower = math.floor(value)
+    diff = value - lower
+    if diff > 0.5 or (diff == 0.5 and lower % 2):
+        return lower + 1
+    return lower
+
+def _get_vsync(width, height):
+    """Returns the vertical sync width, which encodes the aspect ratio"""
+    if not height % 3 and height * 4 // 3 == width:
+        return 4
+    elif not height % 9 and height * 16 // 9 == width:
+        return 5
+    elif not height % 10 and height * 16 // 10 == width:
+        return 6
+    elif not height % 4 and height * 5 // 4 == width:
+        return 7
+    elif not height % 9 and height * 15 // 9 == width:
+        return 7
+    return 10
+
+def cvt(width, height, rate=60.0, reduced=CVT_STANDARD):
+    """Returns the CVT mode line for the given resolution and refresh
+       rate. Reduced blanking (CVT_REDUCED or CVT_REDUCED_V2) cuts the pixel
+       clock considerably and is supported by all digital displays"""
+    rate = float(rate)
+    if reduced == CVT_REDUCED_V2:
+        # Version 2 doesn't round to the character cell granularity
+        h_display = width
+        vsync = CVT_RB2_V_SYNC
+    else:
+        h_display = width - width % CVT_H_GRANULARITY
+        vsync = _get_vsync(h_display, height)
+    if reduced == CVT_STANDARD:
+        h_period = (1000000.0 / rate - CVT_MIN_VSYNC_BP) / \
+                   (height + CVT_MIN_V_PORCH)
+        vsync_and_back_porch = int(CVT_MIN_VSYNC_BP / h_period) + 1
+        if vsync_and_back_porch < vsync + CVT_MIN_V_BPORCH:
+            vsync_and_back_porch = vsync + CVT_MIN_V_BPORCH
+        v_total = height + vsync_and_back_porch + CVT_MIN_V_PORCH
+        blank_percentage = CVT_C_PRIME - CVT_M_PRIME * h_period / 1000.0
+        if blank_percentage < 20:
+            blank_percentage = 20
+        h_blank = int(h_display * blank_percentage /
+                      (100.0 - blank_percentage))
+        h_blank -= h_blank % (2 * CVT_H_GRANULARITY)
+        h_total = h_display + h_blank
+        clock = int(h_total * 1000.0 / h_period)
+        clock -= clock % CVT_CLOCK_STEP
+        h_sync_end = h_display + h_blank // 2
+        # Rounded up like X.org does, even if it is on the granularity
+        h_sync_start = h_sync_end - h_total * CVT_HSYNC_PERCENTAGE // 100
+        h_sync_start += CVT_H_GRANULARITY - \
+                        h_sync_start % CVT_H_GRANULARITY
+        v_sync_start = height + CVT_MIN_V_PORCH
+        flags = xrandr.RR_HSYNC_NEGATIVE | xrandr.RR_VSYNC_POSITIVE
+        name = "%sx%s_%.2f" % (h_display, height, rate)
+    else:
+        h_period = (1000000.0 / rate - CVT_RB_MIN_VBLANK) / height
+        vbi_lines = int(CVT_RB_MIN_VBLANK / h_period) + 1
+        if reduced == CVT_REDUCED_V2:
+            min_vbi = CVT_RB2_MIN_VFPORCH + vsync + CVT_RB_MIN_VBPORCH
+            h_blank = CVT_RB2_H_BLANK
+            step = CVT_RB2_CLOCK_STEP
+        else:
+            min_vbi = CVT_RB_VFPORCH + vsync + CVT_RB_MIN_VBPORCH
+            h_blank = CVT_RB_H_BLANK
+            step = CVT_CLOCK_STEP
+        if vbi_lines < min_vbi:
+            vbi_lines = min_vbi
+        v_total = height + vbi_lines
+        h_total = h_display + h_blank
+        clock = int(h_total * rate * v_total / 1000.0)
+        clock -= clock % step
+        if reduced == CVT_REDUCED_V2:
+            h_sync_start = h_display + CVT_RB2_H_FPORCH
+            h_sync_end = h_sync_start + CVT_RB_H_SYNC
+            # The back porch is fixed, the front porch takes the rest
+            v_sync_start = v_total - CVT_RB_MIN_VBPORCH - vsync
+            name = "%sx%s_%.2fR2" % (h_display, height, rate)
+        else:
+            h_sync_end = h_display + h_blank // 2
+            h_sync_start = h_sync_end - CVT_RB_H_SYNC
+            v_sync_start = height + CVT_RB_VFPORCH
+            name = "%sx%s_%.2fR" % (h_display, height, rate)
+        flags = xrandr.RR_HSYNC_POSITIVE | xrandr.RR_VSYNC_NEGATIVE
+    return ModeLine(name, h_display, height, clock * 1000, h_sync_start,
+                    h_sync_end, h_total, v_sync_start, v_sync_start + vsync,
+                    v_total, flags)
+
+def gtf(width, height, rate=60.0):
+    """Returns the GTF mode line for the given resolution and refresh
+       rate. Only needed for old analog displays, which don't support CVT"""
+    rate = float(rate)
+    h_pixels = int(_rint(width / GTF_CELL_GRAN) * GTF_CELL_GRAN)
+    h_period_est = ((1.0 / rate) - (GTF_MIN_VSYNC_PLUS_PORCH / 1000000.0)) \
+                   / (height + GTF_MIN_PORCH) * 1000000.0
+    vsync_plus_bp = _rint(GTF_MIN_VSYNC_PLUS_PORCH / h_period_est)
+    v_total = height + vsync_plus_bp + GTF_MIN_PORCH
+    v_field_rate_est = 1.0 / h_period_est / v_total * 1000000.0
+    h_period = h_period_est / (rate / v_field_rate_est)
+    duty_cycle = GTF_C_PRIME - (GTF_M_PRIME * h_period / 1000.0)
+    h_blank = _rint(h_pixels * duty_cycle / (100.0 - duty_cycle) /
+                    (2.0 * GTF_CELL_GRAN)) * (2.0 * GTF_CELL_GRAN)
+    h_total = h_pixels + h_blank
+    pixel_freq = h_total / h_period
+    h_sync = _rint(GTF_H_SYNC_PERCENT / 100.0 * h_total / GTF_CELL_GRAN) * \
+             GTF_CELL_GRAN
+    h_front_porch = (h_blank / 2.0) - h_sync
+    h_sync_start = h_pixels + h_front_porch
+    v_sync_start = height + GTF_MIN_PORCH
+    return ModeLine("%sx%s_%.2f" % (h_pixels, height, rate), h_pixels, height,
+                    int(round(pixel_freq * 1000000)), int(h_sync_start),
+                    int(h_sync_start + h_sync), int(h_total),
+                    v_sync_start, v_sync_start + GTF_V_SYNC_RQD,
+                    int(v_total),
+                    xrandr.RR_HSYNC_NEGATIVE | xrandr.RR_VSYNC_POSITIVE)
+
+# vim:ts=4:sw=4:et